@@ -24,6 +24,17 @@ DB_NAME = "bookings.db"
 # Get the absolute path to the directory where this config file is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, DB_NAME)
+# How long a fully scraped MJR is trusted before its detail page is visited again
+SCRAPED_MJR_CACHE_TTL_SECONDS = 12 * 60 * 60
+
+# --- UiAutomator2 Idle Settings ---
+# Applied around the list/secondary hot paths: don't wait up to 10s for the app's UI thread to go idle before each
+# page_source/find call, and fail selector lookups immediately (explicit WebDriverWaits do the waiting).
+FAST_IDLE_SETTINGS = {"waitForIdleTimeout": 500, "waitForSelectorTimeout": 0}
+DEFAULT_IDLE_SETTINGS = {"waitForIdleTimeout": 10000, "waitForSelectorTimeout": 10000} # UiAutomator2 defaults, restored afterwards
+# Keep page_source small: no off-screen nodes, no toast listener. ignoreUnimportantViews is deliberately left off,
+# it drops the bare ViewGroups that carry the card/MJR content-desc the parsers and UiSelectors rely on.
+COMPACT_SOURCE_SETTINGS = {"allowInvisibleElements": False, "enableNotificationListener": False}
 
 
 # --- XML Dumping Configuration ---
@@ -5,8 +5,10 @@ from logger import get_logger
 from config import DB_PATH # Use DB_PATH from config
 from .models import ( # Use relative import for models within the same package
     BOOKINGS_TABLE_SCHEMA,
+    BOOKINGS_INDEXES_SQL,
     MULTIDAY_HEADERS_TABLE_SCHEMA,
     BOOKINGS_SCRAPE_TABLE_SCHEMA,
+    SCRAPED_MJR_CACHE_TABLE_SCHEMA,
     # Add other schemas if they exist in models.py
     # BOOKING_STATUS_TABLE_SCHEMA,
     # BOOKING_HISTORY_TABLE_SCHEMA
@@ -30,6 +32,34 @@ def _execute_schema(cursor: sqlite3.Cursor, schema: str, table_name: str):
         raise # Re-raise the exception to be handled by the caller
 
 
+# Applied once per connection, right after connect().
+# synchronous=NORMAL under WAL means a power loss can drop the last committed transaction(s),
+# never corrupt the file; the scraper can simply re-scrape those bookings, so durability is traded for fewer fsyncs.
+CONNECTION_PRAGMAS = (
+    ("journal_mode", "WAL"),         # Readers don't block the writer and vice versa
+    ("synchronous", "NORMAL"),       # fsync at checkpoints only instead of every commit
+    ("temp_store", "MEMORY"),
+    ("mmap_size", "268435456"),      # 256MB memory-mapped reads
+    ("cache_size", "-32000"),        # ~32MB page cache, negative value is KiB
+    ("wal_autocheckpoint", "10000"), # Checkpoint every 10000 pages rather than 1000
+    ("busy_timeout", "5000"),        # Wait up to 5s on a locked database instead of failing; explicit, not left to connect()'s default
+)
+# The subset that only affects the connection it is set on; also applied to the pool's read-only connections
+READER_PRAGMA_NAMES = frozenset({"temp_store", "mmap_size", "cache_size", "busy_timeout"})
+
+def apply_connection_pragmas(conn: sqlite3.Connection, read_only: bool = False):
+    """Sets the performance PRAGMAs on a freshly opened connection (only READER_PRAGMA_NAMES if read_only). Failures are logged, not fatal."""
+    pragmas = [(n, v) for n, v in CONNECTION_PRAGMAS if not read_only or n in READER_PRAGMA_NAMES]
+    for name, value in pragmas:
+        try:
+            result = conn.execute(f"PRAGMA {name}={value};").fetchone()
+            if name == "journal_mode" and result and str(result[0]).lower() != value.lower():
+                logger.warning(f"journal_mode is '{result[0]}', not {value} (e.g. an in-memory database); commits will fsync as usual.")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not set PRAGMA {name}={value}: {e}")
+    logger.debug(f"Applied connection PRAGMAs: {', '.join(f'{n}={v}' for n, v in pragmas)}")
+
+
 def init_db(db_path: str = DB_PATH, test_mode: bool = False) -> sqlite3.Connection:
     """
     Initializes the SQLite database. Creates tables if they don't exist.
@@ -57,19 +87,15 @@ def init_db(db_path: str = DB_PATH, test_mode: bool = False) -> sqlite3.Connecti
         conn = sqlite3.connect(db_path, check_same_thread=False) # check_same_thread=False if used across threads
         logger.info(f"Database connection established to: {db_path}")
 
-        # Enable Write-Ahead Logging (WAL) for better concurrency and performance
-        try:
-            conn.execute("PRAGMA journal_mode=WAL;")
-            logger.debug("Enabled WAL journal mode.")
-        except sqlite3.Error as e:
-            logger.warning(f"Could not enable WAL journal mode: {e}")
-
+        apply_connection_pragmas(conn)
 
         cursor = conn.cursor()
         # Create tables using schemas from models.py
         _execute_schema(cursor, BOOKINGS_TABLE_SCHEMA, "bookings")
         _execute_schema(cursor, MULTIDAY_HEADERS_TABLE_SCHEMA, "multiday_headers")
         _execute_schema(cursor, BOOKINGS_SCRAPE_TABLE_SCHEMA, "bookings_scrape")
+        _execute_schema(cursor, SCRAPED_MJR_CACHE_TABLE_SCHEMA, "scraped_mjr_cache")
+        cursor.executescript(BOOKINGS_INDEXES_SQL) # IF NOT EXISTS, so cheap when already there
         # Add other table creations here if needed
         # _execute_schema(cursor, BOOKING_STATUS_TABLE_SCHEMA, "booking_status")
         # _execute_schema(cursor, BOOKING_HISTORY_TABLE_SCHEMA, "booking_history")
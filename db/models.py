@@ -52,6 +52,11 @@ CREATE TABLE IF NOT EXISTS bookings (
 );
 """
 
+# Indexes on bookings, run on every init_db so existing databases pick them up too
+BOOKINGS_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_bookings_status_mjr ON bookings(status, mjr_id); -- Startup load of scraped MJR IDs is an index-only scan
+"""
+
 # Schema for multiday booking headers (MJR specific overall info)
 MULTIDAY_HEADERS_TABLE_SCHEMA = """
 CREATE TABLE IF NOT EXISTS multiday_headers (
@@ -79,4 +84,12 @@ CREATE TABLE IF NOT EXISTS bookings_scrape (
     total_errors INTEGER DEFAULT 0,
     error_message TEXT
 );
-"""
\ No newline at end of file
+"""
+
+# Cache of MJRs whose detail page was fully scraped, used to skip repeat detail visits
+SCRAPED_MJR_CACHE_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scraped_mjr_cache (
+    mjr_id TEXT PRIMARY KEY,
+    scraped_at INTEGER NOT NULL       -- Unix epoch seconds of the last successful detail scrape
+);
+"""
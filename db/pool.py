@@ -0,0 +1,90 @@
+# filename: db/pool.py
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from logger import get_logger
+from db.connection import apply_connection_pragmas
+
+logger = get_logger(__name__)
+
+class ConnectionPool:
+    """
+    Wraps the single writer connection from init_db and hands out per-thread read-only connections.
+    Writes are serialized behind a lock and committed (or rolled back) when the outermost write() block exits;
+    reads go through a separate query_only connection so they never hold the writer's lock.
+    For an in-memory database there is no file to reopen, so read() falls back to the writer.
+    """
+    def __init__(self, writer_conn: sqlite3.Connection):
+        self.writer = writer_conn
+        self._write_lock = threading.RLock() # Re-entrant so a write() block may call helpers that write() too
+        self._write_depth = 0 # Nested write() blocks join the outer transaction; only depth 1 commits or rolls back
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self.db_path: Optional[str] = self._resolve_db_path(writer_conn)
+
+    @staticmethod
+    def _resolve_db_path(conn: sqlite3.Connection) -> Optional[str]:
+        try:
+            for _seq, name, path in conn.execute("PRAGMA database_list;").fetchall():
+                if name == "main": return path or None # Empty path means :memory: / temp DB
+        except sqlite3.Error as e:
+            logger.warning(f"Could not resolve database path for read connections: {e}")
+        return None
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yields the writer connection under the lock; commits on success, rolls back and re-raises on error.
+        A nested write() is part of the enclosing block's transaction: it neither commits nor rolls back itself,
+        so a later failure in the outer block also undoes the inner writes.
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                yield self.writer
+                if self._write_depth == 1: self.writer.commit()
+            except Exception:
+                if self._write_depth == 1:
+                    try: self.writer.rollback()
+                    except sqlite3.Error as rb_e: logger.error(f"Rollback failed after write error: {rb_e}")
+                raise
+            finally:
+                self._write_depth -= 1
+
+    def _get_reader(self) -> Optional[sqlite3.Connection]:
+        reader = getattr(self._local, "conn", None)
+        if reader is not None or not self.db_path: return reader
+        try:
+            reader = sqlite3.connect(f"file:{self.db_path}?mode=ro", check_same_thread=False, uri=True, isolation_level=None)
+            reader.execute("PRAGMA query_only=1;")
+            apply_connection_pragmas(reader, read_only=True) # Same page cache / mmap sizing as the writer
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open read-only connection to '{self.db_path}', reads will use the writer: {e}")
+            self.db_path = None # Don't retry on every read
+            return None
+        self._local.conn = reader
+        with self._readers_lock: self._readers.append(reader)
+        logger.debug(f"Opened read-only connection for thread {threading.get_ident()}.")
+        return reader
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Yields this thread's read-only connection (autocommit, query_only), or the writer if none can be opened."""
+        reader = self._get_reader()
+        if reader is not None:
+            yield reader
+            return
+        with self._write_lock:
+            yield self.writer
+
+    def close(self):
+        """Closes all read-only connections. The writer stays owned by the caller (close_db)."""
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for reader in readers:
+            try: reader.close()
+            except sqlite3.Error as e: logger.error(f"Error closing read-only connection: {e}")
+        self._local = threading.local()
+        if readers: logger.info(f"Closed {len(readers)} read-only database connection(s).")
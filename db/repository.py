@@ -1,4 +1,5 @@
 # filename: db/repository.py
+import json
 import sqlite3
 from logger import get_logger
 from typing import Dict, Any, List, Tuple, Optional, Set
@@ -7,34 +8,63 @@ import time
 # If direct HH:MM:SS string is needed for DB, ensure formatting is handled.
 # from utils.time_utils import parse_datetime_from_time_string
 from parsers.detail_parser import parse_time as format_time_for_db # Keep if this specific format is needed for list page items
-from state.models import BookingCardStatus, BookingProcessingStatus # Added BookingProcessingStatus
+from state.models import BookingCardStatus, BookingProcessingStatus, OFFER_OR_VIEWED_CARD_STATUSES # Added BookingProcessingStatus
 
 logger = get_logger(__name__)
 
-def insert_booking_base(conn: sqlite3.Connection, card_data: Dict[str, Any]):
-    # ... (implementation as provided previously, seems mostly okay for base insertion logic) ...
+BOOKING_BASE_COLUMNS = (
+    'booking_id', 'postcode',
+    'start_time', 'end_time', 'duration', # These are from list card (mja_parser)
+    'language_pair', 'isRemote', 'status', 'card_status', 'mjr_id' # Added mjr_id placeholder if available early
+)
+
+# Built once: shared by insert_booking_base and insert_bookings_base_bulk
+INSERT_BOOKING_BASE_SQL = f'''
+    INSERT INTO bookings ({', '.join(BOOKING_BASE_COLUMNS)}, last_updated)
+    VALUES ({', '.join('?' * len(BOOKING_BASE_COLUMNS))}, CURRENT_TIMESTAMP)
+    ON CONFLICT(booking_id) DO UPDATE SET
+        postcode = excluded.postcode,
+        start_time = excluded.start_time,
+        end_time = excluded.end_time,
+        duration = excluded.duration,
+        language_pair = excluded.language_pair,
+        isRemote = excluded.isRemote,
+        status = CASE
+                     WHEN bookings.status = '{BookingProcessingStatus.SCRAPED.value}' AND excluded.status = '{BookingProcessingStatus.CANCELLED_ON_LIST.value}' THEN excluded.status
+                     WHEN bookings.status = '{BookingProcessingStatus.SCRAPED.value}' THEN bookings.status 
+                     ELSE excluded.status
+                 END,
+        card_status = excluded.card_status,
+        mjr_id = COALESCE(excluded.mjr_id, bookings.mjr_id), -- Update mjr_id if new one provided
+        last_updated = CURRENT_TIMESTAMP
+    WHERE bookings.booking_id = excluded.booking_id
+      AND ( -- No-op (no page write, rowcount 0) when a re-seen card changes nothing
+            bookings.postcode IS NOT excluded.postcode
+         OR bookings.start_time IS NOT excluded.start_time
+         OR bookings.end_time IS NOT excluded.end_time
+         OR bookings.duration IS NOT excluded.duration
+         OR bookings.language_pair IS NOT excluded.language_pair
+         OR bookings.isRemote IS NOT excluded.isRemote
+         OR bookings.card_status IS NOT excluded.card_status
+         OR (excluded.mjr_id IS NOT NULL AND bookings.mjr_id IS NOT excluded.mjr_id)
+         OR (bookings.status IS NOT excluded.status
+             AND (bookings.status IS NOT '{BookingProcessingStatus.SCRAPED.value}' OR excluded.status = '{BookingProcessingStatus.CANCELLED_ON_LIST.value}'))
+      ); 
+'''
+
+def _booking_base_values(card_data: Dict[str, Any]) -> Tuple[Any, ...]:
     card_status_enum = card_data.get('card_status', BookingCardStatus.NORMAL)
     db_status = BookingProcessingStatus.PENDING.value # Default status for normal bookings
     if card_status_enum == BookingCardStatus.CANCELLED:
         db_status = BookingProcessingStatus.CANCELLED_ON_LIST.value
-    elif card_status_enum in [BookingCardStatus.NEW_OFFER, BookingCardStatus.VIEWED]:
+    elif card_status_enum in OFFER_OR_VIEWED_CARD_STATUSES:
         db_status = BookingProcessingStatus.SKIPPED_OFFER_VIEWED.value
 
-
-    columns = [
-        'booking_id', 'postcode',
-        'start_time', 'end_time', 'duration', # These are from list card (mja_parser)
-        'language_pair', 'isRemote', 'status', 'card_status', 'mjr_id' # Added mjr_id placeholder if available early
-    ]
-
-    db_start_time = format_time_for_db(card_data.get('start_time_raw'))
-    db_end_time = format_time_for_db(card_data.get('end_time_raw'))
-
-    values_tuple = (
+    return (
         card_data.get('booking_id'),
         card_data.get('postcode'),
-        db_start_time,
-        db_end_time,
+        format_time_for_db(card_data.get('start_time_raw')),
+        format_time_for_db(card_data.get('end_time_raw')),
         card_data.get('calculated_duration_str'),
         card_data.get('language_pair'),
         1 if card_data.get('isRemote') == 1 else 0,
@@ -43,41 +73,66 @@ def insert_booking_base(conn: sqlite3.Connection, card_data: Dict[str, Any]):
         card_data.get('mjr_id') # If mja_parser could ever get this (unlikely)
     )
 
+def insert_booking_base(conn: sqlite3.Connection, card_data: Dict[str, Any]):
+    card_status_enum = card_data.get('card_status', BookingCardStatus.NORMAL)
+    values_tuple = _booking_base_values(card_data)
+
     if not values_tuple[0]:
         logger.error(f"Attempted to insert booking without booking_id. Data: {card_data}")
         return
 
-    sql = f'''
-        INSERT INTO bookings ({', '.join(columns)}, last_updated)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ON CONFLICT(booking_id) DO UPDATE SET
-            postcode = excluded.postcode,
-            start_time = excluded.start_time,
-            end_time = excluded.end_time,
-            duration = excluded.duration,
-            language_pair = excluded.language_pair,
-            isRemote = excluded.isRemote,
-            status = CASE
-                         WHEN bookings.status = '{BookingProcessingStatus.SCRAPED.value}' AND excluded.status = '{BookingProcessingStatus.CANCELLED_ON_LIST.value}' THEN excluded.status
-                         WHEN bookings.status = '{BookingProcessingStatus.SCRAPED.value}' THEN bookings.status 
-                         ELSE excluded.status
-                     END,
-            card_status = excluded.card_status,
-            mjr_id = COALESCE(excluded.mjr_id, bookings.mjr_id), -- Update mjr_id if new one provided
-            last_updated = CURRENT_TIMESTAMP
-        WHERE bookings.booking_id = excluded.booking_id; 
-    '''
     try:
         cursor = conn.cursor()
-        cursor.execute(sql, values_tuple)
+        cursor.execute(INSERT_BOOKING_BASE_SQL, values_tuple)
         conn.commit()
         if cursor.rowcount > 0:
-            logger.info(f"Inserted/Updated base booking record for {values_tuple[0]} with card_status: {card_status_enum.value if card_status_enum else None}, db_status: {db_status}")
+            logger.info(f"Inserted/Updated base booking record for {values_tuple[0]} with card_status: {card_status_enum.value if card_status_enum else None}, db_status: {values_tuple[7]}")
         else:
             logger.debug(f"Base booking {values_tuple[0]} not inserted/updated by upsert (e.g., status was '{BookingProcessingStatus.SCRAPED.value}' and no change needed).")
     except sqlite3.Error as e:
         logger.error(f"Failed to insert/update base booking {values_tuple[0]}: {e}"); conn.rollback()
 
+def insert_bookings_base_bulk(conn: sqlite3.Connection, cards_data: List[Dict[str, Any]], commit: bool = True) -> int:
+    """Upserts many list cards with one executemany. Pass commit=False to join the caller's transaction. Returns rows written."""
+    rows = [values for values in map(_booking_base_values, cards_data) if values[0]]
+    if len(rows) != len(cards_data): logger.error(f"Skipped {len(cards_data) - len(rows)} card(s) without booking_id in bulk base insert.")
+    if not rows: return 0
+    try:
+        conn.executemany(INSERT_BOOKING_BASE_SQL, rows)
+        if commit: conn.commit()
+        logger.info(f"Inserted/Updated {len(rows)} base booking records: {', '.join(row[0] for row in rows)}")
+        return len(rows)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to bulk insert/update {len(rows)} base bookings: {e}")
+        if not commit: raise
+        conn.rollback()
+        return 0
+
+
+UPDATE_SECONDARY_IDS_SQL = '''
+    UPDATE bookings 
+    SET 
+        creation_id = ?, 
+        processing_id = ?, 
+        mjr_id = ?,  -- This is the key update for linking MJA to MJR
+        appointment_count_hint = ?, 
+        type_hint = ?, 
+        last_updated = CURRENT_TIMESTAMP
+    WHERE booking_id = ? 
+    AND (
+        ifnull(creation_id, '') <> ifnull(?, '') OR 
+        ifnull(processing_id, '') <> ifnull(?, '') OR
+        ifnull(mjr_id, '') <> ifnull(?, '') OR 
+        ifnull(appointment_count_hint, -1) <> ifnull(?, -1) OR
+        ifnull(type_hint, '') <> ifnull(?, '')
+    )
+'''
+
+def _secondary_ids_values(booking_id: str, creation_id: Optional[str], processing_id: Optional[str],
+                          appointment_count: Optional[int], type_hint: Optional[str]) -> Tuple[Any, ...]:
+    # processing_id from secondary page is the MJR ID
+    return (creation_id, processing_id, processing_id, appointment_count, type_hint, booking_id,
+            creation_id, processing_id, processing_id, appointment_count, type_hint)
 
 def update_booking_secondary_ids(conn: sqlite3.Connection,
                                  booking_id: str, creation_id: Optional[str], processing_id: Optional[str], # processing_id is mjr_id
@@ -95,30 +150,9 @@ def update_booking_secondary_ids(conn: sqlite3.Connection,
 
     # If processing_id (MJR ID from secondary page) is different from existing mjr_id in DB, log warning or handle.
     # For now, we assume processing_id is the authoritative MJR ID.
-    
-    sql = '''
-        UPDATE bookings 
-        SET 
-            creation_id = ?, 
-            processing_id = ?, 
-            mjr_id = ?,  -- This is the key update for linking MJA to MJR
-            appointment_count_hint = ?, 
-            type_hint = ?, 
-            last_updated = CURRENT_TIMESTAMP
-        WHERE booking_id = ? 
-        AND (
-            ifnull(creation_id, '') <> ifnull(?, '') OR 
-            ifnull(processing_id, '') <> ifnull(?, '') OR
-            ifnull(mjr_id, '') <> ifnull(?, '') OR 
-            ifnull(appointment_count_hint, -1) <> ifnull(?, -1) OR
-            ifnull(type_hint, '') <> ifnull(?, '')
-        )
-    '''
-    # processing_id from secondary page is the MJR ID
-    values = (creation_id, processing_id, processing_id, appointment_count, type_hint, booking_id,
-              creation_id, processing_id, processing_id, appointment_count, type_hint)
+    values = _secondary_ids_values(booking_id, creation_id, processing_id, appointment_count, type_hint)
     try:
-        cursor.execute(sql, values)
+        cursor.execute(UPDATE_SECONDARY_IDS_SQL, values)
         conn.commit()
         if cursor.rowcount > 0:
             logger.info(f"Updated secondary IDs & hints for MJA {booking_id} (MJR set to {processing_id})")
@@ -128,70 +162,106 @@ def update_booking_secondary_ids(conn: sqlite3.Connection,
         logger.error(f"Failed to update secondary IDs/hints for MJA {booking_id}: {e}")
         conn.rollback()
 
-def save_booking_details(conn: sqlite3.Connection, parsed_data: Dict[str, Any], attempt_count: int = 1):
-    # This function now receives a fully formed dictionary for a single MJA day
-    # (either a single-day booking or one day of a multi-day booking)
-    mja_id = parsed_data.get('mja_id') # This should be the specific MJA for the day
-    if not mja_id:
-        logger.error(f"Cannot save details: 'mja_id' is missing from parsed_data. Data: {parsed_data}")
-        return
-
-    # Ensure all expected columns in 'bookings' table are covered by keys in parsed_data or defaults
-    column_map = {
-        'booking_id': 'mja_id', 'mjr_id': 'mjr_id', 'creation_id': 'creation_id', 'processing_id': 'processing_id',
-        'card_status': 'card_status', 'is_multiday': 'is_multiday', 
-        'appointment_sequence': 'appointment_sequence', 'appointment_count_hint': 'appointment_count_hint',
-        'type_hint': 'type_hint', 'language_pair': 'language_pair', 'client_name': 'client_name', 
-        'address': 'address', 'booking_type': 'booking_type', 'contact_name': 'contact_name', 
-        'contact_phone': 'contact_phone', 'travel_distance': 'travel_distance', 'meeting_link': 'meeting_link',
-        'booking_date': 'booking_date', 'start_time': 'start_time', 'end_time': 'end_time', 
-        'duration': 'duration', # Duration from detail parse, might differ from list
-        'day_pay_sl': 'day_pay_sl', 'day_pay_ooh': 'day_pay_ooh', 'day_pay_urg': 'day_pay_urg',
-        'day_pay_td': 'day_pay_td', 'day_pay_tt': 'day_pay_tt', 'day_pay_aep': 'day_pay_aep',
-        'day_total': 'day_total', # This is now the sum for the specific MJA day
-        'notes': 'notes', 'postcode': 'postcode', 'isRemote': 'isRemote',
-        'scrape_attempt': 'scrape_attempt', 'status': 'status'
-    }
-
-    db_columns = []
-    value_placeholders = []
+def update_booking_secondary_ids_bulk(conn: sqlite3.Connection,
+                                      updates: List[Tuple[str, Optional[str], Optional[str], Optional[int], Optional[str]]],
+                                      commit: bool = True) -> int:
+    """
+    Applies many (booking_id, creation_id, processing_id, appointment_count, type_hint) updates with one executemany.
+    MJAs missing from the DB simply match no row. Pass commit=False to join the caller's transaction. Returns rows changed.
+    """
+    rows = [_secondary_ids_values(*update) for update in updates if update[0]]
+    if not rows: return 0
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(UPDATE_SECONDARY_IDS_SQL, rows)
+        if commit: conn.commit()
+        logger.info(f"Updated secondary IDs & hints for {cursor.rowcount} of {len(rows)} MJAs.")
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to bulk update secondary IDs/hints for {len(rows)} MJAs: {e}")
+        if not commit: raise
+        conn.rollback()
+        return 0
+
+# (db column, key in the parsed detail dict). Fixed at import time so the bind order never changes.
+BOOKING_DETAIL_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('booking_id', 'mja_id'), ('mjr_id', 'mjr_id'), ('creation_id', 'creation_id'), ('processing_id', 'processing_id'),
+    ('card_status', 'card_status'), ('is_multiday', 'is_multiday'),
+    ('appointment_sequence', 'appointment_sequence'), ('appointment_count_hint', 'appointment_count_hint'),
+    ('type_hint', 'type_hint'), ('language_pair', 'language_pair'), ('client_name', 'client_name'),
+    ('address', 'address'), ('booking_type', 'booking_type'), ('contact_name', 'contact_name'),
+    ('contact_phone', 'contact_phone'), ('travel_distance', 'travel_distance'), ('meeting_link', 'meeting_link'),
+    ('booking_date', 'booking_date'), ('start_time', 'start_time'), ('end_time', 'end_time'),
+    ('duration', 'duration'), # Duration from detail parse, might differ from list
+    ('day_pay_sl', 'day_pay_sl'), ('day_pay_ooh', 'day_pay_ooh'), ('day_pay_urg', 'day_pay_urg'),
+    ('day_pay_td', 'day_pay_td'), ('day_pay_tt', 'day_pay_tt'), ('day_pay_aep', 'day_pay_aep'),
+    ('day_total', 'day_total'), # This is now the sum for the specific MJA day
+    ('notes', 'notes'), ('postcode', 'postcode'), ('isRemote', 'isRemote'),
+    ('scrape_attempt', 'scrape_attempt'), ('status', 'status'),
+)
+
+# Do not revert status from error states by a simple re-scrape unless explicitly intended.
+# The status field in parsed_data (defaulting to SCRAPED) will drive the update.
+SAVE_BOOKING_DETAILS_SQL = f"""
+    INSERT INTO bookings ({', '.join(col for col, _ in BOOKING_DETAIL_COLUMNS)}, last_updated)
+    VALUES ({', '.join(['?'] * len(BOOKING_DETAIL_COLUMNS))}, CURRENT_TIMESTAMP)
+    ON CONFLICT(booking_id) DO UPDATE SET
+        {', '.join(f"{col} = excluded.{col}" for col, _ in BOOKING_DETAIL_COLUMNS if col != 'booking_id')},
+        last_updated = CURRENT_TIMESTAMP
+"""
+
+def _booking_detail_values(parsed_data: Dict[str, Any], attempt_count: int) -> Tuple[Any, ...]:
     values_list = []
-    set_clauses = []
-
-    for db_col, data_key in column_map.items():
-        db_columns.append(db_col)
-        value_placeholders.append('?')
+    for _db_col, data_key in BOOKING_DETAIL_COLUMNS:
         if data_key == 'scrape_attempt':
             values_list.append(attempt_count)
         elif data_key == 'status':
             values_list.append(parsed_data.get(data_key, BookingProcessingStatus.SCRAPED.value)) # Default to scraped if status not in parsed_data
         else:
             values_list.append(parsed_data.get(data_key)) # Will be None if key missing
-        
-        if db_col != 'booking_id': # booking_id is MJA ID here, used for conflict target
-            set_clauses.append(f"{db_col} = excluded.{db_col}")
-            
-    # Ensure last_updated is always set on update
-    set_clauses.append("last_updated = CURRENT_TIMESTAMP")
-    # Do not revert status from error states by a simple re-scrape unless explicitly intended.
-    # The status field in parsed_data (defaulting to SCRAPED) will drive the update.
-
-    sql = f"""
-        INSERT INTO bookings ({', '.join(db_columns)}, last_updated)
-        VALUES ({', '.join(['?'] * len(db_columns))}, CURRENT_TIMESTAMP)
-        ON CONFLICT(booking_id) DO UPDATE SET
-            {', '.join(set_clauses)}
-    """
+    return tuple(values_list)
+
+def save_booking_details(conn: sqlite3.Connection, parsed_data: Dict[str, Any], attempt_count: int = 1, commit: bool = True):
+    # This function now receives a fully formed dictionary for a single MJA day
+    # (either a single-day booking or one day of a multi-day booking)
+    # With commit=False the caller owns the transaction, so errors are re-raised instead of rolled back.
+    mja_id = parsed_data.get('mja_id') # This should be the specific MJA for the day
+    if not mja_id:
+        logger.error(f"Cannot save details: 'mja_id' is missing from parsed_data. Data: {parsed_data}")
+        return
+
+    values = _booking_detail_values(parsed_data, attempt_count)
     try:
         cursor = conn.cursor()
-        cursor.execute(sql, tuple(values_list))
-        conn.commit()
+        cursor.execute(SAVE_BOOKING_DETAILS_SQL, values)
+        if commit: conn.commit()
         logger.info(f"Saved/Updated details for booking MJA {mja_id} (MJR: {parsed_data.get('mjr_id')})")
     except sqlite3.Error as e:
-        logger.error(f"Failed to save/update details for MJA {mja_id}: {e}\nSQL: {sql}\nValues: {tuple(values_list)}")
+        logger.error(f"Failed to save/update details for MJA {mja_id}: {e}\nValues: {values}")
+        if not commit: raise
         conn.rollback()
         # raise # Optionally re-raise
 
+def save_booking_details_bulk(conn: sqlite3.Connection, records: List[Dict[str, Any]], attempt_count: int = 1, commit: bool = True) -> int:
+    """Saves several MJA day records with one executemany. Records without 'mja_id' are skipped. Returns rows written."""
+    rows = []
+    for record in records:
+        if not record.get('mja_id'):
+            logger.error(f"Cannot save details: 'mja_id' is missing from parsed_data. Data: {record}")
+            continue
+        rows.append(_booking_detail_values(record, attempt_count))
+    if not rows: return 0
+    try:
+        conn.executemany(SAVE_BOOKING_DETAILS_SQL, rows)
+        if commit: conn.commit()
+        logger.info(f"Saved/Updated details for {len(rows)} MJA records: {', '.join(row[0] for row in rows)}")
+        return len(rows)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to bulk save details for {len(rows)} MJA records: {e}")
+        if not commit: raise
+        conn.rollback()
+        return 0
+
 # --- New and Modified Helper Functions for MJR processing ---
 
 def get_mjr_id_for_mja(conn: sqlite3.Connection, mja_id: str) -> Optional[str]:
@@ -251,8 +321,75 @@ def check_if_all_mjas_for_mjr_scraped(conn: sqlite3.Connection, mjr_id: str) ->
         logger.error(f"Error checking if MJR {mjr_id} is fully scraped: {e}")
         return False # Assume not fully scraped on error
 
-def update_all_mja_statuses_for_mjr(conn: sqlite3.Connection, mjr_id: str, new_status: str, reason: Optional[str] = None):
-    """Updates the status of all MJA records associated with a given MJR ID."""
+def get_all_bookings_summary(conn: sqlite3.Connection) -> List[Tuple[str, Optional[str], Optional[str], Optional[int]]]:
+    """Returns (booking_id, mjr_id, status, appointment_count_hint) for every booking, for building an in-memory index."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT booking_id, mjr_id, status, appointment_count_hint FROM bookings WHERE booking_id IS NOT NULL")
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to retrieve bookings summary: {e}")
+        return []
+
+# Batched lookups bind the ID list as one JSON array, so the SQL text (and sqlite3's cached prepared statement)
+# is the same whatever the batch size, instead of a new "IN (?, ?, ...)" statement per distinct count.
+BOOKING_STATES_FOR_MJAS_SQL = "SELECT booking_id, mjr_id, status FROM bookings WHERE booking_id IN (SELECT value FROM json_each(?))"
+FULLY_SCRAPED_MJR_IDS_SQL = """
+    SELECT mjr_id FROM bookings
+    WHERE mjr_id IN (SELECT value FROM json_each(?))
+    GROUP BY mjr_id
+    HAVING MAX(appointment_count_hint) > 0
+       AND SUM(status = ?) >= MAX(appointment_count_hint)
+"""
+
+def get_booking_states_for_mjas(conn: sqlite3.Connection, mja_ids: List[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """Batched lookup for a screen of cards: one IN query returning {booking_id: (mjr_id, status)}. MJAs not in the DB are left out."""
+    mja_ids = [mja_id for mja_id in set(mja_ids) if mja_id]
+    if not mja_ids: return {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BOOKING_STATES_FOR_MJAS_SQL, (json.dumps(mja_ids),))
+        return {row[0]: (row[1] or None, row[2]) for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        logger.error(f"Failed to retrieve booking states for {len(mja_ids)} MJAs: {e}")
+        return {}
+
+def get_scraped_mjr_ids(conn: sqlite3.Connection) -> Set[str]:
+    """All MJR IDs with at least one scraped MJA, loaded once at startup (covered by idx_bookings_status_mjr)."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT mjr_id FROM bookings WHERE status = ? AND mjr_id IS NOT NULL", (BookingProcessingStatus.SCRAPED.value,))
+        return {row[0] for row in cursor.fetchall() if row[0]}
+    except sqlite3.Error as e:
+        logger.error(f"Failed to retrieve scraped MJR IDs: {e}")
+        return set()
+
+def get_mja_to_mjr_map(conn: sqlite3.Connection) -> Dict[str, str]:
+    """{booking_id: mjr_id} for every MJA already linked to an MJR, loaded once at startup."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT booking_id, mjr_id FROM bookings WHERE mjr_id IS NOT NULL AND mjr_id <> ''")
+        return dict(cursor.fetchall())
+    except sqlite3.Error as e:
+        logger.error(f"Failed to retrieve MJA to MJR mapping: {e}")
+        return {}
+
+def get_fully_scraped_mjr_ids(conn: sqlite3.Connection, mjr_ids: List[str]) -> Set[str]:
+    """Batched check_if_all_mjas_for_mjr_scraped: returns the subset of mjr_ids whose scraped MJA count has reached appointment_count_hint."""
+    mjr_ids = [mjr_id for mjr_id in set(mjr_ids) if mjr_id]
+    if not mjr_ids: return set()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(FULLY_SCRAPED_MJR_IDS_SQL, (json.dumps(mjr_ids), BookingProcessingStatus.SCRAPED.value))
+        fully_scraped = {row[0] for row in cursor.fetchall()}
+        logger.debug(f"{len(fully_scraped)} of {len(mjr_ids)} MJRs confirmed as fully scraped in DB.")
+        return fully_scraped
+    except sqlite3.Error as e:
+        logger.error(f"Error checking {len(mjr_ids)} MJRs for full scrape: {e}")
+        return set() # Assume not fully scraped on error
+
+def update_all_mja_statuses_for_mjr(conn: sqlite3.Connection, mjr_id: str, new_status: str, reason: Optional[str] = None, commit: bool = True):
+    """Updates the status of all MJA records associated with a given MJR ID. Pass commit=False to join the caller's transaction."""
     if not mjr_id:
         logger.warning("Attempted to update all MJA statuses without an MJR ID.")
         return
@@ -264,7 +401,7 @@ def update_all_mja_statuses_for_mjr(conn: sqlite3.Connection, mjr_id: str, new_s
     try:
         cursor = conn.cursor()
         cursor.execute(sql, (new_status, mjr_id, new_status))
-        conn.commit()
+        if commit: conn.commit()
         if cursor.rowcount > 0:
             log_msg = f"Updated status to '{new_status}' for {cursor.rowcount} MJA records of MJR {mjr_id}" + (f" (Reason: {reason})" if reason else "")
             logger.info(log_msg)
@@ -272,9 +409,38 @@ def update_all_mja_statuses_for_mjr(conn: sqlite3.Connection, mjr_id: str, new_s
             logger.debug(f"No MJA records needed status update to '{new_status}' for MJR {mjr_id}.")
     except sqlite3.Error as e:
         logger.error(f"Failed to update statuses for MJAs of MJR {mjr_id}: {e}")
+        if not commit: raise
         conn.rollback()
 
 
+def get_mjr_scraped_at(conn: sqlite3.Connection, mjr_id: str, max_age_seconds: int) -> Optional[int]:
+    """Returns the epoch time the MJR was last fully scraped, if that was within max_age_seconds."""
+    if not mjr_id: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT scraped_at FROM scraped_mjr_cache WHERE mjr_id = ? AND scraped_at > ?", (mjr_id, int(time.time()) - max_age_seconds))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read scrape cache for MJR {mjr_id}: {e}")
+        return None
+
+def record_mjr_scraped(conn: sqlite3.Connection, mjr_id: str, scraped_at: Optional[int] = None, commit: bool = True) -> Optional[int]:
+    """Marks an MJR as fully scraped. Pass commit=False to include it in the caller's transaction."""
+    if not mjr_id: return None
+    scraped_at = scraped_at if scraped_at is not None else int(time.time())
+    try:
+        conn.execute("INSERT OR REPLACE INTO scraped_mjr_cache (mjr_id, scraped_at) VALUES (?, ?)", (mjr_id, scraped_at))
+        if commit: conn.commit()
+        logger.debug(f"Recorded MJR {mjr_id} in scrape cache at {scraped_at}.")
+        return scraped_at
+    except sqlite3.Error as e:
+        logger.error(f"Failed to record MJR {mjr_id} in scrape cache: {e}")
+        if not commit: raise
+        conn.rollback()
+        return None
+
+
 # --- Functions from previous version assumed to be okay or not directly related to this issue ---
 def get_processed_booking_ids(conn: sqlite3.Connection) -> Set[str]:
     # ... (same as before) ...
@@ -296,16 +462,37 @@ def get_booking_refs(conn: sqlite3.Connection, booking_id: str) -> Optional[Tupl
         row = cursor.fetchone(); return row if row else (None, None)
     except sqlite3.Error as e: logger.error(f"Failed to retrieve booking refs for {booking_id}: {e}"); return (None, None)
 
-def update_booking_status(conn: sqlite3.Connection, booking_id: str, status: str, reason: Optional[str] = None):
-    # ... (same as before) ...
+UPDATE_BOOKING_STATUS_SQL = "UPDATE bookings SET status = ?, last_updated = CURRENT_TIMESTAMP WHERE booking_id = ? AND status <> ?"
+
+def update_booking_status(conn: sqlite3.Connection, booking_id: str, status: str, reason: Optional[str] = None, commit: bool = True):
+    # commit=False leaves the update in the caller's open transaction
      if not booking_id: logger.warning("Attempted to update status with no booking_id."); return
-     sql = "UPDATE bookings SET status = ?, last_updated = CURRENT_TIMESTAMP WHERE booking_id = ? AND status <> ?"
      try:
-         cursor = conn.cursor(); cursor.execute(sql, (status, booking_id, status)); conn.commit()
+         cursor = conn.cursor(); cursor.execute(UPDATE_BOOKING_STATUS_SQL, (status, booking_id, status))
+         if commit: conn.commit()
          log_msg = f"Updated status to '{status}' for booking {booking_id}" + (f" (Reason: {reason})" if reason else "")
          if cursor.rowcount > 0: logger.info(log_msg)
          else: logger.debug(f"Booking {booking_id} status already '{status}' or not found.")
-     except sqlite3.Error as e: logger.error(f"Failed to update status for booking {booking_id}: {e}"); conn.rollback()
+     except sqlite3.Error as e:
+         logger.error(f"Failed to update status for booking {booking_id}: {e}")
+         if not commit: raise
+         conn.rollback()
+
+
+def update_booking_statuses_bulk(conn: sqlite3.Connection, updates: List[Tuple[str, str, Optional[str]]], commit: bool = True):
+    """Applies many (booking_id, status, reason) updates with one executemany. Pass commit=False to join the caller's transaction."""
+    rows = [(status, booking_id, status) for booking_id, status, _reason in updates if booking_id]
+    if not rows: return
+    try:
+        conn.executemany(UPDATE_BOOKING_STATUS_SQL, rows)
+        if commit: conn.commit()
+        for booking_id, status, reason in updates:
+            logger.debug(f"Updated status to '{status}' for booking {booking_id}" + (f" (Reason: {reason})" if reason else ""))
+        logger.info(f"Applied {len(rows)} booking status updates.")
+    except sqlite3.Error as e:
+        logger.error(f"Failed to bulk update status for {len(rows)} bookings: {e}")
+        if not commit: raise
+        conn.rollback()
 
 
 def get_secondary_hints_for_mjr(conn: sqlite3.Connection, mjr_id: str) -> Optional[Tuple[Optional[int], Optional[str]]]:
@@ -342,31 +529,20 @@ def update_hints_for_mjr(conn: sqlite3.Connection, mjr_id: str, appointment_coun
         logger.debug(f"No valid hints to update for MJR {mjr_id}.")
         return
     
-    set_clauses = []
-    values = []
-    if appointment_count_hint is not None:
-        set_clauses.append("appointment_count_hint = ?")
-        values.append(appointment_count_hint)
-    if type_hint is not None:
-        set_clauses.append("type_hint = ?")
-        values.append(type_hint)
-    
-    if not set_clauses: return # Should not happen if previous check passes
-
-    values.append(mjr_id) # For the WHERE clause
-
-    sql = f"""
+    # A None hint keeps the stored value (COALESCE), so one fixed statement covers every combination of hints
+    sql = """
         UPDATE bookings 
-        SET {', '.join(set_clauses)}, last_updated = CURRENT_TIMESTAMP 
+        SET appointment_count_hint = COALESCE(?, appointment_count_hint), type_hint = COALESCE(?, type_hint), last_updated = CURRENT_TIMESTAMP 
         WHERE mjr_id = ? 
     """
+    values = (appointment_count_hint, type_hint, mjr_id)
     # To avoid updating if values are already the same (optional, but reduces writes)
     # Can add conditions to WHERE like: AND (ifnull(appointment_count_hint, -1) <> ifnull(?, -1) OR ...)
     # For simplicity, this updates all matching MJR records if hints are provided.
 
     try:
         cursor = conn.cursor()
-        cursor.execute(sql, tuple(values))
+        cursor.execute(sql, values)
         conn.commit()
         if cursor.rowcount > 0: 
             logger.info(f"Updated hints ({cursor.rowcount} MJA records) for MJR {mjr_id} with Count={appointment_count_hint}, Type='{type_hint}'.")
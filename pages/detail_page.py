@@ -17,9 +17,17 @@ class DetailPage:
     Page Object for the final booking detail (MJR) screen.
     Provides methods to identify the page and wait for it to load.
     Data extraction logic is handled by the DetailProcessor and Parsers.
+    The screen is only reachable by clicking through List -> Secondary -> MJR link: the app has no known deep link or
+    exported activity taking an MJR ID, so there is no open-by-ID shortcut. Already-scraped MJRs are skipped before the
+    first click instead (see BookingService / ListProcessor).
     """
     # Using a UIAutomator selector for the title as it's generally reliable
     TITLE_SELECTOR_TEXT_STARTS_WITH = "Booking #MJR"
+    TITLE_LOCATOR = (AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textStartsWith("{TITLE_SELECTOR_TEXT_STARTS_WITH}")') # Built once, reused by every check
+    DISCLAIMER_TEXT = "By accepting this assignment"
+    # Scrolls on-device until the disclaimer is on screen (one round-trip); raises NoSuchElementException if it never appears
+    DISCLAIMER_SCROLL_INTO_VIEW_LOCATOR = (AppiumBy.ANDROID_UIAUTOMATOR,
+        f'new UiScrollable(new UiSelector().scrollable(true)).scrollIntoView(new UiSelector().textContains("{DISCLAIMER_TEXT}"))')
 
     def __init__(self, driver):
         """Initializes the DetailPage."""
@@ -49,8 +57,7 @@ class DetailPage:
         try:
             logger.debug(f"Waiting up to {timeout}s for detail page title: '{self.TITLE_SELECTOR_TEXT_STARTS_WITH}'")
             WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located(
-                    (AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textStartsWith("{self.TITLE_SELECTOR_TEXT_STARTS_WITH}")'))
+                EC.presence_of_element_located(self.TITLE_LOCATOR)
             )
             logger.debug("Detail page title is displayed.")
         except TimeoutException:
@@ -66,11 +73,7 @@ class DetailPage:
         Uses a short explicit wait via a helper method.
         """
         logger.debug(f"Checking if detail page is displayed (title: '{self.TITLE_SELECTOR_TEXT_STARTS_WITH}', timeout: {timeout}s)")
-        element = self._find_element_for_check(
-            AppiumBy.ANDROID_UIAUTOMATOR,
-            f'new UiSelector().textStartsWith("{self.TITLE_SELECTOR_TEXT_STARTS_WITH}")',
-            timeout=timeout
-        )
+        element = self._find_element_for_check(*self.TITLE_LOCATOR, timeout=timeout)
         if element is not None:
             # For Appium, presence via WebDriverWait usually implies it's interactable enough.
             logger.debug("is_displayed check: Detail page title found.")
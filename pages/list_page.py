@@ -1,5 +1,7 @@
 # filename: pages/list_page.py
-import time
+import hashlib
+import html
+import re
 from appium.webdriver.common.appiumby import AppiumBy
 from selenium.common import (
     NoSuchElementException,
@@ -8,13 +10,16 @@ from selenium.common import (
 )
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from lxml import etree
 from parsers.mja_parser import parse_mja # This will now handle status prefixes
 from logger import get_logger
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 logger = get_logger(__name__)
 
+BOUNDS_REGEX = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+CARD_TAG_REGEX = re.compile(r"<android\.view\.ViewGroup\b([^>]*)>") # Attribute string of every ViewGroup start tag
+TAG_ATTR_REGEX = re.compile(r'([\w:.-]+)="([^"]*)"')
+
 class ListPage:
     """
     Page Object for the main booking list screen.
@@ -22,19 +27,37 @@ class ListPage:
     Handles scrolling of the list.
     """
     CARD_CONTAINER_SELECTOR = 'androidx.recyclerview.widget.RecyclerView'
+    CARD_CONTAINER_CLASS_ATTR = f'class="{CARD_CONTAINER_SELECTOR}"' # Container open/close markers in a page source, built once
+    CARD_CONTAINER_CLOSE_TAG = f'</{CARD_CONTAINER_SELECTOR}>'
     # XPath to find ViewGroup elements that are likely booking cards based on having a content-desc
     # We will rely on parse_mja to validate if it's a true booking card
     BOOKING_CARD_XPATH = '//android.view.ViewGroup[@content-desc]'
+    # Locator tuples built once; every lookup reuses the same selector string
+    CARD_CONTAINER_LOCATOR = (AppiumBy.CLASS_NAME, CARD_CONTAINER_SELECTOR)
+    # Native UiAutomator lookup of one card by MJA ID (content-desc may carry a status prefix, hence "contains").
+    # Much cheaper than an XPath contains(), which UiAutomator2 evaluates by walking the whole tree.
+    CARD_BY_ID_UIAUTOMATOR_TEMPLATE = 'new UiSelector().className("android.view.ViewGroup").descriptionContains("{booking_id}")'
+    # Same lookup restricted to a card that is clickable and enabled right now; UiAutomator only matches nodes in the
+    # current window, so a hit is also the live "still on screen" confirmation for the card about to be clicked
+    CLICKABLE_CARD_BY_ID_UIAUTOMATOR_TEMPLATE = CARD_BY_ID_UIAUTOMATOR_TEMPLATE + '.clickable(true).enabled(true)'
+    # Exact content-desc match (the accessibility id) for cards whose full description is known from the snapshot
+    CLICKABLE_CARD_BY_DESC_UIAUTOMATOR_TEMPLATE = 'new UiSelector().className("android.view.ViewGroup").description("{content_desc}").clickable(true).enabled(true)'
+    # Fraction of the container height moved per scroll; at most half, so a card cut off below the visible band
+    # (ListProcessor's 15%-85%) lands fully inside it rather than jumping past its top edge
+    CONTAINER_SCROLL_PERCENT = 0.5
 
 
     def __init__(self, driver):
         self.driver = driver
+        self.last_page_source_hash: Optional[bytes] = None # source_digest() of the page_source get_cards() last parsed
+        self._window_size: Optional[Dict[str, int]] = None # Fixed for the session, fetched on the first coordinate scroll
+        self._container_element_id: Optional[str] = None # RecyclerView element id; it survives scrolls, so it's looked up once
 
-    def is_displayed(self, timeout=5) -> bool:
+    def is_displayed(self, timeout=5, poll_frequency=0.5) -> bool:
         """Checks if the main list container is visible."""
         try:
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((AppiumBy.CLASS_NAME, self.CARD_CONTAINER_SELECTOR))
+            WebDriverWait(self.driver, timeout, poll_frequency=poll_frequency).until(
+                EC.presence_of_element_located(self.CARD_CONTAINER_LOCATOR)
             )
             logger.debug("List page container is displayed.")
             return True
@@ -45,40 +68,80 @@ class ListPage:
             logger.error(f"Error checking if list page is displayed: {e}")
             return False
 
-    def get_cards(self) -> List[Dict[str, Any]]:
+    @staticmethod
+    def source_digest(page_source: str) -> bytes:
+        """8-byte blake2b digest of a page source; equal digests mean the screen did not change."""
+        return hashlib.blake2b(page_source.encode('utf-8'), digest_size=8).digest()
+
+    def container_span(self, page_source: Optional[str]) -> Optional[Tuple[int, int]]:
+        """(start, end) offsets of the list container's sub-tree within page_source, or None if it isn't there."""
+        if not page_source: return None
+        class_pos = page_source.find(self.CARD_CONTAINER_CLASS_ATTR)
+        if class_pos < 0: return None
+        end = page_source.rfind(self.CARD_CONTAINER_CLOSE_TAG)
+        return page_source.rfind('<', 0, class_pos), (end if end > class_pos else len(page_source))
+
+    def container_digest(self, page_source: str) -> bytes:
+        """source_digest of the list container's sub-tree only, so status bar / toolbar changes don't count as list changes."""
+        span = self.container_span(page_source)
+        return self.source_digest(page_source[span[0]:span[1]] if span else page_source)
+
+    def is_list_source(self, page_source: Optional[str]) -> bool:
+        """True if the given page source contains the list container, i.e. it was captured on the list page."""
+        return self.container_span(page_source) is not None
+
+    @staticmethod
+    def parse_bounds(bounds_attr: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+        """Parses a UiAutomator bounds attribute '[x1,y1][x2,y2]' into (x1, y1, x2, y2)."""
+        match = BOUNDS_REGEX.fullmatch(bounds_attr or '')
+        return tuple(map(int, match.groups())) if match else None
+
+    def get_cards(self, page_source: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
         Finds all potential booking cards by parsing the page source XML
         and passes their content-desc to the mja_parser.
         The mja_parser will determine if it's a valid card and extract data including status.
 
+        Args:
+            page_source (Optional[str]): An already captured XML page source (e.g. the settled post-scroll snapshot).
+                                         If None, it will be fetched.
+
         Returns:
-            List[Dict[str, Any]]: A list of dictionaries, where each dictionary
-                                  contains the parsed data for a booking card.
+            Tuple[List[Dict[str, Any]], Optional[str]]: The parsed data for each booking card, and the raw XML
+                                  it was parsed from so callers can dump it without another page_source call.
         """
         cards_data = []
         logger.info("Getting list page cards using XML parsing...")
         try:
-            if not self.is_displayed(timeout=3):
-                logger.error("List page container not found before getting page source for cards.")
-                return cards_data
-
-            page_source = self.driver.page_source
+            if page_source is None: page_source = self.driver.page_source
             if not page_source:
                 logger.error("Failed to get page source for list page.")
-                return cards_data
-
-            xml_root = etree.fromstring(page_source.encode('utf-8'))
-            card_nodes = xml_root.xpath(self.BOOKING_CARD_XPATH)
-            logger.debug(f"Found {len(card_nodes)} potential card nodes via XPath on XML source (ViewGroup with content-desc).")
+                return cards_data, None
+            container_span = self.container_span(page_source) # The snapshot itself tells us whether we're on the list, no extra lookup
+            if container_span is None:
+                logger.error("List page container not found in page source for cards.")
+                return cards_data, page_source
+
+            container_start, container_end = container_span
+            self.last_page_source_hash = self.source_digest(page_source[container_start:container_end])
+            # One regex pass over the container's sub-tree of the raw XML instead of building a tree; same nodes as BOOKING_CARD_XPATH under it, in document order
+            card_nodes = [attrs for attrs in (dict(TAG_ATTR_REGEX.findall(tag_match.group(1))) for tag_match in CARD_TAG_REGEX.finditer(page_source, container_start, container_end))
+                          if 'content-desc' in attrs]
+            logger.debug(f"Found {len(card_nodes)} potential card nodes in the list container (ViewGroup with content-desc).")
 
             for node in card_nodes:
-                content_desc = node.get('content-desc', '')
+                content_desc = node['content-desc']
                 if content_desc: # Process any non-empty content-desc
+                    if '&' in content_desc: content_desc = html.unescape(content_desc) # XML entities, e.g. &amp;
                     logger.debug(f"Processing content-desc: '{content_desc}'")
                     try:
                         # parse_mja will handle status prefixes and MJA ID extraction
                         parsed_info = parse_mja(content_desc)
                         if parsed_info and parsed_info.get('booking_id'):
+                            parsed_info['clickable'] = node.get('clickable') == 'true' and node.get('enabled', 'true') == 'true'
+                            parsed_info['bounds'] = self.parse_bounds(node.get('bounds')) # (x1, y1, x2, y2) or None
+                            parsed_info['displayed'] = node.get('displayed', 'true') == 'true'
+                            parsed_info['content_desc'] = content_desc # Exact accessibility id, for locating the card without "contains"
                             cards_data.append(parsed_info)
                             logger.debug(f"Successfully parsed card: {parsed_info.get('booking_id')}, Status: {parsed_info.get('card_status').value}")
                         elif parsed_info and parsed_info.get('card_status') == BookingCardStatus.CANCELLED and parsed_info.get('booking_id') is None:
@@ -90,49 +153,61 @@ class ListPage:
 
                     except Exception as parse_e:
                         logger.error(f"Error parsing content-desc '{content_desc}': {parse_e}")
-        except etree.XMLSyntaxError as xml_e:
-            logger.error(f"Failed to parse page source XML: {xml_e}")
         except TimeoutException:
             logger.warning("List page container not found for get_cards.")
         except Exception as e:
             logger.exception(f"An unexpected error occurred in get_cards: {e}")
 
         logger.info(f"Successfully extracted data for {len(cards_data)} cards from list page XML source.")
-        return cards_data
+        return cards_data, page_source
+
+    def wait_for_source_change(self, previous_hash: Optional[bytes], timeout: float = 2.0, poll_frequency: float = 0.1) -> Optional[str]:
+        """
+        Polls page_source until the list container's hash differs from previous_hash (e.g. after a scroll has moved the list).
+        Returns the new page source, or None if nothing changed within timeout.
+        """
+        changed: Dict[str, str] = {}
+        def _source_changed(driver) -> bool:
+            page_source = driver.page_source
+            if page_source and self.container_digest(page_source) != previous_hash: changed['source'] = page_source
+            return 'source' in changed
+        try: WebDriverWait(self.driver, timeout, poll_frequency=poll_frequency).until(_source_changed)
+        except TimeoutException: logger.debug(f"List page source unchanged after {timeout}s.")
+        return changed.get('source')
 
     def scroll(self, last_element_booking_id: Optional[str] = None, direction: str = 'down'):
         """
-        Performs a scroll gesture, prioritizing anchoring to the last known element
-        or the scroll container, with refined coordinates and percentage.
+        Performs a scroll gesture on the list container, whose element id is resolved once and reused, so a scroll is
+        a single Appium command. Falls back to anchoring on the last known card, then to coordinates.
         """
         try:
             logger.debug(f"Scrolling {direction}...")
-            scroll_anchor_element = None
-            element_to_scroll_id = None
+            if self._container_element_id is None:
+                containers = self.driver.find_elements(*self.CARD_CONTAINER_LOCATOR)
+                if containers: self._container_element_id = containers[0].id
+            if self._container_element_id is not None:
+                try:
+                    self.driver.execute_script('mobile: scrollGesture', {
+                        'elementId': self._container_element_id,
+                        'direction': direction,
+                        'percent': self.CONTAINER_SCROLL_PERCENT
+                    })
+                    logger.debug(f"Scrolled {self.CARD_CONTAINER_SELECTOR} container {self._container_element_id} by {self.CONTAINER_SCROLL_PERCENT}.")
+                    return # No settle sleep: callers wait for the list content to change (ListProcessor: wait_for_source_change)
+                except Exception as container_scroll_e:
+                    logger.warning(f"Could not scroll cached container ('{container_scroll_e}'). Falling back to anchor scroll.")
+                    self._container_element_id = None # Re-resolved on the next scroll
 
+            element_to_scroll_id = None
             if last_element_booking_id:
-                 try:
-                      # This selector needs to find the element regardless of prefix, using contains MJA ID
-                      last_elem_selector = f'//android.view.ViewGroup[@content-desc and contains(@content-desc, "{last_element_booking_id}")]'
-                      scroll_anchor_element = WebDriverWait(self.driver, 2).until(
-                          EC.presence_of_element_located((AppiumBy.XPATH, last_elem_selector))
-                      )
-                      element_to_scroll_id = scroll_anchor_element.id
+                 # This selector needs to find the element regardless of prefix, using contains MJA ID
+                 last_elem_selector = self.CARD_BY_ID_UIAUTOMATOR_TEMPLATE.format(booking_id=last_element_booking_id)
+                 anchors = self.driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, last_elem_selector)
+                 if anchors:
+                      element_to_scroll_id = anchors[0].id
                       logger.debug(f"Found element containing {last_element_booking_id} to use as scroll anchor.")
-                 except (NoSuchElementException, TimeoutException):
-                      logger.warning(f"Could not re-find element containing {last_element_booking_id} for scroll. Attempting container scroll.")
-                      element_to_scroll_id = None
-
-            if not element_to_scroll_id: # Fallback to container
-                try:
-                    container_element = WebDriverWait(self.driver, 2).until(
-                        EC.presence_of_element_located((AppiumBy.CLASS_NAME, self.CARD_CONTAINER_SELECTOR))
-                    )
-                    element_to_scroll_id = container_element.id
-                    logger.debug(f"Using {self.CARD_CONTAINER_SELECTOR} container as scroll anchor.")
-                except (NoSuchElementException, TimeoutException):
-                    logger.warning(f"Could not find {self.CARD_CONTAINER_SELECTOR} container. Falling back to coordinate-based scroll.")
-                    element_to_scroll_id = None
+                 else:
+                      logger.warning(f"Could not re-find element containing {last_element_booking_id} for scroll. Falling back to coordinate-based scroll.")
 
             scroll_percent = 0.6
 
@@ -144,12 +219,13 @@ class ListPage:
                         'percent': scroll_percent
                     })
                     logger.debug(f"Scrolled using elementId: {element_to_scroll_id} with percent: {scroll_percent}")
-                    time.sleep(1); return
+                    return
                 except Exception as el_scroll_e:
                     logger.warning(f"Could not scroll using elementId ('{el_scroll_e}'). Falling back to coordinate-based scroll.")
 
             logger.debug("Performing coordinate-based screen scroll with refined bounds.")
-            size = self.driver.get_window_size()
+            if self._window_size is None: self._window_size = self.driver.get_window_size()
+            size = self._window_size
             start_x = size['width'] // 2
             start_y = int(size['height'] * 0.7); end_y = int(size['height'] * 0.3)
             scroll_gesture_height = start_y - end_y
@@ -165,7 +241,6 @@ class ListPage:
                 'percent': 1.0
             })
             logger.debug(f"Scrolled using coordinates from y={start_y} to y={end_y} (gesture height: {scroll_gesture_height}).")
-            time.sleep(1)
 
         except Exception as e:
             logger.exception(f"An error occurred during the scroll operation: {e}")
\ No newline at end of file
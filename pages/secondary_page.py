@@ -6,7 +6,6 @@ from selenium.webdriver.support import expected_conditions as EC
 from parsers.secondary_parser import parse_secondary_page_data # Import the parser
 from logger import get_logger
 from typing import Optional, Dict, Any
-import time
 
 logger = get_logger(__name__)
 
@@ -22,10 +21,13 @@ class SecondaryPage:
     # Using a generic approach for now; needs to be adapted to the actual app.
     # Example: A TextView containing "Booking #MJB"
     PAGE_TITLE_SELECTOR_TEXT_STARTS_WITH = "Booking #MJB" # Partial text for the title
+    TITLE_LOCATOR = (AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textStartsWith("{PAGE_TITLE_SELECTOR_TEXT_STARTS_WITH}")') # Built once, reused by every check
+    TITLE_SOURCE_MARKER = f'text="{PAGE_TITLE_SELECTOR_TEXT_STARTS_WITH}' # Same title, as it appears in a page source
     # Example: XPath for the clickable element leading to the MJR page
     # This is highly dependent on the app's structure.
     # It might be the element whose content-desc starts with "MJR"
-    MJR_LINK_XPATH_TEMPLATE = '//android.view.ViewGroup[@content-desc and starts-with(@content-desc, "{mjr_id}")]'
+    # Native UiSelector rather than XPath, so the lookup doesn't serialize and walk the whole hierarchy
+    MJR_LINK_UIAUTOMATOR_TEMPLATE = 'new UiSelector().className("android.view.ViewGroup").descriptionStartsWith("{mjr_id}")'
 
 
     def __init__(self, driver):
@@ -37,7 +39,7 @@ class SecondaryPage:
             # Check for an element that uniquely identifies the secondary page
             # Using text based locator as an example
             WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((AppiumBy.ANDROID_UIAUTOMATOR, f'new UiSelector().textStartsWith("{self.PAGE_TITLE_SELECTOR_TEXT_STARTS_WITH}")'))
+                EC.presence_of_element_located(self.TITLE_LOCATOR)
             )
             logger.debug("Secondary page title is displayed.")
             return True
@@ -48,6 +50,10 @@ class SecondaryPage:
             logger.error(f"Error checking if secondary page is displayed: {e}")
             return False
 
+    def is_secondary_source(self, page_source: Optional[str]) -> bool:
+        """True if the given page source shows the secondary page title, i.e. it was captured on this page. No Appium calls."""
+        return bool(page_source) and self.TITLE_SOURCE_MARKER in page_source
+
     def get_info(self, page_source: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Extracts MJB ID, MJR ID, appointment count hint, and type hint from the page source.
@@ -95,16 +101,17 @@ class SecondaryPage:
             logger.error("Cannot click MJR link: No MJR ID provided.")
             return False
 
-        mjr_link_selector = self.MJR_LINK_XPATH_TEMPLATE.format(mjr_id=mjr_id)
-        logger.debug(f"Attempting to click MJR link element using XPath: {mjr_link_selector}")
+        mjr_link_selector = self.MJR_LINK_UIAUTOMATOR_TEMPLATE.format(mjr_id=mjr_id)
+        logger.debug(f"Attempting to click MJR link element using UiSelector: {mjr_link_selector}")
         try:
             mjr_element = WebDriverWait(self.driver, timeout).until(
-                EC.element_to_be_clickable((AppiumBy.XPATH, mjr_link_selector))
+                EC.element_to_be_clickable((AppiumBy.ANDROID_UIAUTOMATOR, mjr_link_selector))
             )
             mjr_element.click()
             logger.debug(f"Clicked MJR link element for {mjr_id}.")
-            # Add a short pause for page transition to begin
-            time.sleep(1.5)
+            # Wait for the page transition to begin: returns as soon as this page's title is gone, at most 1.5s
+            try: WebDriverWait(self.driver, 1.5, poll_frequency=0.1).until_not(EC.presence_of_element_located(self.TITLE_LOCATOR))
+            except TimeoutException: logger.debug(f"Secondary page title still present 1.5s after clicking {mjr_id}; continuing.")
             return True
         except TimeoutException:
             logger.error(f"Timeout: MJR link element for {mjr_id} not found or not clickable within {timeout}s.")
@@ -1,9 +1,13 @@
 # filename: parsers/detail_parser.py
+import logging
 import re
 import sys
-from typing import Optional, List, Dict, Any, Tuple
+from bisect import bisect_left
+from itertools import islice
+from typing import Optional, List, Dict, Any, Tuple, Iterable
 import html
 from datetime import datetime, timedelta
+from lxml import etree
 from logger import get_logger
 from utils.time_utils import parse_datetime_from_time_string, calculate_duration_string
 
@@ -20,6 +24,10 @@ DATE_PART_REGEX = re.compile(r"^(\d{2}-\d{2}-\d{4})\s+At$")
 TIME_PART_REGEX = re.compile(r"^(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2})$")
 POSTCODE_IN_ADDRESS_REGEX = re.compile(r'\b([A-Z]{1,2}\d{1,2}[A-Z]?\s?\d[A-Z]{2})\b', re.IGNORECASE)
 MEETING_LINK_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b|\bhttps?://\S+')
+ADDRESS_KEYWORD_REGEX = re.compile(r"street|road|court|house|centre|lane|building|floor", re.IGNORECASE) # One scan instead of a lower() and eight substring checks
+UK_DATE_PATTERN = re.compile(r"^\d{2}-\d{2}-\d{4}$")
+TEXT_ATTRIBUTE_REGEX = re.compile(r'text="([^"]*)"')
+TEXT_ATTRIBUTE_WORD_REGEX = re.compile(r'\btext="([^"]*)"') # Quick multiday check: skips attributes that merely end in "text"
 MULTIDAY_TEXT = "Multiday"
 LANGUAGE_TEXT = "English to Polish"
 MEETING_LINK_TEXT = "Meeting Link"
@@ -36,15 +44,45 @@ PAYMENT_LABELS_MAP = {
     "service line item": "pay_sl", "travel distance line item": "pay_td",
     "travel time line item": "pay_tt", "automation enhancement payment": "pay_aep",
 }
+PAYMENT_FIELD_SUFFIXES = ('sl', 'td', 'tt', 'aep', 'ooh', 'urg') # Order of the day_total sum
+MULTIDAY_PAY_KEYS = tuple(f"pay_{suffix}" for suffix in PAYMENT_FIELD_SUFFIXES) # Keys in each multiday_payments item
+DAY_PAY_KEYS = tuple(f"day_pay_{suffix}" for suffix in PAYMENT_FIELD_SUFFIXES) # Top-level keys for a single day
 OOH_SUBSTRING = "uplift" # For "Out of Hours Uplift"
 URGENCY_SUBSTRING = "urgency" # For "Urgency Payment"
+XML_TREE_PARSER = etree.XMLParser(huge_tree=True, recover=True)
+MJR_HEADER_PREFIX = "Booking #MJR"
+# Every anchor the extractors branch on, as one alternation, so a single pass over texts locates them all.
+# Group names are the keys returned by scan_anchors().
+ANCHOR_PATTERN = re.compile(
+    rf"(?P<mjr>{re.escape(MJR_HEADER_PREFIX)})"
+    rf"|(?P<mja>{MJA_REF_PATTERN.pattern})"
+    rf"|(?P<disclaimer>{re.escape(DISCLAIMER_START_TEXT)})"
+    rf"|(?P<multiday>{re.escape(MULTIDAY_TEXT)}\Z)"
+    rf"|(?P<language>{re.escape(LANGUAGE_TEXT)}\Z)"
+    rf"|(?P<total>{re.escape(TOTAL_TEXT)}\Z)"
+    rf"|(?P<service_line>{re.escape(SL_TEXT)}\Z)"
+    rf"|(?P<info_terminator>(?:{'|'.join(re.escape(t) for t in INFO_BLOCK_TERMINATORS if t and t != SL_TEXT)})\Z)"
+)
+
+# Date line, time range and money value shapes as one alternation: classify_text() tells them apart with a single match.
+# The date/time alternatives are DATE_PART_REGEX / TIME_PART_REGEX; inner groups carry the values.
+TEXT_CLASS_PATTERN = re.compile(
+    r"(?P<money>£\s*[\d,]+(?:\.\d+)?)\Z"
+    r"|(?P<date>(?P<date_value>\d{2}-\d{2}-\d{4})\s+At)\Z"
+    r"|(?P<time>(?P<time_start>\d{1,2}:\d{2})\s*-\s*(?P<time_end>\d{1,2}:\d{2}))\Z"
+)
+
+def classify_text(raw: Optional[str]) -> Tuple[Optional[str], Optional["re.Match[str]"]]:
+    """Returns ('money' | 'date' | 'time', match) for a stripped text of that shape, else (None, None)."""
+    m = TEXT_CLASS_PATTERN.match(raw) if raw else None
+    return (m.lastgroup, m) if m else (None, None)
 
 def parse_money(raw_value: Optional[str]) -> Optional[float]:
     if raw_value is None or '£' not in raw_value:
         if raw_value is not None:
             logger.debug(f"Value '{raw_value}' not parsed as money: '£' missing.")
         return None
-    cleaned = re.sub(r"[£,]", "", raw_value).strip()
+    cleaned = raw_value.replace("£", "").replace(",", "").strip() # Two str.replace calls beat a regex sub on these short values
     try:
         return float(cleaned)
     except (ValueError, TypeError):
@@ -55,11 +93,11 @@ def parse_uk_date(raw_date_str: Optional[str]) -> Optional[str]:
     if raw_date_str is None:
         return None
     date_part = raw_date_str.strip().split(' ')[0]
-    if not re.match(r"^\d{2}-\d{2}-\d{4}$", date_part):
+    if not UK_DATE_PATTERN.match(date_part):
         logger.warning(f"Date string '{date_part}' is not in DD-MM-YYYY format.")
         return None
     try:
-        datetime.strptime(date_part, "%d-%m-%Y")
+        datetime(int(date_part[6:]), int(date_part[3:5]), int(date_part[:2])) # UK_DATE_PATTERN fixed the layout; this only range-checks
         return date_part
     except ValueError:
         logger.warning(f"Date string '{date_part}' is not a valid date.")
@@ -78,36 +116,69 @@ def parse_time(raw_time: Optional[str]) -> Optional[str]: # This is for HH:MM:SS
     logger.warning(f"Could not parse time value to HH:MM:SS string: '{raw_time}'")
     return None
 
-def _extract_texts_from_xml(xml_content: str) -> List[str]:
+def parse_xml_tree(xml_content: str) -> Optional[Any]:
+    """Parses a page source once so every extraction on the same snapshot can share the tree."""
+    if not xml_content:
+        return None
+    try:
+        return etree.fromstring(xml_content.encode('utf-8'), parser=XML_TREE_PARSER)
+    except (etree.XMLSyntaxError, ValueError) as e:
+        logger.error(f"Could not parse XML into a tree: {e}")
+        return None
+
+def _append_text_lines(values: Iterable[str], texts: List[str]) -> List[str]:
+    """Appends the non-empty stripped lines of each (already unescaped) text value to texts."""
+    append_text = texts.append
+    for cleaned_text_with_internal_newlines in values:
+        if '\n' not in cleaned_text_with_internal_newlines: # Most values are one line: no split needed
+            stripped_line = cleaned_text_with_internal_newlines.strip()
+            if stripped_line: append_text(stripped_line)
+            continue
+        for line in cleaned_text_with_internal_newlines.split('\n'):
+            stripped_line = line.strip()
+            if stripped_line: append_text(stripped_line)
+    return texts
+
+def _extract_texts_from_xml(xml_content: str, tree: Optional[Any] = None) -> List[str]:
     texts: List[str] = []
-    text_attribute_regex = re.compile(r'text="([^"]*)"')
     try:
-        matches = text_attribute_regex.finditer(xml_content)
-        for match in matches:
-            value = match.group(1)
-            cleaned_text_with_internal_newlines = html.unescape(value).replace("&#10;", "\n")
-            lines = cleaned_text_with_internal_newlines.split('\n')
-            for line in lines:
-                stripped_line = line.strip()
-                if stripped_line:
-                    texts.append(stripped_line)
+        if tree is not None:
+            values = tree.xpath("//*[@text]/@text") # Entities are already resolved by lxml
+        else:
+            # One regex scan over the raw source; only values carrying an entity (e.g. &#10; line breaks) pay for unescape
+            values = (html.unescape(value) if '&' in value else value for value in TEXT_ATTRIBUTE_REGEX.findall(xml_content))
+        _append_text_lines(values, texts)
     except Exception as e:
         logger.error(f"Could not regex-process XML: {e}")
     return texts
 
-def extract_header_and_booking_type(texts: List[str]) -> Tuple[Dict[str, Any], bool, Optional[int]]:
+def scan_anchors(texts: List[str]) -> Dict[str, List[int]]:
+    """Locates every anchor text in one pass. Returns anchor name -> ascending indices into texts."""
+    anchors: Dict[str, List[int]] = {name: [] for name in ANCHOR_PATTERN.groupindex}
+    match_anchor = ANCHOR_PATTERN.match
+    for i, t in enumerate(texts):
+        m = match_anchor(t)
+        if m: anchors[m.lastgroup].append(i)
+    return anchors
+
+def _first_anchor_at_or_after(indices: List[int], start: int, default: int) -> int:
+    pos = bisect_left(indices, start)
+    return indices[pos] if pos < len(indices) else default
+
+def extract_header_and_booking_type(texts: List[str], anchors: Optional[Dict[str, List[int]]] = None) -> Tuple[Dict[str, Any], bool, Optional[int]]:
     # (This function seems okay, assuming it correctly identifies is_multiday and multiday_date_range_raw)
     # ... (previous implementation of extract_header_and_booking_type) ...
     header_data = {'mjr_id_raw': None, 'total_value_header_raw': None, 'date_time_raw_tuple': None, 'multiday_date_range_raw': None, 'multiday_appointment_count_raw': None}
     is_multiday = False
-    lang_idx = -1
-    mjr_id_idx = next((i for i, t in enumerate(texts) if t.startswith("Booking #MJR")), -1)
-    multiday_idx = next((i for i, t in enumerate(texts) if t == MULTIDAY_TEXT), -1)
-    lang_idx = next((i for i, t in enumerate(texts) if t == LANGUAGE_TEXT), -1) 
+    anchors = anchors if anchors is not None else scan_anchors(texts)
+    mjr_id_idx = _first_anchor_at_or_after(anchors['mjr'], 0, -1)
+    multiday_idx = _first_anchor_at_or_after(anchors['multiday'], 0, -1)
+    lang_idx = _first_anchor_at_or_after(anchors['language'], 0, -1)
     if mjr_id_idx != -1:
         mjr_match = MJR_ID_PATTERN.search(texts[mjr_id_idx])
         header_data['mjr_id_raw'] = mjr_match.group(1) if mjr_match else texts[mjr_id_idx]
-    header_data['total_value_header_raw'] = next((t for i, t in enumerate(texts) if t.startswith('£') and (lang_idx == -1 or i < lang_idx)), None)
+    header_texts = islice(texts, lang_idx if lang_idx != -1 else None) # The header total sits before the language line
+    header_data['total_value_header_raw'] = next((t for t in header_texts if t.startswith('£')), None)
     is_multiday = (multiday_idx != -1)
     if is_multiday:
         if multiday_idx + 2 < len(texts) and (lang_idx == -1 or multiday_idx < lang_idx):
@@ -117,8 +188,8 @@ def extract_header_and_booking_type(texts: List[str]) -> Tuple[Dict[str, Any], b
         date_part_str = None
         time_part_str = None
         for i, current_line_text in enumerate(texts):
-            if DATE_PART_REGEX.match(current_line_text):
-                if i + 1 < len(texts) and TIME_PART_REGEX.match(texts[i+1]):
+            if classify_text(current_line_text)[0] == 'date':
+                if i + 1 < len(texts) and classify_text(texts[i+1])[0] == 'time':
                     date_part_str = current_line_text
                     time_part_str = texts[i+1]
                     break
@@ -130,7 +201,12 @@ def extract_header_and_booking_type(texts: List[str]) -> Tuple[Dict[str, Any], b
     return header_data, is_multiday, lang_idx if lang_idx != -1 else None
 
 
-def extract_info_block(texts: List[str], lang_idx: int) -> Dict[str, Any]:
+def _looks_like_street_line(text: str) -> bool:
+    """An address line without a postcode: names a street-ish word and isn't a booking type, distance, phone or link label."""
+    return (ADDRESS_KEYWORD_REGEX.search(text) is not None and '|' not in text and not DISTANCE_PATTERN.search(text)
+            and not PHONE_PATTERN.match(text) and text != MEETING_LINK_TEXT)
+
+def extract_info_block(texts: List[str], lang_idx: int, anchors: Optional[Dict[str, List[int]]] = None) -> Dict[str, Any]:
     # ... (previous implementation of extract_info_block - assuming this part is largely correct for common data) ...
     info_data = {k: None for k in ['language_pair_raw', 'client_name_raw', 'address_line1_raw', 'address_line2_raw', 'booking_type_raw', 'contact_name_raw', 'contact_phone_raw', 'distance_raw', 'meeting_link_raw']}
     if lang_idx == -1 or lang_idx >= len(texts):
@@ -138,13 +214,11 @@ def extract_info_block(texts: List[str], lang_idx: int) -> Dict[str, Any]:
         return info_data
     info_data['language_pair_raw'] = texts[lang_idx]
     start_processing_idx = lang_idx + 1
-    payment_start_idx = len(texts) 
-    for i, t in enumerate(texts[start_processing_idx:], start=start_processing_idx):
-        if MJA_REF_PATTERN.match(t) or t in INFO_BLOCK_TERMINATORS:
-            payment_start_idx = i
-            break
+    anchors = anchors if anchors is not None else scan_anchors(texts)
+    # The info block ends at the first MJA ref or terminator after the language line
+    payment_start_idx = min(_first_anchor_at_or_after(anchors[name], start_processing_idx, len(texts)) for name in ('mja', 'service_line', 'info_terminator'))
     potential_info_texts = texts[start_processing_idx:payment_start_idx]
-    logger.debug(f"Info block scan range: {start_processing_idx} to {payment_start_idx}. Processing {len(potential_info_texts)} items: {potential_info_texts}")
+    logger.debug("Info block scan range: %d to %d. Processing %d items: %s", start_processing_idx, payment_start_idx, len(potential_info_texts), potential_info_texts)
     ptr = 0
     if ptr < len(potential_info_texts):
         candidate = potential_info_texts[ptr]
@@ -164,14 +238,15 @@ def extract_info_block(texts: List[str], lang_idx: int) -> Dict[str, Any]:
     addr1_candidate = potential_info_texts[ptr] if ptr < len(potential_info_texts) else None
     addr2_candidate = potential_info_texts[ptr+1] if ptr + 1 < len(potential_info_texts) else None
     address_lines_found = 0
-    if addr1_candidate and addr2_candidate and (POSTCODE_IN_ADDRESS_REGEX.search(addr2_candidate) or (any(word in addr1_candidate.lower() for word in ["street", "road", "court", "house", "centre", "lane", "building", "floor"]) and '|' not in addr1_candidate and not DISTANCE_PATTERN.search(addr1_candidate) and not PHONE_PATTERN.match(addr1_candidate) and addr1_candidate != MEETING_LINK_TEXT)):
+    addr1_is_street = bool(addr1_candidate) and _looks_like_street_line(addr1_candidate)
+    if addr1_candidate and addr2_candidate and (POSTCODE_IN_ADDRESS_REGEX.search(addr2_candidate) or addr1_is_street):
         info_data['address_line1_raw'] = potential_info_texts[ptr]
         ptr +=1
         info_data['address_line2_raw'] = potential_info_texts[ptr]
         ptr +=1
         address_lines_found = 2
         logger.debug(f"  Address L1: '{addr1_candidate}', L2: '{addr2_candidate}'")
-    elif addr1_candidate and not info_data.get('address_line1_raw') and (POSTCODE_IN_ADDRESS_REGEX.search(addr1_candidate) or (any(word in addr1_candidate.lower() for word in ["street", "road", "court", "house", "centre", "lane", "building", "floor"]) and '|' not in addr1_candidate and not DISTANCE_PATTERN.search(addr1_candidate) and not PHONE_PATTERN.match(addr1_candidate) and addr1_candidate != MEETING_LINK_TEXT)):
+    elif addr1_candidate and not info_data.get('address_line1_raw') and (POSTCODE_IN_ADDRESS_REGEX.search(addr1_candidate) or addr1_is_street):
         info_data['address_line1_raw'] = potential_info_texts[ptr]
         ptr +=1
         address_lines_found = 1
@@ -205,43 +280,54 @@ def extract_info_block(texts: List[str], lang_idx: int) -> Dict[str, Any]:
         if value is not None and isinstance(value, str) and ( "undefined" in value.lower() or value.strip() == '0' or value.strip().lower() == 'null'):
             info_data[key] = None
             logger.debug(f"Sanitized '{key}' from '{value}' to None.")
-    logger.debug(f"Finished parsing info block: {info_data}")
+    logger.debug("Finished parsing info block: %s", info_data)
     return info_data
 
 
-def extract_mja_payment_blocks(texts: List[str]) -> List[Dict[str, Any]]:
+def _collect_payment_pairs(texts: List[str], idx: int, block_end_idx: int, payments: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reads label / '£' value pairs from texts[idx:block_end_idx] into payments (pay_sl, pay_td, pay_urg, ...).
+    A label whose next text isn't money is skipped on its own; the first uplift wins if there are several.
+    """
+    labels_map_get = PAYMENT_LABELS_MAP.get
+    while idx + 1 < block_end_idx: # Need a label and a value
+        value_text = texts[idx + 1]
+        if value_text.startswith('£'):
+            label_lower = texts[idx].lower()
+            pay_key = labels_map_get(label_lower)
+            if pay_key:
+                payments[pay_key] = value_text
+            elif URGENCY_SUBSTRING in label_lower:
+                payments['pay_urg'] = value_text
+            elif OOH_SUBSTRING in label_lower and 'pay_ooh' not in payments:
+                payments['pay_ooh'] = value_text
+            idx += 2 # Move past label and value
+        else:
+            idx += 1
+    return payments
+
+
+def _parse_day_payments(payment_block: Dict[str, Any]) -> Tuple[List[Optional[float]], Optional[float]]:
+    """Parses pay_<suffix> for PAYMENT_FIELD_SUFFIXES in order; returns (values, sum of those found or None if none were)."""
+    values = [parse_money(payment_block.get(f"pay_{suffix}")) for suffix in PAYMENT_FIELD_SUFFIXES]
+    found = [value for value in values if value is not None]
+    return values, (sum(found) if found else None)
+
+
+def extract_mja_payment_blocks(texts: List[str], anchors: Optional[Dict[str, List[int]]] = None) -> List[Dict[str, Any]]:
     mja_payment_blocks = []
-    mja_indices = [i for i, t in enumerate(texts) if MJA_REF_PATTERN.match(t)]
+    anchors = anchors if anchors is not None else scan_anchors(texts)
+    mja_indices = anchors['mja']
 
     if not mja_indices: # Handle single day booking without explicit MJA prefix (unlikely for payment blocks)
         # This case assumes payment items (SL_TEXT etc.) appear directly if no MJA refs
-        sl_idx = next((i for i,t in enumerate(texts) if t == SL_TEXT), -1)
+        sl_idx = _first_anchor_at_or_after(anchors['service_line'], 0, -1)
         if sl_idx != -1:
             logger.debug("No MJA refs found, looking for a single payment block starting with Service Line Item.")
             single_day_payments = {'mja': None} # MJA ID will be from header for single day cases
             # Payment items for this single block end at TOTAL_TEXT or end of list
-            block_end_idx = next((k for k, t_val in enumerate(texts[sl_idx:], start=sl_idx) if t_val == TOTAL_TEXT), len(texts))
-            
-            idx = sl_idx # Start from SL_TEXT itself
-            while idx < block_end_idx:
-                if idx + 1 < block_end_idx: # Need a label and a value
-                    label_text = texts[idx]
-                    value_text = texts[idx+1]
-                    label_lower = label_text.lower()
-                    
-                    if value_text.startswith('£'): # Check if value is a monetary amount
-                        pay_key = PAYMENT_LABELS_MAP.get(label_lower)
-                        if pay_key:
-                            single_day_payments[pay_key] = value_text
-                        elif URGENCY_SUBSTRING in label_lower:
-                            single_day_payments['pay_urg'] = value_text
-                        elif OOH_SUBSTRING in label_lower and 'pay_ooh' not in single_day_payments: # Avoid overwriting if multiple uplifts
-                            single_day_payments['pay_ooh'] = value_text
-                        idx += 2 # Move past label and value
-                    else: # Value is not '£...', might be end of useful pairs for this item type
-                        idx += 1
-                else: # No pair left
-                    idx += 1
+            block_end_idx = _first_anchor_at_or_after(anchors['total'], sl_idx, len(texts))
+            _collect_payment_pairs(texts, sl_idx, block_end_idx, single_day_payments) # Start from SL_TEXT itself
             if len(single_day_payments) > 1 : # Only add if actual payment items found besides 'mja': None
                 mja_payment_blocks.append(single_day_payments)
         else:
@@ -267,27 +353,7 @@ def extract_mja_payment_blocks(texts: List[str]) -> List[Dict[str, Any]]:
         
         logger.debug(f"  Extracting payments for MJA {mja_ref} (text index {current_mja_start_idx}) up to text index {block_end_idx}")
         
-        idx = current_mja_start_idx + 1 # Start looking for payments after the MJA reference itself
-        while idx < block_end_idx:
-            if idx + 1 < block_end_idx: # Need a label and a value
-                label_text = texts[idx]
-                value_text = texts[idx+1]
-                label_lower = label_text.lower()
-                
-                if value_text.startswith('£'): # Check if value is a monetary amount
-                    pay_key = PAYMENT_LABELS_MAP.get(label_lower)
-                    if pay_key:
-                        payment_details[pay_key] = value_text
-                    elif URGENCY_SUBSTRING in label_lower:
-                        payment_details['pay_urg'] = value_text
-                    elif OOH_SUBSTRING in label_lower and 'pay_ooh' not in payment_details:
-                        payment_details['pay_ooh'] = value_text
-                    idx += 2 # Move past label and value
-                else: # Value is not '£...', might be end of useful pairs for this specific MJA block
-                      # or just a non-payment related text item.
-                    idx += 1
-            else: # No pair left
-                idx += 1
+        _collect_payment_pairs(texts, current_mja_start_idx + 1, block_end_idx, payment_details) # Payments follow the MJA reference itself
         if len(payment_details) > 1: # Add if any actual payment items were found besides just the 'mja' key
             mja_payment_blocks.append(payment_details)
             
@@ -295,17 +361,17 @@ def extract_mja_payment_blocks(texts: List[str]) -> List[Dict[str, Any]]:
     return mja_payment_blocks
 
 
-def extract_notes_and_total(texts: List[str]) -> Dict[str, Any]:
+def extract_notes_and_total(texts: List[str], anchors: Optional[Dict[str, List[int]]] = None) -> Dict[str, Any]:
     # ... (previous implementation of extract_notes_and_total - assuming this part is largely correct for overall total and notes) ...
     notes_total_data = {'notes_raw': None, 'pay_total_raw': None}
-    disclaimer_idx = next((i for i, t in enumerate(texts) if t.startswith(DISCLAIMER_START_TEXT)), len(texts))
+    anchors = anchors if anchors is not None else scan_anchors(texts)
+    disclaimer_idx = _first_anchor_at_or_after(anchors['disclaimer'], 0, len(texts))
     # Find the *last* TOTAL before the disclaimer, as this is likely the grand total
     total_label_idx = -1
-    for i in range(disclaimer_idx -1, -1, -1): # Search backwards from disclaimer
-        if texts[i] == TOTAL_TEXT:
-            if i + 1 < disclaimer_idx and texts[i+1].startswith('£'): # Ensure it's followed by a monetary value
-                total_label_idx = i
-                break 
+    for i in reversed(anchors['total'][:bisect_left(anchors['total'], disclaimer_idx)]): # Search backwards from disclaimer
+        if i + 1 < disclaimer_idx and texts[i+1].startswith('£'): # Ensure it's followed by a monetary value
+            total_label_idx = i
+            break 
             
     if total_label_idx != -1:
         notes_start_idx = total_label_idx + 1 # Text after TOTAL label
@@ -325,6 +391,20 @@ def extract_notes_and_total(texts: List[str]) -> Dict[str, Any]:
     return notes_total_data
 
 
+def extract_all(texts: List[str]) -> Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]], Dict[str, Any], bool, Optional[int]]:
+    """
+    Runs the header, info, payment and notes extractors off a single anchor scan of texts.
+    Returns (header_info, info_block, mja_payment_blocks, notes_total_info, is_multiday, lang_idx).
+    info_block is empty when the language anchor is missing.
+    """
+    anchors = scan_anchors(texts)
+    header_info, is_multiday, lang_idx = extract_header_and_booking_type(texts, anchors)
+    info_block = extract_info_block(texts, lang_idx, anchors) if lang_idx is not None else {}
+    mja_payment_blocks = extract_mja_payment_blocks(texts, anchors)
+    notes_total_info = extract_notes_and_total(texts, anchors)
+    return header_info, info_block, mja_payment_blocks, notes_total_info, is_multiday, lang_idx
+
+
 def parse_detail_data(
     header_info: Dict[str, Any], is_multiday: bool, info_block: Dict[str, Any],
     payment_blocks: List[Dict[str, Any]], notes_total_info: Dict[str, Any]
@@ -351,17 +431,17 @@ def parse_detail_data(
         date_time_tuple = header_info.get('date_time_raw_tuple')
         if date_time_tuple and isinstance(date_time_tuple, tuple) and len(date_time_tuple) == 2:
             date_part_str, time_part_str = date_time_tuple
-            date_match = DATE_PART_REGEX.match(date_part_str)
-            if date_match:
-                parsed['booking_date'] = parse_uk_date(date_match.group(1))
-            time_match = TIME_PART_REGEX.match(time_part_str)
-            if time_match:
+            date_kind, date_match = classify_text(date_part_str)
+            if date_kind == 'date':
+                parsed['booking_date'] = parse_uk_date(date_match.group('date_value'))
+            time_kind, time_match = classify_text(time_part_str)
+            if time_kind == 'time':
                 # Use the raw time strings for start_time_raw, end_time_raw if needed by other logic
                 # For direct storage, parse_time converts to HH:MM:SS string
-                parsed['start_time'] = parse_time(time_match.group(1))
-                parsed['end_time'] = parse_time(time_match.group(2))
-                st_obj = parse_datetime_from_time_string(time_match.group(1))
-                et_obj = parse_datetime_from_time_string(time_match.group(2))
+                parsed['start_time'] = parse_time(time_match.group('time_start'))
+                parsed['end_time'] = parse_time(time_match.group('time_end'))
+                st_obj = parse_datetime_from_time_string(time_match.group('time_start'))
+                et_obj = parse_datetime_from_time_string(time_match.group('time_end'))
                 parsed['duration'] = calculate_duration_string(st_obj, et_obj)
         else:
             logger.warning(f"Could not parse date/time for single day from header: {date_time_tuple}")
@@ -398,9 +478,7 @@ def parse_detail_data(
 
     # Process payments
     parsed['multiday_payments'] = [] # Holds list of dicts, each dict is one MJA's data for multiday
-    
-    # Fields for individual day payments (these will be at top level for single day, or per item in multiday_payments)
-    payment_field_suffixes = ['sl', 'td', 'tt', 'aep', 'ooh', 'urg']
+    # Day payment fields (PAYMENT_FIELD_SUFFIXES) sit at top level for single day, or per item in multiday_payments
 
     if is_multiday:
         start_date_obj: Optional[datetime.date] = None
@@ -433,22 +511,13 @@ def parse_detail_data(
             day_specific_data['end_time'] = None
             day_specific_data['duration'] = None # Individual duration might not be available
 
-            current_day_total_calc = 0.0
-            found_any_payment_for_day = False
-            for key_suffix in payment_field_suffixes:
-                raw_payment_val = mja_day_block_raw.get(f"pay_{key_suffix}")
-                parsed_payment_val = parse_money(raw_payment_val)
-                day_specific_data[f'pay_{key_suffix}'] = parsed_payment_val
-                if parsed_payment_val is not None:
-                    current_day_total_calc += parsed_payment_val
-                    found_any_payment_for_day = True
-            
-            day_specific_data['day_total'] = current_day_total_calc if found_any_payment_for_day else None # Sum of actual payments for this MJA
+            day_values, day_total = _parse_day_payments(mja_day_block_raw)
+            day_specific_data.update(zip(MULTIDAY_PAY_KEYS, day_values))
+            day_specific_data['day_total'] = day_total # Sum of actual payments for this MJA, None if it had none
             parsed['multiday_payments'].append(day_specific_data)
         
         # Nullify top-level day_pay_ and day_total for multiday MJR record, they are per MJA
-        for key_suffix in payment_field_suffixes:
-            parsed[f'day_pay_{key_suffix}'] = None
+        parsed.update(dict.fromkeys(DAY_PAY_KEYS))
         parsed['day_total'] = None # Overall total is MJR level, day_total is per MJA in multiday_payments
 
     else: # Single Day
@@ -457,18 +526,10 @@ def parse_detail_data(
              parsed['mja_id'] = payment_blocks[0].get('mja')
 
         single_day_payment_data_block = payment_blocks[0] if payment_blocks else {}
-        current_day_total_calc = 0.0
-        found_any_payment_for_day = False
-        for key_suffix in payment_field_suffixes:
-            raw_payment_val = single_day_payment_data_block.get(f"pay_{key_suffix}")
-            parsed_payment_val = parse_money(raw_payment_val)
-            parsed[f"day_pay_{key_suffix}"] = parsed_payment_val
-            if parsed_payment_val is not None:
-                current_day_total_calc += parsed_payment_val
-                found_any_payment_for_day = True
-        
+        day_values, day_total = _parse_day_payments(single_day_payment_data_block)
+        parsed.update(zip(DAY_PAY_KEYS, day_values))
         # For single day, day_total is the sum of its payments, should match overall_total if parsing is complete
-        parsed['day_total'] = current_day_total_calc if found_any_payment_for_day else parsed['overall_total']
+        parsed['day_total'] = day_total if day_total is not None else parsed['overall_total']
         parsed['multiday_payments'] = None # Explicitly None for single day
 
     # Final check for meeting link in notes
@@ -480,15 +541,27 @@ def parse_detail_data(
     if parsed.get('meeting_link') == MEETING_LINK_TEXT: # Clean up placeholder if it's still there
         parsed['meeting_link'] = None
 
-    logger.debug(f"Final Parsed Detail Data (keys: {list(parsed.keys())}) for MJR {parsed.get('mjr_id')}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final Parsed Detail Data (keys: %s) for MJR %s", list(parsed.keys()), parsed.get('mjr_id'))
     return parsed
 
+def parse_detail_page(xml_content: str, tree: Optional[Any] = None) -> Tuple[bool, Optional[Dict[str, Optional[Any]]]]:
+    """
+    Single-snapshot shortcut: one tree parse, one text walk and one anchor scan give both the multiday flag and
+    the parse_detail_data result. Returns (is_multiday, parsed); parsed is None if the snapshot has no text.
+    """
+    texts = _extract_texts_from_xml(xml_content, tree=tree if tree is not None else parse_xml_tree(xml_content))
+    if not texts:
+        return False, None
+    header_info, info_block, payment_blocks, notes_total_info, is_multiday, _lang_idx = extract_all(texts)
+    return is_multiday, parse_detail_data(header_info, is_multiday, info_block, payment_blocks, notes_total_info)
+
 def check_if_multiday_from_xml(xml_content: str) -> bool:
-    # ... (previous implementation of check_if_multiday_from_xml) ...
-    text_attribute_regex = re.compile(r'\btext="([^"]*)"') 
+    # Quick scan of the raw text attributes; stops at the first one containing the multiday marker
     try:
-        for match in text_attribute_regex.finditer(xml_content):
-            if MULTIDAY_TEXT in html.unescape(match.group(1)):
+        for match in TEXT_ATTRIBUTE_WORD_REGEX.finditer(xml_content):
+            text = match.group(1)
+            if MULTIDAY_TEXT in (html.unescape(text) if '&' in text else text):
                 return True
     except Exception as e:
         logger.error(f"Error in quick multiday check: {e}")
@@ -1,6 +1,8 @@
 # filename: parsers/mja_parser.py
 import re
-from typing import Dict, Optional, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Optional, Any, Mapping
 from utils.sanitize import sanitize_postcode
 from logger import get_logger
 from state.models import BookingCardStatus # Import the Enum
@@ -10,14 +12,26 @@ logger = get_logger(__name__)
 
 MJA_ID_REGEX = re.compile(r"(MJA\d{8})") # Regex to find MJA ID
 DURATION_REGEX = re.compile(r"(\d{1,2}:\d{2})\s*(?:to|-)\s*(\d{1,2}:\d{2})")
+MJA_PARSE_CACHE_SIZE = 4096 # Distinct card descriptions remembered; the same cards come back on every list snapshot
 
 KNOWN_STATUS_PREFIXES = {
     "Cancelled,": BookingCardStatus.CANCELLED,
     "New Offer,": BookingCardStatus.NEW_OFFER,
     "Viewed,": BookingCardStatus.VIEWED,
 }
+# One anchored match replaces a startswith() per prefix; [ ,]* is the lstrip(" ,") that followed the prefix
+STATUS_PREFIX_REGEX = re.compile(rf"({'|'.join(re.escape(prefix) for prefix in KNOWN_STATUS_PREFIXES)})[ ,]*")
 
 def parse_mja(desc_str: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses a list card's content-desc. Results are memoized per description string;
+    every call returns a new dict, so callers may add keys (clickable, bounds, ...) to it.
+    """
+    parsed_view = _parse_mja_view(desc_str)
+    return parsed_view.copy() if parsed_view is not None else None # The proxy's copy() is a plain dict copy
+
+@lru_cache(maxsize=MJA_PARSE_CACHE_SIZE)
+def _parse_mja_view(desc_str: str) -> Optional[Mapping[str, Any]]:
     if not desc_str:
         logger.debug("MJA Parse: Received empty description string.")
         return None
@@ -28,12 +42,12 @@ def parse_mja(desc_str: str) -> Optional[Dict[str, Any]]:
     card_status = BookingCardStatus.NORMAL
     desc_to_process = desc_str
 
-    for prefix_key, status_enum in KNOWN_STATUS_PREFIXES.items():
-        if desc_to_process.startswith(prefix_key):
-            card_status = status_enum
-            desc_to_process = desc_to_process[len(prefix_key):].lstrip(" ,")
-            logger.info(f"MJA Parse: Found card status '{status_enum.value}' (Prefix: '{prefix_key}'). Remaining desc for MJA ID: '{desc_to_process}'")
-            break
+    prefix_match = STATUS_PREFIX_REGEX.match(desc_to_process)
+    if prefix_match:
+        prefix_key = prefix_match.group(1)
+        card_status = KNOWN_STATUS_PREFIXES[prefix_key]
+        desc_to_process = desc_to_process[prefix_match.end():]
+        logger.info(f"MJA Parse: Found card status '{card_status.value}' (Prefix: '{prefix_key}'). Remaining desc for MJA ID: '{desc_to_process}'")
 
     mja_match = MJA_ID_REGEX.search(desc_to_process)
     if not mja_match:
@@ -110,4 +124,4 @@ def parse_mja(desc_str: str) -> Optional[Dict[str, Any]]:
         "isRemote": is_remote, "original_duration_str": original_duration_str
     }
     logger.info(f"MJA Parse ({booking_id}): Final parsed data: {parsed_result}")
-    return parsed_result
\ No newline at end of file
+    return MappingProxyType(parsed_result) # Read-only view, so the cached entry can't be changed through a returned dict
\ No newline at end of file
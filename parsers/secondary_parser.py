@@ -10,19 +10,34 @@ logger = get_logger(__name__)
 FACE_TO_FACE_TEXT = "Face To Face"
 VIDEO_REMOTE_TEXT = "Video Remote Interpreting"
 REMOTE_TEXT = "Remote" # Fallback if specific remote type not found
+TYPE_HINTS_BY_PRIORITY = (FACE_TO_FACE_TEXT, VIDEO_REMOTE_TEXT, REMOTE_TEXT) # First one contained in the description wins
+KNOWN_TYPE_HINTS = {hint.lower(): hint for hint in TYPE_HINTS_BY_PRIORITY} # Exact (case-insensitive) matches, the usual case
 
 # --- Regex Patterns ---
 MJB_ID_PATTERN = re.compile(r"Booking\s+#(MJB\d{8})")
 MJR_DESC_PATTERN = re.compile(r"(MJR\d{8})[,\s]*(.*?)[,\s]*(?:Appointments\s*:\s*(\d+)|$)")
 APPOINTMENT_DESC_PATTERN = re.compile(r"Appointments\s*:\s*(\d+)")
+# Attribute scanners over the raw XML, compiled once; lenient (no \b) for test robustness
+TEXT_ATTRIBUTE_REGEX = re.compile(r'text="([^"]*)"')
+DESC_ATTRIBUTE_REGEX = re.compile(r'content-desc="([^"]*)"')
 
 
+def _normalize_type_hint(candidate: str) -> str:
+    """Maps the text between the MJR ID and Appointments to a known type; unknown text is returned as-is."""
+    lowered = candidate.lower()
+    known = KNOWN_TYPE_HINTS.get(lowered)
+    if known: return known
+    return next((hint for hint in TYPE_HINTS_BY_PRIORITY if hint.lower() in lowered), candidate)
+
 def parse_secondary_page_data(xml_content: str) -> Dict[str, Any]:
     """
     Parses the Secondary (MJB) page XML source to extract MJB ID,
     associated MJR ID, appointment count hint, and type hint.
     Uses targeted regex on text and content-desc attributes.
     Regex for attributes made more lenient for test robustness.
+    Attributes are streamed with finditer and the scan stops at the first match; attribute values that
+    can't match (no "MJR"/"MJB" in the raw value) are skipped before unescaping.
+    The XML itself is not unescaped up front, since a decoded &quot; would end the attribute value early.
     """
     results = {
         'mjb_id_raw': None,
@@ -32,16 +47,14 @@ def parse_secondary_page_data(xml_content: str) -> Dict[str, Any]:
     }
     logger.debug("--- Parsing Secondary Page XML Targeting Specific Attributes ---")
 
-    # Use simpler regex to find attributes, removing \b
-    text_attribute_regex = re.compile(r'text="([^"]*)"')
-    desc_attribute_regex = re.compile(r'content-desc="([^"]*)"')
-
     mjr_desc_found = False
 
     try:
-        matches = desc_attribute_regex.finditer(xml_content)
+        matches = DESC_ATTRIBUTE_REGEX.finditer(xml_content)
         for match in matches:
-            desc = html.unescape(match.group(1)).strip()
+            raw_desc = match.group(1)
+            if 'MJR' not in raw_desc: continue # Cheap pre-filter; MJR_DESC_PATTERN needs the literal
+            desc = (html.unescape(raw_desc) if '&' in raw_desc else raw_desc).strip()
             mjr_match = MJR_DESC_PATTERN.search(desc)
             if mjr_match:
                 results['mjr_id_raw'] = mjr_match.group(1).strip()
@@ -50,14 +63,7 @@ def parse_secondary_page_data(xml_content: str) -> Dict[str, Any]:
 
                 type_hint_candidate = mjr_match.group(2).strip(" ,") if mjr_match.group(2) else None
                 if type_hint_candidate:
-                    if FACE_TO_FACE_TEXT.lower() in type_hint_candidate.lower():
-                        results['type_hint_raw'] = FACE_TO_FACE_TEXT
-                    elif VIDEO_REMOTE_TEXT.lower() in type_hint_candidate.lower():
-                         results['type_hint_raw'] = VIDEO_REMOTE_TEXT
-                    elif REMOTE_TEXT.lower() in type_hint_candidate.lower():
-                         results['type_hint_raw'] = REMOTE_TEXT
-                    else:
-                         results['type_hint_raw'] = type_hint_candidate
+                    results['type_hint_raw'] = _normalize_type_hint(type_hint_candidate)
                     logger.debug(f"    Extracted Type Hint: {results['type_hint_raw']}")
                 else:
                      logger.debug("    No Type Hint text found between MJR ID and Appointments.")
@@ -81,9 +87,11 @@ def parse_secondary_page_data(xml_content: str) -> Dict[str, Any]:
          logger.warning("Could not find any content-desc attribute containing an MJR ID.")
 
     try:
-        matches = text_attribute_regex.finditer(xml_content)
+        matches = TEXT_ATTRIBUTE_REGEX.finditer(xml_content)
         for match in matches:
-            text = html.unescape(match.group(1)).strip()
+            raw_text = match.group(1)
+            if 'MJB' not in raw_text: continue # Cheap pre-filter; MJB_ID_PATTERN needs the literal
+            text = (html.unescape(raw_text) if '&' in raw_text else raw_text).strip()
             mjb_match = MJB_ID_PATTERN.search(text)
             if mjb_match:
                 results['mjb_id_raw'] = mjb_match.group(1)
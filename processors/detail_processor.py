@@ -1,29 +1,32 @@
 # filename: processors/detail_processor.py
-import sqlite3
+import logging
 import time
+from collections import OrderedDict
 from logger import get_logger
 from pages.detail_page import DetailPage
+from pages.list_page import ListPage
+from pages.secondary_page import SecondaryPage
 from state.models import ScrapeState, BookingProcessingStatus # Added BookingProcessingStatus
 from state.manager import StateManager
 from parsers.detail_parser import (
-    parse_detail_data, _extract_texts_from_xml,
-    extract_header_and_booking_type, extract_info_block,
-    extract_mja_payment_blocks, extract_notes_and_total
+    parse_detail_data, _extract_texts_from_xml, parse_xml_tree, extract_all,
+    extract_mja_payment_blocks, extract_notes_and_total,
+    DISCLAIMER_START_TEXT
 )
 from db.repository import (
-    save_booking_details, update_booking_status,
+    save_booking_details, save_booking_details_bulk, update_booking_status,
     get_secondary_hints_for_mjr, update_hints_for_mjr, # Ensure this is used correctly
     get_mjr_id_for_mja, # New import for efficiency
-    update_all_mja_statuses_for_mjr # New import for efficiency
+    update_all_mja_statuses_for_mjr, # New import for efficiency
+    get_mjr_scraped_at, record_mjr_scraped, BOOKING_DETAIL_COLUMNS
 )
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from appium.webdriver.common.appiumby import AppiumBy
 from typing import Dict, Any, Optional, List, Tuple, TYPE_CHECKING
 
-from config import DUMP_XML_MODE
-from utils.xml_dumper import save_xml_dump
+from config import DUMP_XML_MODE, SCRAPED_MJR_CACHE_TTL_SECONDS
+from utils.xml_dumper import submit_xml_dump
+from db.pool import ConnectionPool
 
 if TYPE_CHECKING:
     from services.crawler_service import CrawlerService
@@ -31,32 +34,70 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+MJR_SCRAPE_MEMO_SIZE = 256 # Most recent MJR cache lookups kept in memory
+# MJR-level keys that must not leak into per-day multiday records (they are per-MJA there)
+MULTIDAY_EXCLUDED_COMMON_KEYS = frozenset((
+    'multiday_payments', 'day_pay_sl', 'day_pay_td', 'day_pay_tt', 'day_pay_aep',
+    'day_pay_ooh', 'day_pay_urg', 'day_total', 'mja_id'
+))
+# Parsed-data keys read by save_booking_details; a single-day record is exactly these
+SINGLE_DAY_COLS = frozenset(data_key for _db_col, data_key in BOOKING_DETAIL_COLUMNS)
+
 class DetailProcessor:
-    def __init__(self, driver, conn, det_page: DetailPage, state_manager: StateManager, target_display_id: str = "0", crawler_service: Optional['CrawlerService'] = None):
+    def __init__(self, driver, conn, det_page: DetailPage, state_manager: StateManager, target_display_id: str = "0", crawler_service: Optional['CrawlerService'] = None, pool: Optional[ConnectionPool] = None):
         self.driver = driver
         self.conn = conn
+        self.pool = pool or ConnectionPool(conn) # Batched saves go through pool.write(), lookups through pool.read()
         self.det_page = det_page
         self.state_manager = state_manager
         self.target_display_id_str = target_display_id
         self.crawler_service = crawler_service
         # self.current_scrape_attempt = 1 # Managed by state_manager now
-        self.disclaimer_selector = 'new UiSelector().textStartsWith("By accepting this assignment")'
         self.max_scrolls = 7 
-        self.list_page_container_selector = '//androidx.recyclerview.widget.RecyclerView'
+        self.back_wait_timeout = 1.5 # Per back() press; returns as soon as the list or secondary page shows
+        self.max_back_presses = 3
+        self.scroll_settle_timeout = 1.5 # Max wait for the page source to change after a swipe
+        self._swipe_coords: Optional[Tuple[int, int, int]] = None # (x, start_y, end_y), window size is fixed for the session
+        self._page_tree_cache: Dict[int, Tuple[str, Any]] = {} # id(page_source) -> (page_source, tree), reset per process()
+        self._mjr_scraped_at_memo: 'OrderedDict[str, Optional[int]]' = OrderedDict() # LRU over scraped_mjr_cache lookups
+
+    def _get_swipe_coords(self) -> Tuple[int, int, int]:
+        if self._swipe_coords is None:
+            size = self.driver.get_window_size()
+            self._swipe_coords = (size['width']//2, int(size['height']*0.7), int(size['height']*0.3))
+        return self._swipe_coords
+
+    def _wait_for(self, condition, timeout: float, poll_frequency: float = 0.1) -> bool:
+        try: WebDriverWait(self.driver, timeout, poll_frequency=poll_frequency).until(condition); return True
+        except TimeoutException: return False
+
+    def _wait_for_page_change(self, previous_page_source: str) -> Optional[str]:
+        """Polls page_source after a swipe and returns the new source as soon as it differs, or None on timeout."""
+        previous_hash = hash(previous_page_source); changed: Dict[str, str] = {}
+        def _source_changed(driver) -> bool:
+            page_source = driver.page_source
+            if page_source and hash(page_source) != previous_hash: changed['source'] = page_source; return True
+            return False
+        self._wait_for(_source_changed, self.scroll_settle_timeout, poll_frequency=0.05)
+        return changed.get('source')
+
+    def _screen_after_back(self, driver) -> Any:
+        # find_elements returns [] instead of raising, so each poll is at most two lookups
+        if driver.find_elements(*ListPage.CARD_CONTAINER_LOCATOR): return ScrapeState.LIST
+        if driver.find_elements(*SecondaryPage.TITLE_LOCATOR): return ScrapeState.SECONDARY
+        return False
 
     def _navigate_back_to_list(self) -> ScrapeState:
-        # ... (Same as previous version, seems okay) ...
         try:
             logger.info("Navigating back to list page (Detail -> Secondary -> List)...")
-            logger.debug("Executing first back() command."); self.driver.back(); time.sleep(0.8) 
-            logger.debug("Executing second back() command."); self.driver.back(); time.sleep(1.2)
-            try:
-                WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((AppiumBy.XPATH, self.list_page_container_selector)))
-                logger.info("Navigation successful: Confirmed back on list page.")
-            except TimeoutException:
-                logger.warning("Did not confirm list page after two back(). Trying one more.")
-                try: self.driver.back(); time.sleep(1.5); WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((AppiumBy.XPATH, self.list_page_container_selector))); logger.info("Confirmed back on list page after third back().")
-                except: logger.error("Still not on list page after third back().")
+            on_list_page = False
+            for attempt in range(1, self.max_back_presses + 1):
+                logger.debug(f"Executing back() command #{attempt}."); self.driver.back()
+                try: screen = WebDriverWait(self.driver, self.back_wait_timeout, poll_frequency=0.1).until(self._screen_after_back)
+                except TimeoutException: logger.debug(f"Neither list nor secondary page confirmed after back() #{attempt}."); continue
+                if screen == ScrapeState.LIST: on_list_page = True; break
+            if on_list_page: logger.info(f"Navigation successful: Confirmed back on list page after {attempt} back().")
+            else: logger.error(f"Still not on list page after {self.max_back_presses} back().")
             self.state_manager.update_state(ScrapeState.LIST, current_booking_id=None, current_mjr_id=None)
             return ScrapeState.LIST
         except Exception as nav_e: 
@@ -65,10 +106,10 @@ class DetailProcessor:
             return ScrapeState.ERROR
 
 
-    def _is_disclaimer_visible(self) -> bool:
-        # ... (Same as previous version) ...
-        try: WebDriverWait(self.driver, 0.2).until(EC.presence_of_element_located((AppiumBy.ANDROID_UIAUTOMATOR, self.disclaimer_selector))); return True
-        except: return False
+    @staticmethod
+    def _disclaimer_in_texts(texts: List[str]) -> bool:
+        # The disclaimer closes the detail page; spotting it in the snapshot texts avoids a UiSelector round trip
+        return any(t.startswith(DISCLAIMER_START_TEXT) for t in texts)
 
     def _apply_display_setting(self):
         # ... (Same as previous version) ...
@@ -77,21 +118,54 @@ class DetailProcessor:
         except ValueError: logger.warning(f"Target display ID '{self.target_display_id_str}' not an int.")
         except Exception as e: logger.error(f"Failed to apply displayId setting: {e}")
 
-    def _get_current_texts_and_source(self) -> Tuple[List[str], str]:
-        # ... (Same as previous version) ...
-        page_source = ""; texts = []
+    def _remember_mjr_scraped_at(self, mjr_id: str, scraped_at: Optional[int]):
+        self._mjr_scraped_at_memo[mjr_id] = scraped_at
+        self._mjr_scraped_at_memo.move_to_end(mjr_id)
+        if len(self._mjr_scraped_at_memo) > MJR_SCRAPE_MEMO_SIZE: self._mjr_scraped_at_memo.popitem(last=False)
+
+    def _is_mjr_recently_scraped(self, mjr_id: str) -> bool:
+        # This process is the only writer of scraped_mjr_cache, so a remembered miss stays valid until we record a save
+        if mjr_id in self._mjr_scraped_at_memo:
+            scraped_at = self._mjr_scraped_at_memo[mjr_id]
+            self._mjr_scraped_at_memo.move_to_end(mjr_id)
+        else:
+            with self.pool.read() as read_conn: scraped_at = get_mjr_scraped_at(read_conn, mjr_id, SCRAPED_MJR_CACHE_TTL_SECONDS)
+            self._remember_mjr_scraped_at(mjr_id, scraped_at)
+        return scraped_at is not None and time.time() - scraped_at < SCRAPED_MJR_CACHE_TTL_SECONDS
+
+    def _mark_mjr_fully_processed(self, mjr_id: str):
+        # Mark this MJR as fully processed for this session so the list skips its other cards
+        if self.crawler_service:
+            list_processor: Optional['ListProcessor'] = self.crawler_service.processors[ScrapeState.LIST] #type: ignore
+            if list_processor and hasattr(list_processor, 'mark_mjr_fully_processed'):
+                list_processor.mark_mjr_fully_processed(mjr_id)
+                logger.info(f"Marked MJR {mjr_id} as fully processed for this session (efficiency).")
+
+    def _get_page_tree(self, page_source: str) -> Optional[Any]:
+        cached = self._page_tree_cache.get(id(page_source))
+        if cached is not None and cached[0] is page_source: return cached[1]
+        tree = parse_xml_tree(page_source)
+        self._page_tree_cache[id(page_source)] = (page_source, tree) # Keeps the source alive so its id stays unique
+        return tree
+
+    def _get_current_texts_and_source(self, page_source: Optional[str] = None) -> Tuple[List[str], str, Optional[Any]]:
+        # page_source can be handed in when it was already fetched (e.g. by the post-swipe wait)
+        texts = []; tree = None
         try:
-            self._apply_display_setting()
-            page_source = self.driver.page_source
-            if not page_source: logger.error("Failed to get page source for detail page."); return [], ""
-            texts = _extract_texts_from_xml(page_source)
+            if page_source is None:
+                self._apply_display_setting()
+                page_source = self.driver.page_source
+            if not page_source: logger.error("Failed to get page source for detail page."); return [], "", None
+            tree = self._get_page_tree(page_source)
+            texts = _extract_texts_from_xml(page_source, tree=tree)
         except Exception as e: logger.exception(f"Unexpected error getting page source/texts: {e}")
-        return texts, page_source
+        return texts, page_source or "", tree
 
     def process(self) -> ScrapeState:
         current_mja_in_state = self.state_manager.current_booking_id # MJA that led us here
         current_mjr_from_state = self.state_manager.current_mjr_id
         logger.info(f"Processing State: DETAIL (Display {self.target_display_id_str}, MJA_trigger: {current_mja_in_state}, MJR: {current_mjr_from_state})")
+        self._page_tree_cache.clear()
         
         try:
             self.det_page.wait_until_displayed(timeout=10)
@@ -114,11 +188,12 @@ class DetailProcessor:
         mjr_id_final = current_mjr_from_state 
 
         try:
-            initial_texts, initial_page_source = self._get_current_texts_and_source()
+            initial_texts, initial_page_source, _initial_tree = self._get_current_texts_and_source()
             if not initial_page_source:
                 raise ValueError("Failed to get initial page source from detail page after confirmation.")
             
-            header_info, is_multiday, lang_idx = extract_header_and_booking_type(initial_texts)
+            # One anchor scan of the initial snapshot feeds every extractor; later snapshots only re-extract what scrolling can change
+            header_info, info_block, all_mja_blocks_raw, notes_total_info, is_multiday, lang_idx = extract_all(initial_texts)
             parsed_mjr_from_header = header_info.get('mjr_id_raw')
 
             if parsed_mjr_from_header:
@@ -130,7 +205,7 @@ class DetailProcessor:
             if not mjr_id_final: 
                  # If still no mjr_id_final, try to get it from the DB using current_mja_in_state
                 if current_mja_in_state:
-                    mjr_id_final = get_mjr_id_for_mja(self.conn, current_mja_in_state)
+                    with self.pool.read() as read_conn: mjr_id_final = get_mjr_id_for_mja(read_conn, current_mja_in_state)
                     if mjr_id_final:
                         logger.info(f"Retrieved MJR ID {mjr_id_final} from DB for MJA {current_mja_in_state}")
                     else: # Fallback if MJA not in DB or has no MJR yet
@@ -140,33 +215,36 @@ class DetailProcessor:
                     mjr_id_final = "UNKNOWN_MJR_DETAIL"
                     logger.error("MJR ID could not be determined for Detail Page processing.")
 
+            if mjr_id_final not in (current_mja_in_state, "UNKNOWN_MJR_DETAIL") and self._is_mjr_recently_scraped(mjr_id_final):
+                logger.info(f"MJR {mjr_id_final} was fully scraped within the last {SCRAPED_MJR_CACHE_TTL_SECONDS}s. Skipping detail scrape.")
+                self._mark_mjr_fully_processed(mjr_id_final)
+                self.state_manager.record_booking_scraped()
+                self._page_tree_cache.clear()
+                return self._navigate_back_to_list()
 
             logger.info(f"Processing Detail for MJR: '{mjr_id_final}', IsMultiday={is_multiday}")
 
             if DUMP_XML_MODE:
-                save_xml_dump(initial_page_source, "Detail_MJR", mjr_id_final, sequence_or_stage="initial_view_00")
+                submit_xml_dump(initial_page_source, "Detail_MJR", mjr_id_final, sequence_or_stage="initial_view_00")
 
             if lang_idx is None: 
                 raise ValueError(f"Critical language anchor text not found for MJR {mjr_id_final}.")
-            
-            info_block = extract_info_block(initial_texts, lang_idx)
 
             # --- Scroll loop to gather all payment blocks ---
             scroll_count = 0
-            last_page_source_for_comparison = initial_page_source
+            last_page_hash: Optional[int] = hash(initial_page_source) # str hashes are cached, so later compares are O(1)
+            settled_page_source: Optional[str] = None # Source captured by the post-swipe wait, reused by the next iteration
             # No need for processed_mja_ids_in_this_detail_view, extract_mja_payment_blocks will return all it finds
-            
-            # Initial extraction before any scrolling
-            all_mja_blocks_raw = extract_mja_payment_blocks(initial_texts)
 
-            if not self._is_disclaimer_visible() and not (is_multiday and len(all_mja_blocks_raw) >= header_info.get('appointment_count_hint', 1)): # Only scroll if needed
+            last_texts, last_page_source = initial_texts, initial_page_source # Most recent snapshot; feeds notes/total after the loop
+            if not self._disclaimer_in_texts(initial_texts) and not (is_multiday and len(all_mja_blocks_raw) >= header_info.get('appointment_count_hint', 1)): # Only scroll if needed
                 logger.info("Starting scroll loop for more payments or disclaimer...")
                 while scroll_count < self.max_scrolls:
-                    current_texts_loop, current_page_source_loop = self._get_current_texts_and_source()
+                    current_texts_loop, current_page_source_loop, _loop_tree = self._get_current_texts_and_source(settled_page_source)
                     if not current_page_source_loop: logger.warning("Empty page source in scroll loop."); break
                     
                     if DUMP_XML_MODE and scroll_count >= 0: # Dump first scroll attempt too
-                        save_xml_dump(current_page_source_loop, "Detail_MJR", mjr_id_final, sequence_or_stage=f"scroll_{scroll_count+1:02d}")
+                        submit_xml_dump(current_page_source_loop, "Detail_MJR", mjr_id_final, sequence_or_stage=f"scroll_{scroll_count+1:02d}")
 
                     # Re-extract MJA blocks from the new view and merge/replace if more complete
                     # For simplicity, let's assume extract_mja_payment_blocks gets everything visible.
@@ -174,37 +252,40 @@ class DetailProcessor:
                     # Current extract_mja_payment_blocks re-parses the whole visible text.
                     all_mja_blocks_raw = extract_mja_payment_blocks(current_texts_loop) 
                                         
-                    if self._is_disclaimer_visible():
+                    last_texts, last_page_source = current_texts_loop, current_page_source_loop
+                    if self._disclaimer_in_texts(current_texts_loop):
                         logger.info(f"Disclaimer found after {scroll_count + 1} scrolls.")
                         break
                     
-                    if current_page_source_loop == last_page_source_for_comparison and scroll_count > 0:
+                    current_page_hash = hash(current_page_source_loop)
+                    if current_page_hash == last_page_hash and scroll_count > 0:
                         logger.warning("Page source unchanged after scroll. Breaking scroll.")
                         break
-                    last_page_source_for_comparison = current_page_source_loop
+                    last_page_hash = current_page_hash
                     
                     logger.debug(f"Scrolling detail page (attempt {scroll_count + 1})...");
-                    size = self.driver.get_window_size(); start_x=size['width']//2
-                    start_y=int(size['height']*0.7); end_y=int(size['height']*0.3)
-                    try: self.driver.swipe(start_x, start_y, start_x, end_y, 800); time.sleep(1.5)
+                    try:
+                        start_x, start_y, end_y = self._get_swipe_coords()
+                        self.driver.swipe(start_x, start_y, start_x, end_y, 800)
                     except Exception as e_swipe: logger.error(f"Swipe error: {e_swipe}."); break
+                    settled_page_source = self._wait_for_page_change(current_page_source_loop)
                     scroll_count += 1
                 else:
-                    if not self._is_disclaimer_visible():
+                    if settled_page_source: # The wait already captured the last swipe's result; parse it without another fetch
+                        last_texts, last_page_source, _final_tree = self._get_current_texts_and_source(settled_page_source)
+                        all_mja_blocks_raw = extract_mja_payment_blocks(last_texts)
+                        if DUMP_XML_MODE:
+                            submit_xml_dump(last_page_source, "Detail_MJR", mjr_id_final, sequence_or_stage=f"final_view_{scroll_count:02d}")
+                    if not self._disclaimer_in_texts(last_texts):
                         logger.warning(f"Max scrolls ({self.max_scrolls}) reached, disclaimer not visible.")
             else:
                  logger.info("Skipping scroll loop: Disclaimer visible initially or all expected MJA blocks for multiday found.")
 
-
-            final_texts_for_notes, final_page_source_for_dump = self._get_current_texts_and_source() # Get final state for notes
-            if DUMP_XML_MODE and final_page_source_for_dump and final_page_source_for_dump != last_page_source_for_comparison and scroll_count > 0 :
-                 save_xml_dump(final_page_source_for_dump, "Detail_MJR", mjr_id_final, sequence_or_stage=f"final_view_{scroll_count:02d}")
-            
-            if final_texts_for_notes:
+            final_texts_for_notes = last_texts
+            if last_texts is not initial_texts and final_texts_for_notes:
                 notes_total_info = extract_notes_and_total(final_texts_for_notes)
-            else:
-                logger.error("Failed to get final texts for notes/total extraction. Using initial texts as fallback.")
-                notes_total_info = extract_notes_and_total(initial_texts)
+            elif not final_texts_for_notes:
+                logger.error("No final texts for notes/total extraction. Using initial texts as fallback.") # notes_total_info from extract_all
 
             logger.info("Consolidating all extracted data...")
             # Pass all_mja_blocks_raw which contains all MJA payment dicts found on the page
@@ -215,7 +296,8 @@ class DetailProcessor:
             if not mjr_id_final or mjr_id_final == "UNKNOWN_MJR_DETAIL":
                  raise ValueError(f"MJR ID is still unknown after full parsing for MJA trigger {current_mja_in_state}.")
 
-            logger.debug(f"Final Parsed MJR Data for {mjr_id_final} (is_multiday: {is_multiday}): {str(parsed_mjr_data)[:1000]}...")
+            if logger.isEnabledFor(logging.DEBUG): # Skip stringifying the whole record when debug is off
+                logger.debug("Final Parsed MJR Data for %s (is_multiday: %s): %s...", mjr_id_final, is_multiday, str(parsed_mjr_data)[:1000])
 
             if is_multiday:
                 logger.info(f"Processing MULTIDAY save for MJR ID: {mjr_id_final}")
@@ -225,50 +307,55 @@ class DetailProcessor:
                     logger.warning(f"Multiday booking MJR {mjr_id_final}, but no MJA payment entries derived by parser.")
                     # This might be an error if appointment_count_hint > 0
                     if current_mja_in_state:
-                        update_booking_status(self.conn, current_mja_in_state, BookingProcessingStatus.ERROR_DETAIL_EXTRACT.value, f"Multiday MJR {mjr_id_final} no MJA payment entries")
+                        with self.pool.write() as conn: update_booking_status(conn, current_mja_in_state, BookingProcessingStatus.ERROR_DETAIL_EXTRACT.value, f"Multiday MJR {mjr_id_final} no MJA payment entries")
                 else:
                     logger.info(f"Saving {len(multiday_payment_entries)} MJA entries for MJR {mjr_id_final}.")
                     all_mjas_for_this_mjr_saved = True
-                    for mja_day_data in multiday_payment_entries:
+                    db_records: List[Dict[str, Any]] = []
+                    # Common MJR fields are filtered once; each day only layers its own fields on top
+                    common_record = {k: v for k, v in parsed_mjr_data.items() if k not in MULTIDAY_EXCLUDED_COMMON_KEYS}
+                    common_record.update({
+                        'mjr_id': mjr_id_final, # Ensure mjr_id is set
+                        'processing_id': mjr_id_final,
+                        'is_multiday': 1,
+                        'status': BookingProcessingStatus.SCRAPED.value,
+                        'scrape_attempt': self.state_manager.current_scrape_attempt
+                    })
+                    for seq_idx, mja_day_data in enumerate(multiday_payment_entries, start=1):
                         mja_id_for_this_day = mja_day_data.get('mja')
                         if not mja_id_for_this_day:
                             logger.error(f"Multiday entry for MJR {mjr_id_final} is missing MJA identifier. Data: {mja_day_data}")
                             all_mjas_for_this_mjr_saved = False
                             continue
 
-                        # Merge common MJR data with specific MJA day data
-                        db_record = {
-                            **{k: v for k, v in parsed_mjr_data.items() if k not in ['multiday_payments', 'day_pay_sl', 'day_pay_td', 'day_pay_tt', 'day_pay_aep', 'day_pay_ooh', 'day_pay_urg', 'day_total', 'mja_id']}, # common MJR fields
-                            **mja_day_data, # Per-MJA fields (mja, booking_date, day_pay_*, day_total for this MJA)
-                            'mjr_id': mjr_id_final, # Ensure mjr_id is set
-                            'processing_id': mjr_id_final,
-                            'is_multiday': 1,
-                            # appointment_sequence should be derived by ListProcessor based on card order or by db query
-                            'status': BookingProcessingStatus.SCRAPED.value,
-                            'scrape_attempt': self.state_manager.current_scrape_attempt
-                        }
-                        # appointment_sequence might need to be set based on index in loop if not in mja_day_data
-                        if 'appointment_sequence' not in db_record or db_record['appointment_sequence'] is None:
-                             db_record['appointment_sequence'] = multiday_payment_entries.index(mja_day_data) + 1
-
-
-                        try:
-                            save_booking_details(self.conn, db_record, attempt_count=self.state_manager.current_scrape_attempt)
-                        except Exception as save_exc:
-                            all_mjas_for_this_mjr_saved = False
-                            logger.error(f"Failed to save MJA day {mja_id_for_this_day} for MJR {mjr_id_final}: {save_exc}")
-                            update_booking_status(self.conn, mja_id_for_this_day, BookingProcessingStatus.ERROR_SAVE.value, str(save_exc)[:200])
-                    
+                        db_record = {**common_record, **mja_day_data} # Per-MJA fields (mja, booking_date, pay_*, day_total for this MJA)
+                        for key, value in mja_day_data.items():
+                            if key.startswith('pay_'): db_record[f"day_{key}"] = value # Parser emits pay_*, table columns are day_pay_*
+                        db_record['mja_id'] = mja_id_for_this_day # Key expected by save_booking_details
+                        # appointment_sequence falls back to the entry's position in the payment list
+                        db_record['appointment_sequence'] = mja_day_data.get('appointment_sequence') or seq_idx
+                        db_records.append(db_record)
+
+                    # MJA rows, the cache entry and the MJR-wide status sweep share one write transaction (one sync per MJR)
+                    scraped_at: Optional[int] = None
+                    try:
+                        with self.pool.write() as conn:
+                            save_booking_details_bulk(conn, db_records, attempt_count=self.state_manager.current_scrape_attempt, commit=False)
+                            if all_mjas_for_this_mjr_saved:
+                                scraped_at = record_mjr_scraped(conn, mjr_id_final, commit=False)
+                                # Update status for all MJAs of this MJR if they were pending
+                                update_all_mja_statuses_for_mjr(conn, mjr_id_final, BookingProcessingStatus.SCRAPED.value, commit=False)
+                    except Exception as save_exc:
+                        all_mjas_for_this_mjr_saved = False
+                        logger.error(f"Failed to save {len(db_records)} MJA days for MJR {mjr_id_final}: {save_exc}")
+                        with self.pool.write() as conn:
+                            for db_record in db_records:
+                                update_booking_status(conn, db_record['mja_id'], BookingProcessingStatus.ERROR_SAVE.value, str(save_exc)[:200], commit=False)
+
                     if all_mjas_for_this_mjr_saved:
+                        self._remember_mjr_scraped_at(mjr_id_final, scraped_at)
                         logger.info(f"All MJA days for MJR {mjr_id_final} processed.")
-                        # Mark this MJR as fully processed for this session to improve efficiency
-                        if self.crawler_service:
-                            list_processor: Optional['ListProcessor'] = self.crawler_service.processors.get(ScrapeState.LIST) #type: ignore
-                            if list_processor and hasattr(list_processor, 'session_fully_processed_mjr_ids'):
-                                list_processor.session_fully_processed_mjr_ids.add(mjr_id_final)
-                                logger.info(f"Marked MJR {mjr_id_final} as fully processed for this session (efficiency).")
-                        # Update status for all MJAs of this MJR if they were pending
-                        update_all_mja_statuses_for_mjr(self.conn, mjr_id_final, BookingProcessingStatus.SCRAPED.value)
+                        self._mark_mjr_fully_processed(mjr_id_final)
 
             else: # Single Day
                  mja_id_to_save = parsed_mjr_data.get('mja_id') or current_mja_in_state # MJA ID for the single day booking
@@ -276,8 +363,8 @@ class DetailProcessor:
                      raise ValueError(f"Cannot save single day for MJR {mjr_id_final} - MJA ID is missing from parsed data and state.")
                  
                  logger.info(f"Processing SINGLE DAY save for MJA: {mja_id_to_save} (MJR: {mjr_id_final})")
-                 single_day_db_record = {
-                     **parsed_mjr_data, # Contains all necessary fields including day_pay_* and day_total
+                 single_day_db_record = {k: parsed_mjr_data.get(k) for k in SINGLE_DAY_COLS} # Only the keys the bookings row needs
+                 single_day_db_record.update({
                      'mja_id': mja_id_to_save, # Ensure it's the correct MJA ID
                      'mjr_id': mjr_id_final,
                      'processing_id': mjr_id_final,
@@ -285,11 +372,14 @@ class DetailProcessor:
                      'appointment_sequence': 1,
                      'status': BookingProcessingStatus.SCRAPED.value,
                      'scrape_attempt': self.state_manager.current_scrape_attempt
-                 }
-                 del single_day_db_record['multiday_payments'] # Not applicable for single day
-                 save_booking_details(self.conn, single_day_db_record, attempt_count=self.state_manager.current_scrape_attempt)
+                 })
+                 with self.pool.write() as conn:
+                     save_booking_details(conn, single_day_db_record, attempt_count=self.state_manager.current_scrape_attempt, commit=False)
+                     scraped_at = record_mjr_scraped(conn, mjr_id_final, commit=False)
+                 self._remember_mjr_scraped_at(mjr_id_final, scraped_at)
             
             self.state_manager.record_booking_scraped() 
+            self._page_tree_cache.clear()
             return self._navigate_back_to_list()
 
         except Exception as e:
@@ -297,7 +387,7 @@ class DetailProcessor:
             error_message = f"Detail content processing error: {str(e)[:200]}"
             # Update status of the MJA that led to this detail page, if known
             if current_mja_in_state:
-                update_booking_status(self.conn, current_mja_in_state, BookingProcessingStatus.ERROR_DETAIL_EXTRACT.value, error_message)
+                with self.pool.write() as conn: update_booking_status(conn, current_mja_in_state, BookingProcessingStatus.ERROR_DETAIL_EXTRACT.value, error_message)
             
             self._navigate_back_to_list() 
             self.state_manager.update_state(ScrapeState.ERROR, current_booking_id=current_mja_in_state, current_mjr_id=current_mjr_from_state, error_message=error_message)
@@ -1,27 +1,30 @@
 # filename: processors/list_processor.py
+import heapq
 import os
+from contextlib import contextmanager
+from operator import itemgetter
 from logger import get_logger
 from db.repository import (
-    insert_booking_base, 
-    get_processed_booking_ids, # This gets MJA IDs already in DB
     update_booking_status,
-    get_mjr_id_for_mja, # To get MJR ID for a given MJA
     get_all_mja_ids_for_mjr, # To get all MJAs for a given MJR
-    check_if_all_mjas_for_mjr_scraped # To check if an MJR is fully done
+    get_booking_states_for_mjas, get_fully_scraped_mjr_ids, # Batched lookups, one query each per screen
+    get_all_bookings_summary, # One-shot load for the in-memory booking index
+    insert_bookings_base_bulk, update_booking_statuses_bulk # Per-cycle write batching
 )
+from db.pool import ConnectionPool
 from pages.list_page import ListPage
-from state.models import ScrapeState, BookingCardStatus, BookingProcessingStatus
+from pages.secondary_page import SecondaryPage
+from state.models import ScrapeState, BookingCardStatus, BookingProcessingStatus, OFFER_OR_VIEWED_CARD_STATUSES
 from state.manager import StateManager
 from appium.webdriver.common.appiumby import AppiumBy
-from selenium.common import TimeoutException, StaleElementReferenceException, NoSuchElementException
+from selenium.common import TimeoutException, StaleElementReferenceException, WebDriverException
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
-from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Set
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Set, Iterator
 
 from config import DUMP_XML_MODE
-from utils.xml_dumper import save_xml_dump
+from utils.xml_dumper import submit_xml_dump
+from utils.driver_settings import fast_idle_settings
 
 
 if TYPE_CHECKING:
@@ -29,10 +32,45 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+# Per-card decisions yielded by ListProcessor._classify_cards
+CARD_SKIP = "skip" # Already handled this session, or its MJR is complete
+CARD_MARK_SCRAPED_AND_SKIP = "mark_scraped_and_skip" # MJR completed this session; record the MJA as scraped
+CARD_WRITE_AND_SKIP = "write_and_skip" # Cancelled / offer / viewed: save the list data, no detail scrape
+CARD_CLICK_CANDIDATE = "click_candidate"
+CARD_UNHANDLED = "unhandled"
+
+# Fully-visible band for clicking / anchoring, as fractions of the window height
+VISIBLE_TOP_FRAC = 0.15
+VISIBLE_BOT_FRAC = 0.85
+MAX_CLICK_CANDIDATES = 3 # Live lookups per screen are capped at this many cards nearest the centre; the rest wait for the next cycle
+
+SCREENSHOT_DIR = "screenshots"
+_screenshot_dir_ready = False # Set once SCREENSHOT_DIR exists; every later processor skips the filesystem call
+
+def _ensure_screenshot_dir():
+    global _screenshot_dir_ready
+    if _screenshot_dir_ready: return
+    try: os.makedirs(SCREENSHOT_DIR, exist_ok=True); _screenshot_dir_ready = True
+    except OSError as e: logger.error(f"Could not create screenshot dir '{SCREENSHOT_DIR}': {e}")
+
+# DB statuses after which a card needs no further work, as long as the list still shows it the same way
+FINAL_STATES = frozenset({
+    BookingProcessingStatus.SCRAPED.value,
+    BookingProcessingStatus.CANCELLED_ON_LIST.value,
+    BookingProcessingStatus.SKIPPED_OFFER_VIEWED.value,
+})
+# Final DB status each skip-only list status is recorded with; a card whose list status moved on is handled again
+CARD_STATUS_FINAL_STATE = {
+    BookingCardStatus.CANCELLED: BookingProcessingStatus.CANCELLED_ON_LIST.value,
+    BookingCardStatus.NEW_OFFER: BookingProcessingStatus.SKIPPED_OFFER_VIEWED.value,
+    BookingCardStatus.VIEWED: BookingProcessingStatus.SKIPPED_OFFER_VIEWED.value,
+}
+
 class ListProcessor:
-    def __init__(self, driver, conn, list_page: ListPage, state_manager: StateManager, target_display_id: str = "0", crawler_service: Optional['CrawlerService'] = None):
+    def __init__(self, driver, conn, list_page: ListPage, state_manager: StateManager, target_display_id: str = "0", crawler_service: Optional['CrawlerService'] = None, pool: Optional[ConnectionPool] = None):
         self.driver = driver
         self.conn = conn
+        self.pool = pool or ConnectionPool(conn) # Lookups go through pool.read(), off the writer connection
         self.list_page = list_page
         self.state_manager = state_manager
         self.target_display_id_str = target_display_id
@@ -41,14 +79,25 @@ class ListProcessor:
         self.processed_ids_this_cycle: Set[str] = set() # MJA IDs processed (clicked or skipped) in the current view/scroll cycle
         self.session_clicked_mja_ids: Set[str] = set() # MJA IDs clicked throughout this entire scrape session (mainly for DUMP_XML_MODE)
         self.session_fully_processed_mjr_ids: Set[str] = set() # MJR IDs that have been fully scraped in this session
+        self.session_skipped_mja_ids: Set[str] = set() # Every known MJA of the MJRs in session_fully_processed_mjr_ids
+        self._mjr_member_ids: Dict[str, Set[str]] = {} # MJR -> its MJA IDs, read once per MJR
+        self._mja_to_mjr: Dict[str, str] = {} # MJA -> MJR links already read from the DB; unknown MJAs are re-queried each screen
+        self._indexed_mjr_ids: Set[str] = set() # MJRs whose completion state is known from the session-start index
+        self._final_statuses: Dict[str, str] = {} # booking_id -> DB status in FINAL_STATES; loaded once, then kept current by our own flushes
+        self._load_booking_index()
 
         self.scroll_attempts = 0
         self.max_scroll_attempts = 3 
         self.last_good_scroll_anchor_id: Optional[str] = None
-        self.screenshot_dir = "screenshots"
-        if not os.path.exists(self.screenshot_dir):
-             try: os.makedirs(self.screenshot_dir)
-             except OSError as e: logger.error(f"Could not create screenshot dir '{self.screenshot_dir}': {e}")
+        self._restore_implicit_wait: Optional[float] = None # Driver's implicit wait before the first list cycle, read once
+        self._display_applied = False # Set once update_settings(displayId) has gone through
+        self._window_height: Optional[int] = None # Fixed for the session, fetched once
+        self._next_page_source: Optional[str] = None # Settled post-scroll page source handed to the next cycle's get_cards()
+        self.back_wait_timeout = 1.5 # Max wait for the list to reappear after a back() press
+        self.navigation_timeout = 5.0 # Max wait for the list page to go away after a card click
+        self.scroll_settle_timeout = 2.0 # Max wait for the list content to change after a scroll
+        self.screenshot_dir = SCREENSHOT_DIR
+        _ensure_screenshot_dir()
 
     def _ensure_on_list_page(self, initial_check=False) -> bool:
         # ... (Same as previous version) ...
@@ -57,7 +106,9 @@ class ListProcessor:
         while retries > 0:
             if self.list_page.is_displayed(timeout=1): return True
             logger.warning("Not on list page. Attempting back.")
-            try: self.driver.back(); time.sleep(1.5)
+            try:
+                self.driver.back()
+                self._wait_for(lambda d: d.find_elements(*ListPage.CARD_CONTAINER_LOCATOR), self.back_wait_timeout) # Returns as soon as the list shows
             except Exception as e: logger.error(f"Error navigating back: {e}")
             retries -= 1
         logger.error("Failed to ensure list page."); return False
@@ -65,88 +116,258 @@ class ListProcessor:
     def _apply_display_setting(self):
         # ... (Same as previous version) ...
         if self.target_display_id_str == "0" or not self.target_display_id_str: return
-        try: self.driver.update_settings({"displayId": int(self.target_display_id_str)})
-        except ValueError: logger.warning(f"Target display ID '{self.target_display_id_str}' not an int.")
+        if self._display_applied: return # Appium settings persist for the session; one update_settings is enough
+        try: self.driver.update_settings({"displayId": int(self.target_display_id_str)}); self._display_applied = True
+        except ValueError: logger.warning(f"Target display ID '{self.target_display_id_str}' not an int."); self._display_applied = True # Retrying won't help
         except Exception as e: logger.error(f"Failed to apply displayId setting: {e}")
 
-    def _is_element_fully_visible(self, element: WebElement, window_height: int) -> bool:
-        # ... (Same as previous version) ...
+    def _get_window_height(self) -> int:
+        if self._window_height is None: self._window_height = self.driver.get_window_size()['height']
+        return self._window_height
+
+    @staticmethod
+    def _is_fully_visible_from_bounds(card_data: Dict[str, Any], top_b: float, bot_b: float) -> bool:
+        """Visibility from the XML snapshot's bounds/displayed attributes; no Appium round-trips. top_b/bot_b: the visible band in pixels."""
+        bounds = card_data.get('bounds')
+        if not bounds or not card_data.get('displayed', True): return False
+        el_top = bounds[1]; el_bot = bounds[3]
+        is_vis = el_top >= top_b and el_bot <= bot_b
+        logger.debug(f"Visibility check for card {card_data.get('booking_id')} at y={el_top}, h={el_bot - el_top}: FullyVis={is_vis} (Bounds:{top_b:.0f}-{bot_b:.0f})")
+        return is_vis
+
+    def _load_booking_index(self):
+        """
+        Reads every booking once at session start and answers MJA -> MJR and "MJR fully scraped" from memory afterwards.
+        Within the session an MJR only becomes fully scraped through DetailProcessor, which reports it via mark_mjr_fully_processed,
+        so only MJRs first linked during the session (by the secondary page) still need a DB check.
+        """
+        with self.pool.read() as read_conn: rows = get_all_bookings_summary(read_conn)
+        mjr_counters: Dict[str, List[int]] = {} # mjr_id -> [scraped_count, appointment_count_hint]
+        for booking_id, mjr_id, status, count_hint in rows:
+            if status in FINAL_STATES: self._final_statuses[booking_id] = status
+            if not mjr_id: continue
+            self._mja_to_mjr[booking_id] = mjr_id
+            self._mjr_member_ids.setdefault(mjr_id, set()).add(booking_id)
+            counter = mjr_counters.setdefault(mjr_id, [0, 0])
+            if status == BookingProcessingStatus.SCRAPED.value: counter[0] += 1
+            if count_hint: counter[1] = max(counter[1], count_hint)
+        self._indexed_mjr_ids = set(mjr_counters)
+        for mjr_id, (scraped_count, count_hint) in mjr_counters.items():
+            if count_hint > 0 and scraped_count >= count_hint: self.mark_mjr_fully_processed(mjr_id)
+        logger.info(f"Booking index loaded: {len(rows)} bookings ({len(self._final_statuses)} final), {len(self._indexed_mjr_ids)} MJRs, {len(self.session_fully_processed_mjr_ids)} fully scraped.")
+
+    def mark_mjr_fully_processed(self, mjr_id: str):
+        """Records a completed MJR and pre-marks all its known MJAs, so later cards of that MJR are skipped without any lookup."""
+        if not mjr_id or mjr_id in self.session_fully_processed_mjr_ids: return
+        self.session_fully_processed_mjr_ids.add(mjr_id)
+        if mjr_id not in self._mjr_member_ids:
+            with self.pool.read() as read_conn: self._mjr_member_ids[mjr_id] = get_all_mja_ids_for_mjr(read_conn, mjr_id)
+        member_mja_ids = self._mjr_member_ids[mjr_id]
+        self.session_skipped_mja_ids.update(member_mja_ids)
+        for mja_id in member_mja_ids: self._mja_to_mjr[mja_id] = mjr_id
+        logger.debug(f"MJR {mjr_id} fully processed; {len(member_mja_ids)} MJA(s) will be skipped from memory.")
+
+    def _refresh_mjr_lookups(self, cards_data: List[Dict[str, Any]]) -> Tuple[Set[str], Dict[str, Optional[str]]]:
+        """
+        Reads MJR link and DB status for every card on screen in one IN query, then checks which of those MJRs are fully
+        scraped in a second. Returns (fully scraped MJR IDs, {booking_id: db_status}). Known MJR links are kept in
+        self._mja_to_mjr across cycles (an MJA never changes MJR); MJRs already in session_fully_processed_mjr_ids are not
+        re-checked, and cards already skipped or clicked this session are not looked up. Bookings in self._final_statuses
+        already have their status (and MJR link) in memory, so only the remaining IDs go to the IN query.
+        """
+        mja_ids = [card['booking_id'] for card in cards_data if card.get('booking_id') and card['booking_id'] not in self.session_skipped_mja_ids
+                   and card['booking_id'] not in self.session_clicked_mja_ids] # Already decided in memory, no SQL needed
+        if not mja_ids: return set(), {}
+        db_status_map = {mja_id: self._final_statuses[mja_id] for mja_id in mja_ids if mja_id in self._final_statuses}
+        unknown_mja_ids = [mja_id for mja_id in mja_ids if mja_id not in db_status_map]
+        with self.pool.read() as read_conn:
+            booking_states = get_booking_states_for_mjas(read_conn, unknown_mja_ids) if unknown_mja_ids else {}
+            db_status_map.update((booking_id, status) for booking_id, (_mjr_id, status) in booking_states.items())
+            self._mja_to_mjr.update((booking_id, mjr_id) for booking_id, (mjr_id, _status) in booking_states.items() if mjr_id)
+            mjr_ids_to_check = {self._mja_to_mjr[mja_id] for mja_id in mja_ids if mja_id in self._mja_to_mjr} \
+                - self.session_fully_processed_mjr_ids - self._indexed_mjr_ids
+            return (get_fully_scraped_mjr_ids(read_conn, list(mjr_ids_to_check)) if mjr_ids_to_check else set()), db_status_map
+
+    def _flush_pending_writes(self, pending_inserts: List[Dict[str, Any]], pending_status_updates: List[Tuple[str, str, Optional[str]]]):
+        """Writes the cycle's queued base rows, then status updates, in a single transaction. Errors are logged, not raised."""
+        if not pending_inserts and not pending_status_updates: return
         try:
-            loc = element.location; sz = element.size; top_m = 0.15; bot_m = 0.85 # Margins
-            top_b = window_height * top_m; bot_b = window_height * bot_m
-            el_top = loc['y']; el_bot = el_top + sz['height']
-            is_vis = el_top >= top_b and el_bot <= bot_b and element.is_displayed()
-            logger.debug(f"Visibility check for element at y={el_top}, h={sz['height']}: FullyVis={is_vis} (Bounds:{top_b:.0f}-{bot_b:.0f})")
-            return is_vis
-        except: return False
+            with self.pool.write() as conn:
+                insert_bookings_base_bulk(conn, pending_inserts, commit=False)
+                update_booking_statuses_bulk(conn, pending_status_updates, commit=False)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(pending_inserts)} base rows and {len(pending_status_updates)} status updates: {e}")
+            return
+        # Mirror the committed final statuses locally instead of re-reading them; like the base upsert, only a cancellation replaces 'scraped'
+        for card_data in pending_inserts:
+            final_status = CARD_STATUS_FINAL_STATE.get(card_data.get('card_status'))
+            if final_status and (final_status == BookingProcessingStatus.CANCELLED_ON_LIST.value
+                                 or self._final_statuses.get(card_data['booking_id']) != BookingProcessingStatus.SCRAPED.value):
+                self._final_statuses[card_data['booking_id']] = final_status
+        for booking_id, status, _reason in pending_status_updates:
+            if status in FINAL_STATES: self._final_statuses[booking_id] = status
+
+    def _classify_cards(self, cards_data: List[Dict[str, Any]], screen_fully_scraped_mjr_ids: Set[str], db_status_map: Dict[str, Optional[str]]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """Lazily yields (card_data, decision) for each card with an MJA ID; the caller applies the writes and bookkeeping."""
+        for card_data in cards_data:
+            booking_id = card_data.get('booking_id')
+            if not booking_id: continue
+            yield card_data, self._classify_card(card_data, screen_fully_scraped_mjr_ids, db_status_map.get(booking_id))
+
+    def _classify_card(self, card_data: Dict[str, Any], screen_fully_scraped_mjr_ids: Set[str], db_status_val: Optional[str] = None) -> str:
+        booking_id = card_data['booking_id']
+        card_status_enum = card_data.get('card_status', BookingCardStatus.NORMAL)
+        logger.debug(f"Evaluating Card MJA: {booking_id}, Parsed List Status: {card_status_enum.value if card_status_enum else 'N/A'}")
+
+        # A cancellation is recorded even for bookings already handled or scraped; the base upsert moves 'scraped' to 'cancelled_on_list'
+        if card_status_enum == BookingCardStatus.CANCELLED and (db_status_val or self._final_statuses.get(booking_id)) != BookingProcessingStatus.CANCELLED_ON_LIST.value:
+            logger.info(f"Booking {booking_id} is CANCELLED on list. Saving base info, status, and skipping detail scrape.")
+            return CARD_WRITE_AND_SKIP
+
+        # Check if MJA was clicked in this session (for XML dump mode primarily, or if we want to avoid re-clicking within a session)
+        if booking_id in self.session_clicked_mja_ids:
+            logger.debug(f"Card {booking_id} already in session_clicked_mja_ids. Skipping for click.")
+            return CARD_SKIP
+        # Member of an MJR completed this session: pure set lookup, no DB
+        if booking_id in self.session_skipped_mja_ids:
+            logger.debug(f"Card {booking_id} belongs to an MJR fully processed this session. Skipping.")
+            return CARD_SKIP
+        # Check if this MJA's parent MJR has been fully processed this session (efficiency)
+        mjr_id_for_card = self._mja_to_mjr.get(booking_id) # Filled by _refresh_mjr_lookups for this screen
+        if mjr_id_for_card and mjr_id_for_card in self.session_fully_processed_mjr_ids:
+            logger.info(f"Card {booking_id} (MJR: {mjr_id_for_card}) belongs to an MJR already fully processed this session. Skipping detailed scrape.")
+            return CARD_MARK_SCRAPED_AND_SKIP
+        if mjr_id_for_card and mjr_id_for_card in screen_fully_scraped_mjr_ids: # Checked DB for full MJR completion
+            logger.info(f"Card {booking_id} (MJR: {mjr_id_for_card}) belongs to an MJR already fully scraped in DB. Adding to session processed MJRs and skipping.")
+            self.mark_mjr_fully_processed(mjr_id_for_card)
+            return CARD_SKIP
+        # Already final in the DB (from an earlier session) and the list shows nothing new for it
+        if db_status_val in FINAL_STATES and db_status_val in (BookingProcessingStatus.SCRAPED.value, CARD_STATUS_FINAL_STATE.get(card_status_enum)):
+            logger.debug(f"Card {booking_id} already has final DB status '{db_status_val}'. Skipping.")
+            return CARD_SKIP
+
+        if booking_id in self.processed_ids_this_cycle:
+            # Seen earlier in this view cycle and not clicked; still re-offered, the selector decides again
+            logger.debug(f"Card {booking_id} already in processed_ids_this_cycle.")
+
+        # Handle based on card status parsed from list (cancelled cards were handled above)
+        if card_status_enum in OFFER_OR_VIEWED_CARD_STATUSES:
+            logger.info(f"Booking {booking_id} is '{card_status_enum.value}' on list. Saving base info, status, and skipping detail scrape.")
+            return CARD_WRITE_AND_SKIP
+        if card_status_enum == BookingCardStatus.NORMAL: # Or any other status that requires full processing
+            logger.debug(f"Card {booking_id} is Normal/Processable. Adding to click candidates.")
+            return CARD_CLICK_CANDIDATE
+        logger.warning(f"Card {booking_id} has unhandled status '{card_status_enum.value}'. Marking as processed for this cycle.")
+        return CARD_UNHANDLED
 
+    def _find_card_element(self, card_data: Dict[str, Any]) -> Optional[WebElement]:
+        """
+        Materializes one card's WebElement with a native UiSelector lookup; None if it is no longer on screen or not clickable.
+        Matches the exact content-desc from the snapshot when known, else falls back to descriptionContains(booking_id).
+        """
+        content_desc = card_data.get('content_desc')
+        if content_desc:
+            escaped_desc = content_desc.replace('\\', '\\\\').replace('"', '\\"') # UiSelector string literal escaping
+            selector = ListPage.CLICKABLE_CARD_BY_DESC_UIAUTOMATOR_TEMPLATE.format(content_desc=escaped_desc)
+        else:
+            selector = ListPage.CLICKABLE_CARD_BY_ID_UIAUTOMATOR_TEMPLATE.format(booking_id=card_data['booking_id'])
+        elements = self.driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, selector)
+        return elements[0] if elements else None
 
     def _select_card_to_click(
-        self, unprocessed_cards_data: List[Dict[str, Any]], window_height: int
+        self, candidate_ids: List[str], cards_by_id: Dict[str, Dict[str, Any]], window_height: int
     ) -> Optional[Tuple[Dict[str, Any], WebElement]]:
-        if not unprocessed_cards_data: return None
+        if not candidate_ids: return None
         
-        candidates = []
         screen_center_y = window_height / 2
+        top_b = window_height * VISIBLE_TOP_FRAC; bot_b = window_height * VISIBLE_BOT_FRAC
 
-        for card_data in unprocessed_cards_data:
-            booking_id = card_data.get('booking_id')
-            if not booking_id: continue
-
-            # Element must be clickable and fully visible to be a candidate
-            try:
-                # Construct selector carefully based on how content-desc is formed by mja_parser
-                # The mja_parser now puts the status into 'card_status' field.
-                # The raw content-desc might or might not have the status prefix.
-                # We need to find the element based on its MJA ID primarily.
-                click_selector = f'//android.view.ViewGroup[@content-desc and contains(@content-desc, "{booking_id}")]'
-                
-                # Stricter: find based on exact start if no prefix, or with prefix
-                # card_status_val = card_data.get('card_status').value if card_data.get('card_status') else BookingCardStatus.NORMAL.value
-                # desc_prefix_for_find = f"{card_status_val}, " if card_status_val not in [BookingCardStatus.NORMAL.value, BookingCardStatus.UNKNOWN.value] else ""
-                # click_selector = f'//android.view.ViewGroup[starts-with(@content-desc, "{desc_prefix_for_find}{booking_id}")]'
-
-                element = WebDriverWait(self.driver, 2).until(
-                    EC.element_to_be_clickable((AppiumBy.XPATH, click_selector))
-                )
-                if self._is_element_fully_visible(element, window_height):
-                    loc = element.location
-                    sz = element.size
-                    el_center_y = loc['y'] + (sz['height'] / 2)
-                    candidates.append({'data': card_data, 'element': element, 'distance': abs(el_center_y - screen_center_y)})
+        def _candidate_distances():
+            for booking_id in candidate_ids:
+                card_data = cards_by_id[booking_id]
+                # Card must be clickable and fully visible (both from the XML snapshot) to be a candidate
+                if not card_data.get('clickable', True):
+                    logger.debug(f"Card {booking_id} is not clickable in the page XML. Skipping.")
+                elif self._is_fully_visible_from_bounds(card_data, top_b, bot_b):
+                    _x1, y1, _x2, y2 = card_data['bounds']
+                    yield abs((y1 + y2) / 2 - screen_center_y), card_data
                 else:
-                    logger.debug(f"Card {booking_id} (Status: {card_data.get('card_status', {}).get('value', 'N/A')}) found but not fully visible for click.")
-            except (TimeoutException, NoSuchElementException):
-                logger.warning(f"Could not locate clickable element for {booking_id} with selector: {click_selector}")
-            except Exception as e_loc:
-                logger.error(f"Error locating element for {booking_id}: {e_loc}")
-        
+                    logger.debug(f"Card {booking_id} (Status: {card_data['card_status'].value if card_data.get('card_status') else 'N/A'}) found but not fully visible for click.")
+
+        # (distance to screen centre, card_data) for the MAX_CLICK_CANDIDATES cards closest to the centre, nearest first
+        candidates = heapq.nsmallest(MAX_CLICK_CANDIDATES, _candidate_distances(), key=itemgetter(0))
         if not candidates:
             logger.info("No suitable (fully visible, clickable) 'Normal' unprocessed cards found.")
             return None
         
-        candidates.sort(key=lambda x: x['distance']) # Closest to center
-        selected = candidates[0]
-        logger.info(f"Selected card {selected['data']['booking_id']} (Status: {selected['data'].get('card_status').value}) to click.")
-        return selected['data'], selected['element']
+        # Ranking is pure Python on the snapshot; only the winner is located, and that one UiSelector lookup is the live check.
+        # A screen costs two round-trips: the page_source behind get_cards() and this lookup.
+        for _distance, selected_data in candidates: # The nearest usually wins first time
+            try: element = self._find_card_element(selected_data)
+            except WebDriverException as e_loc: # e.g. an invalid selector; a plain miss is just an empty find_elements
+                logger.error(f"Error locating element for {selected_data['booking_id']}: {e_loc}"); element = None
+            if element is not None:
+                logger.info(f"Selected card {selected_data['booking_id']} (Status: {selected_data.get('card_status').value}) to click.")
+                return selected_data, element
+            logger.warning(f"Card {selected_data['booking_id']} is no longer on screen and clickable. Trying next candidate.")
+        logger.info(f"None of the {len(candidates)} closest candidate cards passed the live lookup.")
+        return None
+
+    def _wait_for(self, condition, timeout: float, poll_frequency: float = 0.1) -> bool:
+        try: WebDriverWait(self.driver, timeout, poll_frequency=poll_frequency).until(condition); return True
+        except TimeoutException: return False
+
+    def _left_list_page(self, driver) -> bool:
+        # find_elements returns [] instead of raising, so each poll is at most two lookups
+        if driver.find_elements(*SecondaryPage.TITLE_LOCATOR): return True
+        return not driver.find_elements(*ListPage.CARD_CONTAINER_LOCATOR)
+
+    @contextmanager
+    def _zero_implicit_wait(self):
+        """
+        Turns the driver's implicit wait off for a list cycle so element misses fail instantly; restores it afterwards.
+        The driver's own value is read once; if it is already 0 there is nothing to toggle and no round-trips are made.
+        """
+        try:
+            if self._restore_implicit_wait is None: self._restore_implicit_wait = self.driver.timeouts.implicit_wait
+            toggled = bool(self._restore_implicit_wait)
+            if toggled: self.driver.implicitly_wait(0)
+        except Exception as e:
+            logger.debug(f"Could not set implicit wait to 0: {e}"); toggled = False
+        try:
+            yield
+        finally:
+            if toggled:
+                try: self.driver.implicitly_wait(self._restore_implicit_wait)
+                except Exception as e: logger.debug(f"Could not restore implicit wait to {self._restore_implicit_wait}: {e}")
 
     def process(self, is_initial_entry=True) -> ScrapeState:
+        # Cards come from the XML snapshot, so live lookups either hit immediately or not at all; no idle/implicit waits needed
+        with fast_idle_settings(self.driver), self._zero_implicit_wait():
+            return self._process_list_view(is_initial_entry)
+
+    def _process_list_view(self, is_initial_entry: bool) -> ScrapeState:
         logger.info(f"Processing State: LIST (Display {self.target_display_id_str}, Initial Entry: {is_initial_entry})")
         session_id_str = f"session_{self.state_manager.session_id if self.state_manager else 'unknown'}"
 
         if is_initial_entry:
             self.processed_ids_this_cycle.clear()
             self.scroll_attempts = 0 # Reset scroll attempts on a truly fresh list view (e.g., after detail page)
-            if DUMP_XML_MODE and self.driver:
-                 try: save_xml_dump(self.driver.page_source, "MJA_list", session_id_str, sequence_or_stage="initial_view_00")
-                 except Exception as e: logger.error(f"Could not dump initial list XML: {e}")
+            self._next_page_source = None # A fresh view is always re-captured
         
-        if not self._ensure_on_list_page(initial_check=is_initial_entry): # Only do thorough check on initial entry
-            self.state_manager.update_state(ScrapeState.ERROR, error_message="Failed to ensure on list page"); return ScrapeState.ERROR
+        self._apply_display_setting()
+        settled_page_source, self._next_page_source = self._next_page_source, None # Post-scroll snapshot, if the last cycle scrolled
+        cards_on_screen_data, list_page_source = self.list_page.get_cards(page_source=settled_page_source) # Gets parsed data from XML
+        # The card snapshot doubles as the "on list page" check; only probe live (and press back) when it doesn't show the list
+        if not cards_on_screen_data and not self.list_page.is_list_source(list_page_source):
+            if not self._ensure_on_list_page(initial_check=is_initial_entry): # Only do thorough check on initial entry
+                self.state_manager.update_state(ScrapeState.ERROR, error_message="Failed to ensure on list page"); return ScrapeState.ERROR
+            cards_on_screen_data, list_page_source = self.list_page.get_cards()
         
         try:
-            self._apply_display_setting()
-            cards_on_screen_data = self.list_page.get_cards() # Gets parsed data from XML
+            if is_initial_entry and DUMP_XML_MODE and list_page_source:
+                 try: submit_xml_dump(list_page_source, "MJA_list", session_id_str, sequence_or_stage="initial_view_00") # Same snapshot the cards came from
+                 except Exception as e: logger.error(f"Could not dump initial list XML: {e}")
             logger.info(f"Found data for {len(cards_on_screen_data)} cards on screen via XML.")
 
             if not cards_on_screen_data:
@@ -155,99 +376,64 @@ class ListProcessor:
                  else: 
                      logger.warning("ListPage.get_cards returned no card data. Will proceed to scroll/finish logic.")
             
-            unprocessed_for_click_candidates_data: List[Dict[str, Any]] = []
-            window_height = self.driver.get_window_size()['height']
+            cards_by_id: Dict[str, Dict[str, Any]] = {card['booking_id']: card for card in cards_on_screen_data if card.get('booking_id')}
+            click_candidate_ids: List[str] = [] # Keys into cards_by_id, in screen order
+            pending_inserts: List[Dict[str, Any]] = [] # Base rows for skipped cards (and the card to click), flushed in one transaction
+            pending_status_updates: List[Tuple[str, str, Optional[str]]] = [] # (booking_id, status, reason)
+            window_height = self._get_window_height()
+            top_b = window_height * VISIBLE_TOP_FRAC; bot_b = window_height * VISIBLE_BOT_FRAC # Visible band, computed once per screen
             current_view_last_good_anchor_id: Optional[str] = None
             any_new_unprocessed_card_found_on_screen = False
 
             if cards_on_screen_data:
-                for card_data in cards_on_screen_data:
-                    booking_id = card_data.get('booking_id')
+                screen_fully_scraped_mjr_ids, db_status_map = self._refresh_mjr_lookups(cards_on_screen_data)
+                for card_data, decision in self._classify_cards(cards_on_screen_data, screen_fully_scraped_mjr_ids, db_status_map):
+                    booking_id = card_data['booking_id']
                     card_status_enum = card_data.get('card_status', BookingCardStatus.NORMAL)
-                    if not booking_id: continue 
-
-                    logger.debug(f"Evaluating Card MJA: {booking_id}, Parsed List Status: {card_status_enum.value if card_status_enum else 'N/A'}")
-
-                    skip_this_card_for_processing = False
-                    
-                    # Check if MJA was clicked in this session (for XML dump mode primarily, or if we want to avoid re-clicking within a session)
-                    if booking_id in self.session_clicked_mja_ids:
-                        logger.debug(f"Card {booking_id} already in session_clicked_mja_ids. Skipping for click.")
-                        skip_this_card_for_processing = True
-                    
-                    # Check if this MJA's parent MJR has been fully processed this session (efficiency)
-                    if not skip_this_card_for_processing:
-                        mjr_id_for_card = get_mjr_id_for_mja(self.conn, booking_id) # Assumes MJA base data is in DB
-                        if mjr_id_for_card and mjr_id_for_card in self.session_fully_processed_mjr_ids:
-                            logger.info(f"Card {booking_id} (MJR: {mjr_id_for_card}) belongs to an MJR already fully processed this session. Skipping detailed scrape.")
-                            update_booking_status(self.conn, booking_id, BookingProcessingStatus.SCRAPED.value, "Skipped, MJR processed this session")
-                            skip_this_card_for_processing = True
-                        elif mjr_id_for_card and check_if_all_mjas_for_mjr_scraped(self.conn, mjr_id_for_card) : # Check DB for full MJR completion
-                             logger.info(f"Card {booking_id} (MJR: {mjr_id_for_card}) belongs to an MJR already fully scraped in DB. Adding to session processed MJRs and skipping.")
-                             self.session_fully_processed_mjr_ids.add(mjr_id_for_card)
-                             skip_this_card_for_processing = True
-
-
-                    # If already processed in current view cycle (e.g. seen, determined skippable, now re-evaluating view after no click)
-                    if booking_id in self.processed_ids_this_cycle and not skip_this_card_for_processing:
-                        logger.debug(f"Card {booking_id} already in processed_ids_this_cycle. Not re-adding to click candidates unless forced.")
-                        # This state means we saw it, decided not to click or couldn't, and are now re-evaluating the screen.
-                        # It should not be re-added to click candidates unless it's the only option left after a scroll.
-                        # For now, if it's in this_cycle, it means it was handled or deemed unclickable.
-
-                    if skip_this_card_for_processing:
-                        if booking_id not in self.processed_ids_this_cycle: self.processed_ids_this_cycle.add(booking_id)
+
+                    if decision in (CARD_SKIP, CARD_MARK_SCRAPED_AND_SKIP):
+                        if decision == CARD_MARK_SCRAPED_AND_SKIP:
+                            pending_status_updates.append((booking_id, BookingProcessingStatus.SCRAPED.value, "Skipped, MJR processed this session"))
+                        self.processed_ids_this_cycle.add(booking_id)
                         # Try to update scroll anchor even for skipped cards if they are visible
-                        try:
-                            temp_el = self.driver.find_element(AppiumBy.XPATH, f'//android.view.ViewGroup[@content-desc and contains(@content-desc, "{booking_id}")]')
-                            if self._is_element_fully_visible(temp_el, window_height): current_view_last_good_anchor_id = booking_id
-                        except: pass
+                        if self._is_fully_visible_from_bounds(card_data, top_b, bot_b): current_view_last_good_anchor_id = booking_id
                         continue
 
                     # If not skipped by any of the above, it's a new, unprocessed card for this view cycle
                     any_new_unprocessed_card_found_on_screen = True
                     self.processed_ids_this_cycle.add(booking_id) # Mark as seen in this cycle
 
-                    # Handle based on card status parsed from list
-                    if card_status_enum == BookingCardStatus.CANCELLED:
-                        logger.info(f"Booking {booking_id} is CANCELLED on list. Saving base info, status, and skipping detail scrape.")
-                        insert_booking_base(self.conn, card_data) # Will set status to 'cancelled_on_list'
+                    if decision == CARD_WRITE_AND_SKIP: # Cancelled / offer / viewed: the list card is all we record
+                        pending_inserts.append(card_data) # Sets status to 'cancelled_on_list' or 'skipped_offer_viewed'
+                        if card_status_enum != BookingCardStatus.CANCELLED:
+                            pending_status_updates.append((booking_id, BookingProcessingStatus.SKIPPED_OFFER_VIEWED.value, f"Card status: {card_status_enum.value}"))
                         self.session_clicked_mja_ids.add(booking_id) # Consider it "handled" for the session
-                        current_view_last_good_anchor_id = booking_id
-                        continue
-                    
-                    if card_status_enum in [BookingCardStatus.NEW_OFFER, BookingCardStatus.VIEWED]:
-                        logger.info(f"Booking {booking_id} is '{card_status_enum.value}' on list. Saving base info, status, and skipping detail scrape.")
-                        insert_booking_base(self.conn, card_data) # Save its presence and status from list
-                        update_booking_status(self.conn, booking_id, BookingProcessingStatus.SKIPPED_OFFER_VIEWED.value, f"Card status: {card_status_enum.value}")
-                        self.session_clicked_mja_ids.add(booking_id)
-                        current_view_last_good_anchor_id = booking_id
-                        continue
-                    
-                    if card_status_enum == BookingCardStatus.NORMAL: # Or any other status that requires full processing
-                        logger.debug(f"Card {booking_id} is Normal/Processable. Adding to click candidates.")
-                        unprocessed_for_click_candidates_data.append(card_data)
-                    else: # Unknown status, treat as seen but not for click
-                        logger.warning(f"Card {booking_id} has unhandled status '{card_status_enum.value}'. Marking as processed for this cycle.")
+                        if self._is_fully_visible_from_bounds(card_data, top_b, bot_b): current_view_last_good_anchor_id = booking_id
+                    elif decision == CARD_CLICK_CANDIDATE:
+                        click_candidate_ids.append(booking_id)
+                    elif self._is_fully_visible_from_bounds(card_data, top_b, bot_b): # Unknown status, treat as seen but not for click
                         current_view_last_good_anchor_id = booking_id
                 
                 if current_view_last_good_anchor_id: self.last_good_scroll_anchor_id = current_view_last_good_anchor_id
-                elif cards_on_screen_data : self.last_good_scroll_anchor_id = cards_on_screen_data[-1].get('booking_id') # Fallback
+                elif cards_on_screen_data: # Fallback: the lowest card whose bounds are still inside the window, else the last one
+                    on_screen_cards = [card for card in cards_on_screen_data if card.get('bounds') and card['bounds'][3] <= window_height]
+                    self.last_good_scroll_anchor_id = (on_screen_cards or cards_on_screen_data)[-1].get('booking_id')
 
             if any_new_unprocessed_card_found_on_screen:
                 logger.debug("New unprocessed cards (not skipped by session logic) were found on this screen view. Resetting scroll_attempts.")
                 self.scroll_attempts = 0 
             
-            logger.info(f"Found {len(unprocessed_for_click_candidates_data)} 'Normal' (or processable) cards for potential click.")
+            logger.info(f"Found {len(click_candidate_ids)} 'Normal' (or processable) cards for potential click.")
             selected_card_tuple = None
-            if unprocessed_for_click_candidates_data:
-                selected_card_tuple = self._select_card_to_click(unprocessed_for_click_candidates_data, window_height)
+            if click_candidate_ids:
+                selected_card_tuple = self._select_card_to_click(click_candidate_ids, cards_by_id, window_height)
 
             if selected_card_tuple:
                 selected_card_data, clickable_element = selected_card_tuple
                 booking_id_to_click = selected_card_data['booking_id']
                 
-                insert_booking_base(self.conn, selected_card_data) # Ensure base record exists or is updated
+                pending_inserts.append(selected_card_data) # Ensure base record exists or is updated
+                self._flush_pending_writes(pending_inserts, pending_status_updates) # One transaction per screen, persisted before the click navigates away
                 self.session_clicked_mja_ids.add(booking_id_to_click) # Mark as clicked for this session
                 self.last_good_scroll_anchor_id = booking_id_to_click # Update scroll anchor
                 
@@ -256,7 +442,8 @@ class ListProcessor:
                     logger.info(f"Attempting click on selected card {booking_id_to_click}")
                     clickable_element.click()
                     logger.info(f"Clicked card {booking_id_to_click}")
-                    time.sleep(1.5) # Wait for navigation
+                    if not self._wait_for(self._left_list_page, self.navigation_timeout): # Returns as soon as the secondary page shows
+                        logger.warning(f"Still on list page {self.navigation_timeout}s after clicking {booking_id_to_click}. Continuing to SECONDARY.")
                     return ScrapeState.SECONDARY
                 except StaleElementReferenceException:
                     logger.warning(f"Element for {booking_id_to_click} became stale before click. Retrying LIST.")
@@ -266,10 +453,11 @@ class ListProcessor:
                     return ScrapeState.LIST
                 except Exception as click_e:
                     logger.exception(f"Click error for {booking_id_to_click}: {click_e}")
-                    update_booking_status(self.conn, booking_id_to_click, BookingProcessingStatus.ERROR_LIST.value, f"Click error: {click_e}")
+                    with self.pool.write() as conn: update_booking_status(conn, booking_id_to_click, BookingProcessingStatus.ERROR_LIST.value, f"Click error: {click_e}")
                     self.state_manager.update_state(ScrapeState.ERROR, error_message=f"Click error on {booking_id_to_click}")
                     return ScrapeState.ERROR
             else: # No card was selected for click (none suitable, or all skippable and no new ones)
+                self._flush_pending_writes(pending_inserts, pending_status_updates)
                 logger.info("No suitable card was selected to click on this screen view.")
                 # If we didn't click, and we know there were no *new* processable items, it's an unproductive view.
                 if not any_new_unprocessed_card_found_on_screen and cards_on_screen_data: # Screen had cards, but all were "old"
@@ -297,10 +485,19 @@ class ListProcessor:
                 logger.info(f"Attempting scroll (current attempt: {self.scroll_attempts}/{self.max_scroll_attempts})")
                 try:
                     logger.debug(f"Using anchor '{self.last_good_scroll_anchor_id}' for scroll.")
+                    pre_scroll_source_hash = self.list_page.last_page_source_hash
                     self.list_page.scroll(self.last_good_scroll_anchor_id) # list_page.scroll handles its own timing
-                    if DUMP_XML_MODE and self.driver: save_xml_dump(self.driver.page_source, "MJA_list", session_id_str, sequence_or_stage=f"scroll_{self.scroll_attempts:02d}")
-                    if self.crawler_service: self.crawler_service.take_screenshot_on_display(str(self.target_display_id_str), os.path.join(self.screenshot_dir, f"after_scroll_{self.scroll_attempts}.png"))
-                    logger.debug("Waiting after scroll..."); time.sleep(2.0) # Wait for UI to settle after scroll
+                    # Wait for UI to settle after scroll: returns as soon as the list content differs from the pre-scroll snapshot
+                    post_scroll_source = self.list_page.wait_for_source_change(pre_scroll_source_hash, self.scroll_settle_timeout)
+                    if post_scroll_source is None and pre_scroll_source_hash is not None:
+                        # Same page digest after the scroll: the list didn't move, so we're at the end. Further attempts would see the same screen.
+                        logger.info(f"List unchanged after scroll attempt {self.scroll_attempts}; end of list reached. Finishing.")
+                        self.scroll_attempts = self.max_scroll_attempts
+                        self.state_manager.finish_session(status='completed_max_scrolls')
+                        return ScrapeState.FINISHED
+                    if DUMP_XML_MODE and post_scroll_source: submit_xml_dump(post_scroll_source, "MJA_list", session_id_str, sequence_or_stage=f"scroll_{self.scroll_attempts:02d}")
+                    self._next_page_source = post_scroll_source # Next cycle parses this snapshot instead of fetching again
+                    if self.crawler_service: self.crawler_service.submit_screenshot_on_display(str(self.target_display_id_str), os.path.join(self.screenshot_dir, f"after_scroll_{self.scroll_attempts}.png"))
                     self.state_manager.update_state(ScrapeState.LIST, current_booking_id=None) # Stay on LIST, but not initial entry
                     return ScrapeState.LIST
                 except Exception as scroll_e:
@@ -6,12 +6,14 @@ from pages.secondary_page import SecondaryPage
 from state.models import ScrapeState
 from state.manager import StateManager
 from parsers.secondary_parser import parse_secondary_page_data
+from db.pool import ConnectionPool
 from db.repository import update_booking_secondary_ids, update_booking_status
 from selenium.common.exceptions import TimeoutException
-from typing import TYPE_CHECKING, Optional, Dict, Any # Ensure Any is imported
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple # Ensure Any is imported
 
 from config import DUMP_XML_MODE
-from utils.xml_dumper import save_xml_dump
+from utils.xml_dumper import submit_xml_dump
+from utils.driver_settings import fast_idle_settings
 
 if TYPE_CHECKING:
     from services.crawler_service import CrawlerService # For type hinting
@@ -19,25 +21,39 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+FOCUS_CACHE_TTL_SECONDS = 2.0 # How long an app/display focus result (an adb dumpsys call) is reused
+
 class SecondaryProcessor:
     """Handles processing of the intermediate MJB page."""
     
-    def __init__(self, driver, conn, sec_page: SecondaryPage, state_manager: StateManager, target_display_id: str = "0", crawler_service: Optional['CrawlerService'] = None): # Made crawler_service optional
+    def __init__(self, driver, conn, sec_page: SecondaryPage, state_manager: StateManager, target_display_id: str = "0", crawler_service: Optional['CrawlerService'] = None, pool: Optional[ConnectionPool] = None): # Made crawler_service optional
         self.driver = driver
         self.conn = conn
+        self.pool = pool or ConnectionPool(conn) # Secondary-ID writes go through pool.write()
         self.sec_page = sec_page
         self.state_manager = state_manager
         self.target_display_id_str = target_display_id # Store as string from crawler
         self.crawler_service = crawler_service # Store crawler_service instance
         # Get display_manager from crawler_service if available
         self.display_manager: Optional['DisplayManager'] = getattr(self.crawler_service, 'display_manager', None)
+        self._target_package: Optional[str] = None # driver.caps['appPackage'], read once on first use
+        self._focus_cache: Optional[Tuple[float, bool]] = None # (time.monotonic() of the check, result); cleared on ERROR
 
 
     def _check_active_app_and_display(self) -> bool:
         """
         Checks if the target app has focus on the correct display.
-        Uses DisplayManager.
+        Uses DisplayManager. A result is reused for FOCUS_CACHE_TTL_SECONDS.
         """
+        now = time.monotonic()
+        if self._focus_cache and now - self._focus_cache[0] < FOCUS_CACHE_TTL_SECONDS:
+            logger.debug(f"Using cached app/display focus result: {self._focus_cache[1]}")
+            return self._focus_cache[1]
+        result = self._query_active_app_and_display()
+        self._focus_cache = (now, result)
+        return result
+
+    def _query_active_app_and_display(self) -> bool:
         if not self.display_manager:
             logger.warning("DisplayManager not available in SecondaryProcessor. Skipping display/app check.")
             # If display manager is critical, this might be an error or require a different handling.
@@ -48,8 +64,8 @@ class SecondaryProcessor:
             if app_info:
                 logger.debug(f"Active window: {app_info['package']}, Display: {app_info['display_id']}")
                 
-                # Use driver.caps instead of driver.desired_capabilities
-                target_package = self.driver.caps.get('appPackage') 
+                if self._target_package is None: self._target_package = self.driver.caps.get('appPackage') # Doesn't change during a session
+                target_package = self._target_package
                 
                 if app_info['package'] == target_package and \
                    str(app_info['display_id']) == str(self.target_display_id_str):
@@ -64,7 +80,7 @@ class SecondaryProcessor:
             else:
                 # This is where "No active window found for com.wordsynknetwork.moj" is logged
                 # Use driver.caps here as well for consistency if needed
-                target_package_for_log = self.driver.caps.get('appPackage', 'UNKNOWN_TARGET_PACKAGE')
+                target_package_for_log = self._target_package or self.driver.caps.get('appPackage', 'UNKNOWN_TARGET_PACKAGE')
                 logger.error(f"No active window found for {target_package_for_log}")
                 return False
         except AttributeError as ae: # Catch specific attribute error if caps isn't there for some reason
@@ -91,20 +107,33 @@ class SecondaryProcessor:
         return True
 
     def process(self) -> ScrapeState:
+        with fast_idle_settings(self.driver): # page_source and the MJR link wait shouldn't block on UI idle
+            next_state = self._process_secondary_page()
+        if next_state == ScrapeState.ERROR: self._focus_cache = None # Recovery must see the real focus state
+        return next_state
+
+    def _process_secondary_page(self) -> ScrapeState:
         current_mja = self.state_manager.current_booking_id
         logger.info(f"Processing State: SECONDARY (Display {self.target_display_id_str}, MJA: {current_mja})")
 
-        if not self._ensure_on_secondary_page():
-            logger.error(f"Failed to ensure on secondary page for MJA {current_mja}.")
-            self.state_manager.update_state(ScrapeState.ERROR, current_booking_id=current_mja, error_message="Failed to ensure on secondary page (processor)")
-            return ScrapeState.ERROR
+        # The page source we parse anyway doubles as the "on secondary page" check; live probes only run when it doesn't show the page
+        try: secondary_page_source = self.driver.page_source if self.driver else None
+        except Exception as e:
+            logger.warning(f"Could not get secondary page source for MJA {current_mja}: {e}"); secondary_page_source = None
+        if not self.sec_page.is_secondary_source(secondary_page_source):
+            if not self._ensure_on_secondary_page():
+                logger.error(f"Failed to ensure on secondary page for MJA {current_mja}.")
+                self.state_manager.update_state(ScrapeState.ERROR, current_booking_id=current_mja, error_message="Failed to ensure on secondary page (processor)")
+                return ScrapeState.ERROR
+            secondary_page_source = None # Re-captured below, now that the page is showing
+        else:
+            logger.info("Confirmed on Secondary Page (page source).")
 
-        secondary_page_source = None
         page_info = None
 
         try:
             if self.driver:
-                secondary_page_source = self.driver.page_source
+                if secondary_page_source is None: secondary_page_source = self.driver.page_source
                 if not secondary_page_source:
                     logger.error(f"Failed to get page source for secondary page MJA {current_mja}.")
                     self.state_manager.update_state(ScrapeState.ERROR, current_booking_id=current_mja, error_message="Empty page source on secondary page")
@@ -116,7 +145,7 @@ class SecondaryProcessor:
                     mjb_identifier = page_info.get('mjb_id_raw') if page_info else None
                     primary_folder_id = current_mja if current_mja else "UNKNOWN_MJA_SEC"
                     stage_name = mjb_identifier if mjb_identifier else "UNKNOWN_MJB"
-                    save_xml_dump(secondary_page_source, "Secondary", primary_folder_id, sequence_or_stage=stage_name)
+                    submit_xml_dump(secondary_page_source, "Secondary", primary_folder_id, sequence_or_stage=stage_name)
 
             if not page_info or not page_info.get('mjr_id_raw'):
                 logger.error(f"Failed to extract MJR ID from secondary page for MJA {current_mja}. Info: {page_info}")
@@ -131,7 +160,7 @@ class SecondaryProcessor:
 
             # Database update always occurs if not in exclusive dump mode (already handled by removing conditional)
             if current_mja:
-                update_booking_secondary_ids(self.conn, current_mja, mjb_id, mjr_id, appt_count_hint, type_hint)
+                with self.pool.write() as conn: update_booking_secondary_ids(conn, current_mja, mjb_id, mjr_id, appt_count_hint, type_hint)
             else:
                 logger.warning("No current_mja_in_state to update secondary IDs, this might happen if resuming directly to secondary.")
 
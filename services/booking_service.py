@@ -5,38 +5,75 @@
 
 from appium import webdriver
 from appium.options.android import UiAutomator2Options
-from config import APPIUM_SERVER_URL, GENERAL_CAPABILITIES, DB_PATH
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.wait import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from config import APPIUM_SERVER_URL, GENERAL_CAPABILITIES, DB_PATH, COMPACT_SOURCE_SETTINGS, FAST_IDLE_SETTINGS
 from db.connection import init_db, close_db
 from pages.list_page import ListPage
 from pages.secondary_page import SecondaryPage
 from pages.detail_page import DetailPage
 from parsers.mja_parser import parse_mja
 from parsers.secondary_parser import parse_secondary_page_data
-from parsers.detail_parser import extract_raw_details_from_xml_text, parse_detail_data, check_if_multiday_from_xml
-from db.repository import insert_booking_base, update_booking_secondary_ids, save_booking_details
+from parsers.detail_parser import parse_detail_page
+from db.repository import (insert_bookings_base_bulk, update_booking_secondary_ids_bulk, save_booking_details_bulk, update_booking_statuses_bulk,
+                           get_scraped_mjr_ids, get_mja_to_mjr_map, get_booking_states_for_mjas)
+from state.models import BookingProcessingStatus
 from logger import get_logger
-import time
+from typing import Any, Dict, List, Set, Tuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+import sqlite3
+import threading
 
 logger = get_logger(__name__)
 
+NAVIGATION_TIMEOUT = 10 # Max wait for the next page after a click/back; returns as soon as it shows
+SCROLL_SETTLE_TIMEOUT = 3 # Max wait for the list content to change after a scroll
+ANDROID_KEYCODE_BACK = 4
+COMMIT_EVERY_PROCESSED = 50 # Detail saves are handed to the writer at least this often (and at the end of every list page)
+
 class BookingService:
+    """
+    Legacy single-loop crawler (List -> Secondary -> Detail per card). Superseded by CrawlerService.
+    The connection comes from init_db, which already applies CONNECTION_PRAGMAS (WAL, synchronous=NORMAL,
+    temp_store=MEMORY, cache/mmap sizing, busy_timeout=5000).
+    Writes for one list page are queued in memory and handed to a single background writer thread by _flush_writes, which applies
+    them in one BEGIN IMMEDIATE transaction while the driver thread moves on to the next page.
+    Implicit waits stay at the driver default of 0: every wait is explicit (self.wait / page-object WebDriverWaits),
+    so a find_element miss never stacks an implicit timeout on top of an explicit one.
+    """
     def __init__(self, test_mode=False):
-        self.conn = init_db(DB_PATH, test_mode=test_mode)
+        self.conn = init_db(DB_PATH, test_mode=test_mode) # PRAGMAs applied inside init_db, test_mode included
         self.driver = None
         self.list_page = None
         self.secondary_page = None
         self.detail_page = None
-        self.processed_mjr_ids_this_run = set() # Track MJR IDs processed in this run
+        self.wait: Optional[WebDriverWait] = None # Created with the driver
+        self.processed_mjr_ids_this_run = get_scraped_mjr_ids(self.conn) # Seeded with MJRs scraped in earlier runs, grows as this run scrapes
+        logger.info(f"Loaded {len(self.processed_mjr_ids_this_run)} already-scraped MJR IDs.")
+        self.mja_to_mjr: Dict[str, str] = get_mja_to_mjr_map(self.conn) # Lets a card be skipped without clicking it to read its MJR
+        self._seen_mja_ids: Set[str] = set() # MJA cards already ingested this run; overlap between scrolled views is dropped up front
+        self._pending_status_updates: List[Tuple[str, str, Optional[str]]] = [] # (booking_id, status, reason), flushed per list page
+        self._pending_secondary_updates: List[Tuple[str, Optional[str], Optional[str], Optional[int], Optional[str]]] = [] # Secondary-page IDs/hints per MJA
+        self._pending_base_rows: List[Dict[str, Any]] = [] # List cards to upsert
+        self._pending_detail_saves: List[Dict[str, Any]] = [] # Parsed detail records
+        self._db_lock = threading.Lock() # self.conn is shared by the writer thread and the driver thread's reads
+        self._db_writer: Optional[ThreadPoolExecutor] = None # Single worker, created on the first flush
+        self._pending_flush: Optional[Future] = None
 
     def start_driver(self):
         logger.info("Starting Appium driver...")
         try:
             capabilities_options = UiAutomator2Options().load_capabilities(GENERAL_CAPABILITIES)
             self.driver = webdriver.Remote(command_executor=APPIUM_SERVER_URL, options=capabilities_options)
-            self.driver.implicitly_wait = 5 # Adjust as needed
             self.list_page = ListPage(self.driver)
             self.secondary_page = SecondaryPage(self.driver)
             self.detail_page = DetailPage(self.driver)
+            self.wait = WebDriverWait(self.driver, NAVIGATION_TIMEOUT, poll_frequency=0.25)
+            # This service owns the session, so the settings are applied once for its lifetime rather than per block
+            try: self.driver.update_settings({**COMPACT_SOURCE_SETTINGS, **FAST_IDLE_SETTINGS})
+            except WebDriverException as e: logger.warning(f"Could not apply UiAutomator2 settings, using server defaults: {e}")
             logger.info("Appium driver started and page objects initialized.")
             return True
         except Exception as e:
@@ -62,6 +99,81 @@ class BookingService:
             # Add more specific navigation logic if needed (e.g., clicking tabs)
             return False # Or attempt navigation
 
+    def _wait_for_page(self, locator, page_name: str) -> bool:
+        """Polls for a page's sentinel element instead of sleeping; True as soon as it is present."""
+        try: self.wait.until(EC.presence_of_element_located(locator)); return True
+        except TimeoutException:
+            logger.warning(f"{page_name} page not shown within {NAVIGATION_TIMEOUT}s."); return False
+
+    def _back(self, locator, page_name: str) -> bool:
+        """Presses the Android BACK key directly (no W3C back command) and waits for the previous page's sentinel element."""
+        try: self.driver.press_keycode(ANDROID_KEYCODE_BACK)
+        except WebDriverException as e:
+            logger.warning(f"press_keycode(BACK) failed, falling back to driver.back(): {e}"); self.driver.back()
+        return self._wait_for_page(locator, page_name)
+
+    def _scroll_list(self, last_element_booking_id: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Scrolls the list and returns once its content changed (or SCROLL_SETTLE_TIMEOUT passed), as (moved, settled_source).
+        moved is False only when the list container is known to be unchanged; settled_source can go straight to get_cards.
+        """
+        previous_hash = self.list_page.last_page_source_hash
+        self.list_page.scroll(last_element_booking_id=last_element_booking_id)
+        if previous_hash is None: return True, None # Nothing to compare against, get_cards fetches the source itself
+        settled_source = self.list_page.wait_for_source_change(previous_hash, SCROLL_SETTLE_TIMEOUT)
+        return settled_source is not None, settled_source
+
+    def _click_card(self, mja_id: str) -> bool:
+        """Clicks a list card via a native UiSelector (no XPath tree walk); False if it isn't on screen or the click fails."""
+        cards = self.driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, ListPage.CARD_BY_ID_UIAUTOMATOR_TEMPLATE.format(booking_id=mja_id))
+        if not cards: return False
+        try: cards[0].click(); return True
+        except WebDriverException as e:
+            logger.error(f"Click on card {mja_id} failed: {e}"); return False
+
+    def _queue_status(self, booking_id: str, status: str, reason: Optional[str] = None):
+        self._pending_status_updates.append((booking_id, status, reason))
+
+    def _has_pending_writes(self) -> bool:
+        return bool(self._pending_base_rows or self._pending_secondary_updates or self._pending_detail_saves or self._pending_status_updates)
+
+    def _flush_writes(self):
+        """Hands everything queued so far to the writer thread as one batch and returns immediately; batches run in submission order."""
+        if not self._has_pending_writes(): return
+        batch = (self._pending_base_rows, self._pending_secondary_updates, self._pending_detail_saves, self._pending_status_updates)
+        self._pending_base_rows, self._pending_secondary_updates, self._pending_detail_saves, self._pending_status_updates = [], [], [], []
+        if self._db_writer is None:
+            self._db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="booking_db")
+        self._pending_flush = self._db_writer.submit(self._write_batch, *batch)
+
+    def _write_batch(self, base_rows, secondary, detail_saves, status_updates):
+        """Runs on the writer thread: applies one batch (base rows, details, secondary IDs, statuses) in a single BEGIN IMMEDIATE transaction."""
+        with self._db_lock:
+            try:
+                if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE") # Take the write lock up front, no deferred-to-write upgrade
+                insert_bookings_base_bulk(self.conn, base_rows, commit=False)
+                save_booking_details_bulk(self.conn, detail_saves, commit=False)
+                update_booking_secondary_ids_bulk(self.conn, secondary, commit=False) # After the detail upsert so the MJB/hints aren't overwritten
+                update_booking_statuses_bulk(self.conn, status_updates, commit=False)
+                self.conn.commit()
+            except Exception as e: # Nothing waits on the future's result, so any error has to be logged and the transaction closed here
+                logger.exception(f"Failed to commit {len(base_rows)} base rows, {len(secondary)} secondary ID updates, "
+                                 f"{len(detail_saves)} detail saves and {len(status_updates)} status updates: {e}")
+                try: self.conn.rollback()
+                except sqlite3.Error as rb_e: logger.error(f"Rollback failed after batch write error: {rb_e}")
+
+    def _wait_for_writes(self):
+        """Blocks until every submitted batch has been applied."""
+        if self._db_writer is not None:
+            self._db_writer.shutdown(wait=True)
+            self._db_writer = None
+        self._pending_flush = None
+
+    def _save_details(self, parsed_details: Dict[str, Any]):
+        """Queues a parsed detail record; hands the queue to the writer every COMMIT_EVERY_PROCESSED saves to bound data loss."""
+        self._pending_detail_saves.append(parsed_details)
+        if len(self._pending_detail_saves) >= COMMIT_EVERY_PROCESSED: self._flush_writes()
+
     def process_all_bookings(self, max_bookings_to_process=None):
         if not self.driver:
             logger.error("Driver not started. Cannot process bookings.")
@@ -74,14 +186,26 @@ class BookingService:
         processed_count = 0
         scroll_attempts_without_new = 0
         max_scrolls_no_new = 3 # Stop scrolling if no new bookings are found after this many scrolls
+        list_moved, next_page_source = True, None # Result of the last scroll
+        last_processed_mja_for_scroll = None
 
         while True:
             if max_bookings_to_process is not None and processed_count >= max_bookings_to_process:
                 logger.info(f"Reached processing limit of {max_bookings_to_process} bookings.")
                 break
 
+            if not list_moved: # Same container hash as before the scroll: the cards on screen are the ones already handled
+                scroll_attempts_without_new += 1
+                logger.info(f"List did not move after scrolling. Scroll attempts without new: {scroll_attempts_without_new}")
+                if scroll_attempts_without_new >= max_scrolls_no_new:
+                    logger.info(f"Reached max scroll attempts ({max_scrolls_no_new}) without new cards. Ending list processing.")
+                    break
+                list_moved, next_page_source = self._scroll_list(last_element_booking_id=last_processed_mja_for_scroll) # No fetch/extract in between
+                continue
+
             logger.info("Fetching cards from list page...")
-            current_cards_data = self.list_page.get_cards()
+            current_cards_data, _ = self.list_page.get_cards(page_source=next_page_source) # Reuses the snapshot the scroll settled on
+            next_page_source = None
 
             if not current_cards_data and scroll_attempts_without_new == 0: # No cards on first load
                 logger.warning("No booking cards found on the list page initially.")
@@ -94,50 +218,42 @@ class BookingService:
                       break
                  # Scroll and continue
                  logger.info("Attempting to scroll down for more bookings...")
-                 self.list_page.scroll() # Use the last known element ID if available
-                 time.sleep(2) # Wait for new cards to load
+                 list_moved, next_page_source = self._scroll_list() # Use the last known element ID if available
                  continue
 
 
             new_card_found_this_iteration = False
-            last_processed_mja_for_scroll = None
-
-            for card_data in current_cards_data:
+            last_processed_mja_for_scroll = next((c['booking_id'] for c in reversed(current_cards_data) if c.get('booking_id')), None) # Bottom card anchors the scroll
+            unseen_cards = [c for c in current_cards_data if c.get('booking_id') not in self._seen_mja_ids]
+            if len(unseen_cards) < len(current_cards_data):
+                logger.debug(f"{len(current_cards_data) - len(unseen_cards)} card(s) already ingested from the previous view, {len(unseen_cards)} new.")
+            self._seen_mja_ids.update(c['booking_id'] for c in unseen_cards if c.get('booking_id'))
+            self._pending_base_rows.extend(c for c in unseen_cards if c.get('booking_id')) # Written with the page's flush
+            with self._db_lock: db_states = get_booking_states_for_mjas(self.conn, [c.get('booking_id') for c in unseen_cards]) # One query per list page
+
+            for card_data in unseen_cards:
                 mja_id = card_data.get('booking_id')
                 if not mja_id:
                     logger.warning(f"Skipping card with no booking_id: {card_data}")
                     continue
-                
-                last_processed_mja_for_scroll = mja_id # Keep track for scrolling
-
-                # Check if this MJA's MJR has already been fully processed in this run
-                # This requires linking MJA to MJR earlier or checking status
-                # For now, let's assume we process each MJA path once through secondary
-                # This is a simplified check; more robust logic needed if resuming.
-                # We will rely on the database to know if already scraped.
-
-                insert_booking_base(self.conn, card_data) # Insert or ignore base data
-
-                # Check DB if this MJA is already fully scraped
-                # This is a simplified check, a proper status check would be better
-                # cursor = self.conn.cursor()
-                # cursor.execute("SELECT status FROM bookings WHERE booking_id = ?", (mja_id,))
-                # row = cursor.fetchone()
-                # if row and row[0] == 'scraped':
-                #     logger.debug(f"Booking MJA {mja_id} already marked as scraped. Skipping detailed processing.")
-                #     continue
 
+                # Skip the whole Secondary/Detail round-trip if the DB already has this MJA (or its MJR) scraped
+                db_mjr_id, known_status = db_states.get(mja_id, (None, None))
+                known_mjr_id = self.mja_to_mjr.get(mja_id) or db_mjr_id
+                if known_status == BookingProcessingStatus.SCRAPED.value or (known_mjr_id and known_mjr_id in self.processed_mjr_ids_this_run):
+                    logger.debug(f"Booking MJA {mja_id} (MJR {known_mjr_id}) already scraped. Skipping click.")
+                    continue
 
                 logger.info(f"Processing MJA card: {mja_id}")
                 new_card_found_this_iteration = True
                 scroll_attempts_without_new = 0 # Reset on finding a processable card
 
                 # Click on the MJA card
-                if self.list_page.click_element(AppiumBy.XPATH, f'//android.view.ViewGroup[starts-with(@content-desc, "{mja_id}")]'):
-                    time.sleep(1.5) # Wait for secondary page to load
+                if self._click_card(mja_id):
+                    secondary_shown = self._wait_for_page(SecondaryPage.TITLE_LOCATOR, "Secondary") # Wait for secondary page to load
 
                     # --- Secondary Page Processing ---
-                    if self.secondary_page.is_displayed():
+                    if secondary_shown: # The wait already located the title; no second is_displayed lookup
                         sec_page_info = self.secondary_page.get_info()
                         if sec_page_info and sec_page_info.get('mjr_id_raw'):
                             mjr_id = sec_page_info['mjr_id_raw']
@@ -146,44 +262,33 @@ class BookingService:
                             type_h = sec_page_info.get('type_hint_raw')
 
                             logger.info(f"Secondary page: MJB={mjb_id}, MJR={mjr_id}, ApptCount={appt_count}, Type={type_h}")
-                            update_booking_secondary_ids(self.conn, mja_id, mjb_id, mjr_id, appt_count, type_h)
+                            self._pending_secondary_updates.append((mja_id, mjb_id, mjr_id, appt_count, type_h)) # Written with the page's flush
+                            self.mja_to_mjr[mja_id] = mjr_id
 
                             if mjr_id in self.processed_mjr_ids_this_run:
                                 logger.info(f"MJR {mjr_id} (from MJA {mja_id}) already processed in this run. Navigating back.")
-                                self.driver.back() # Back to list
-                                time.sleep(1)
+                                self._back(ListPage.CARD_CONTAINER_LOCATOR, "List")
                                 continue # Next MJA card
 
                             if self.secondary_page.click_mjr_link(mjr_id):
-                                time.sleep(2) # Wait for detail page to load
+                                detail_shown = self._wait_for_page(DetailPage.TITLE_LOCATOR, "Detail") # Wait for detail page to load
 
                                 # --- Detail Page Processing ---
-                                if self.detail_page.is_displayed():
+                                if detail_shown:
                                     detail_page_source = self.driver.page_source # Get initial source
-                                    is_multiday = check_if_multiday_from_xml(detail_page_source)
+                                    is_multiday, parsed_details = parse_detail_page(detail_page_source) # One pass: multiday flag + full parse
                                     logger.info(f"Detail page for MJR {mjr_id} is_multiday: {is_multiday}")
 
-                                    final_xml_to_parse = detail_page_source
-                                    if is_multiday:
-                                        logger.info("Multiday booking detected, attempting to scroll to disclaimer...")
-                                        # Scroll logic for multiday (simplified here)
-                                        for _scroll_attempt in range(3): # Max 3 scrolls
-                                            if self.detail_page.is_element_displayed(AppiumBy.ANDROID_UIAUTOMATOR, 'new UiSelector().textContains("By accepting this assignment")', timeout=1):
-                                                logger.info("Disclaimer found on multiday page.")
-                                                final_xml_to_parse = self.driver.page_source # Get source after scroll
-                                                break
-                                            logger.debug("Scrolling multiday detail page...")
-                                            # Simplified scroll, use a more robust one if needed
-                                            self.driver.swipe(500, 1500, 500, 500, 800)
-                                            time.sleep(1)
-                                        else:
-                                            logger.warning("Disclaimer not found after scrolls on multiday page. Using current source.")
-                                            final_xml_to_parse = self.driver.page_source
-
+                                    if is_multiday and DetailPage.DISCLAIMER_TEXT not in detail_page_source: # Already on screen: nothing to scroll
+                                        logger.info("Multiday booking detected, scrolling disclaimer into view...")
+                                        try:
+                                            self.driver.find_element(*DetailPage.DISCLAIMER_SCROLL_INTO_VIEW_LOCATOR) # Scrolls on-device, no per-swipe round-trips
+                                            logger.info("Disclaimer found on multiday page.")
+                                        except WebDriverException as e:
+                                            logger.warning(f"Disclaimer not found on multiday page ({type(e).__name__}). Using current source.")
+                                        is_multiday, parsed_details = parse_detail_page(self.driver.page_source) # The view moved either way
 
-                                    raw_details = extract_raw_details_from_xml_text(final_xml_to_parse) # Old parser
-                                    if raw_details:
-                                        parsed_details = parse_detail_data(raw_details) # Old parser
+                                    if parsed_details:
                                         parsed_details['mjr_id'] = mjr_id # Ensure MJR ID is linked
                                         parsed_details['mja_id'] = mja_id # Link the original MJA
                                         
@@ -199,43 +304,45 @@ class BookingService:
                                             # This old service does not have the logic to iterate MJA blocks from detail page.
                                             # It would typically only save against the current MJA_ID.
                                             logger.warning("Old BookingService: Multiday saving is simplified and may not be complete.")
-                                            save_booking_details(self.conn, parsed_details)
+                                            self._save_details(parsed_details)
                                         else:
                                             logger.info(f"Saving SINGLE DAY booking details for MJA {mja_id} (MJR {mjr_id})")
-                                            save_booking_details(self.conn, parsed_details)
+                                            self._save_details(parsed_details)
                                         
                                         self.processed_mjr_ids_this_run.add(mjr_id) # Mark MJR as processed for this run
                                         processed_count += 1
                                     else:
                                         logger.error(f"Failed to extract raw details for MJR {mjr_id}.")
-                                        update_booking_status(self.conn, mja_id, "error_detail_extract")
+                                        self._queue_status(mja_id, "error_detail_extract")
 
                                 else: # Not on detail page
                                     logger.error(f"Failed to reach detail page for MJR {mjr_id}.")
-                                    update_booking_status(self.conn, mja_id, "error_nav_detail")
+                                    self._queue_status(mja_id, "error_nav_detail")
                                 # Navigate back from Detail page
                                 logger.debug("Navigating back from Detail to Secondary...")
-                                self.driver.back(); time.sleep(1)
+                                self._back(SecondaryPage.TITLE_LOCATOR, "Secondary")
                             else: # Failed to click MJR link
                                 logger.error(f"Failed to click MJR link for MJA {mja_id}.")
-                                update_booking_status(self.conn, mja_id, "error_click_mjr")
+                                self._queue_status(mja_id, "error_click_mjr")
                         else: # Failed to get secondary page info
                             logger.error(f"Failed to get info from secondary page for MJA {mja_id}.")
-                            update_booking_status(self.conn, mja_id, "error_secondary_info")
+                            self._queue_status(mja_id, "error_secondary_info")
                         # Navigate back from Secondary page
                         logger.debug("Navigating back from Secondary to List...")
-                        self.driver.back(); time.sleep(1)
+                        self._back(ListPage.CARD_CONTAINER_LOCATOR, "List")
                     else: # Not on secondary page
                         logger.error(f"Not on secondary page after clicking MJA {mja_id}.")
-                        update_booking_status(self.conn, mja_id, "error_nav_secondary")
+                        self._queue_status(mja_id, "error_nav_secondary")
                         # May need more robust back navigation here
                 else: # Failed to click MJA card
                     logger.error(f"Failed to click MJA card {mja_id}.")
-                    update_booking_status(self.conn, mja_id, "error_click_mja")
+                    self._queue_status(mja_id, "error_click_mja")
                 
                 if max_bookings_to_process is not None and processed_count >= max_bookings_to_process:
                     break # Exit inner loop if limit reached
 
+            self._flush_writes() # One batch per list page, committed on the writer thread while the list scrolls
+
             if not new_card_found_this_iteration and current_cards_data: # Scrolled but no new cards to process
                 scroll_attempts_without_new += 1
                 logger.info(f"No new cards found in this view. Scroll attempts without new: {scroll_attempts_without_new}")
@@ -248,16 +355,19 @@ class BookingService:
                 logger.info("Scrolling list page for more bookings...")
                 # Use the booking_id of the last card seen on this iteration as a potential scroll anchor
                 # This part of list_page.scroll might need refinement.
-                self.list_page.scroll(last_element_booking_id=last_processed_mja_for_scroll)
-                time.sleep(3) # Wait for scroll and new items to load
+                list_moved, next_page_source = self._scroll_list(last_element_booking_id=last_processed_mja_for_scroll) # Waits for new items to load
             else: # No cards at all, implies end or an error.
                 logger.info("No cards found, breaking list processing loop.")
                 break
 
+        self._flush_writes() # Anything queued before an early break
+        self._wait_for_writes()
         logger.info(f"Finished processing bookings. Total processed in this run: {processed_count}")
 
 
     def cleanup(self):
         if self.conn:
+            self._flush_writes()
+            self._wait_for_writes() # The writer thread still uses the connection
             close_db(self.conn)
         self.stop_driver()
\ No newline at end of file
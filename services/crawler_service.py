@@ -1,7 +1,7 @@
 # filename: services/crawler_service.py
 import os
-import time
 import base64
+import struct
 import subprocess
 from appium import webdriver
 from appium.options.common import AppiumOptions # Ensure AppiumOptions is imported
@@ -9,10 +9,12 @@ from appium.webdriver.common.appiumby import AppiumBy
 from selenium.common.exceptions import WebDriverException, TimeoutException
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from typing import Optional, Dict, List, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, List, Any, Tuple
 
 from config import APPIUM_SERVER_URL, GENERAL_CAPABILITIES, DB_PATH, DUMP_XML_MODE, XML_DUMP_ROOT_DIR
 from db.connection import init_db, close_db
+from db.pool import ConnectionPool
 from pages.list_page import ListPage
 from pages.secondary_page import SecondaryPage
 from pages.detail_page import DetailPage
@@ -22,11 +24,14 @@ from processors.detail_processor import DetailProcessor
 from state.manager import StateManager
 from state.models import ScrapeState
 from utils.display_manager import DisplayManager
-from utils.xml_dumper import initialize_dumper
+from utils.xml_dumper import initialize_dumper, shutdown_dumper
 from logger import get_logger
 
 logger = get_logger(__name__)
 
+TERMINAL_STATE_MASK = (1 << ScrapeState.FINISHED) | (1 << ScrapeState.ERROR) # Run loop exits once (1 << state) hits this
+IDLE_PASS_WAIT_SECONDS = 0.5 # Back-off after a loop pass in which no processor updated the state
+
 class CrawlerService:
     """
     Main service to orchestrate the booking scraping process.
@@ -36,15 +41,18 @@ class CrawlerService:
         logger.info("Initializing Crawler Service...")
         self.conn = init_db(db_path, test_mode=test_mode)
         logger.info(f"Database initialized{' in test mode (reset)' if test_mode else ''}.")
+        self.pool = ConnectionPool(self.conn) # Serialized writer + per-thread read-only connections
 
         self.driver: Optional[webdriver.Remote] = None
+        self._screenshot_executor: Optional[ThreadPoolExecutor] = None # Single worker, created on the first submitted screenshot
+        self._pending_screenshot: Optional[Future] = None
         try:
             logger.info("Attempting to start Appium session with pre-configured AppiumOptions...")
             self.driver = webdriver.Remote(
                 command_executor=APPIUM_SERVER_URL,
                 options=GENERAL_CAPABILITIES # Pass the AppiumOptions object directly
             )
-            self.driver.implicitly_wait = 1 # Small implicit wait
+            self.driver.implicitly_wait(0) # Misses fail fast; pages and processors await their own locators with WebDriverWait
             logger.info("Appium session started.")
         except WebDriverException as e:
             logger.exception(f"Failed to start Appium session: {e}")
@@ -79,38 +87,76 @@ class CrawlerService:
         self.state_manager.load_or_create_session()
         logger.info(f"State manager initialized. Session: {self.state_manager.session_id}, Current state: {self.state_manager.current_state.name}")
 
-        self.processors = {
-            ScrapeState.LIST: ListProcessor(self.driver, self.conn, self.list_page, self.state_manager, self.target_display_id_str, self),
-            ScrapeState.SECONDARY: SecondaryProcessor(self.driver, self.conn, self.secondary_page, self.state_manager, self.target_display_id_str, self),
-            ScrapeState.DETAIL: DetailProcessor(self.driver, self.conn, self.detail_page, self.state_manager, self.target_display_id_str, self)
-        }
+        processors: List[Optional[Any]] = [None] * (max(ScrapeState) + 1) # Indexed by ScrapeState value; None = no processor
+        processors[ScrapeState.LIST] = ListProcessor(self.driver, self.conn, self.list_page, self.state_manager, self.target_display_id_str, self, pool=self.pool)
+        processors[ScrapeState.SECONDARY] = SecondaryProcessor(self.driver, self.conn, self.secondary_page, self.state_manager, self.target_display_id_str, self, pool=self.pool)
+        processors[ScrapeState.DETAIL] = DetailProcessor(self.driver, self.conn, self.detail_page, self.state_manager, self.target_display_id_str, self, pool=self.pool)
+        self.processors: Tuple[Optional[Any], ...] = tuple(processors)
         logger.info("Processors initialized.")
         logger.info("Crawler Service initialized successfully.")
 
+    def submit_screenshot_on_display(self, display_id_to_capture_str: str, filepath: str) -> Optional[Future]:
+        """
+        Runs take_screenshot_on_display on a background thread so the adb screencap/pull stays off the scraping path.
+        At most one screenshot is in flight; a request arriving while one is still running is skipped.
+        """
+        if self._pending_screenshot is not None and not self._pending_screenshot.done():
+            logger.debug(f"Previous screenshot still in progress; skipping {filepath}.")
+            return None
+        if self._screenshot_executor is None:
+            self._screenshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot")
+        self._pending_screenshot = self._screenshot_executor.submit(self.take_screenshot_on_display, display_id_to_capture_str, filepath)
+        return self._pending_screenshot
+
     def take_screenshot_on_display(self, display_id_to_capture_str: str, filepath: str) -> bool:
+        """
+        Streams `adb exec-out screencap -p` straight into filepath: no file on the device, no base64 pull, no rm.
+        Falls back to the screencap-to-sdcard + pull_file path if exec-out fails (some vendors reject -d there).
+        """
         if not self.driver: logger.error("Driver not available for screenshot."); return False
         if not self.display_manager: logger.error("DisplayManager not available for screenshot."); return False
         
         if not display_id_to_capture_str:
             display_id_to_capture_str = self.target_display_id_str if self.target_display_id_str else "0"
-        
+
+        command_parts = ["exec-out", "screencap", "-p"] + (["-d", display_id_to_capture_str] if display_id_to_capture_str != "0" else [])
+        success, error_output = self.display_manager.execute_adb_command_to_file(command_parts, filepath)
+        if success:
+            logger.info(f"Successfully saved screenshot for display {display_id_to_capture_str} to {filepath}")
+            return True
+        logger.warning(f"exec-out screencap failed for display {display_id_to_capture_str} ({error_output}); falling back to device file + pull.")
+        return self._take_screenshot_via_device_file(display_id_to_capture_str, filepath)
+
+    def take_raw_screenshot_on_display(self, display_id_to_capture_str: Optional[str] = None) -> Optional[Tuple[int, int, bytes]]:
+        """
+        `adb exec-out screencap` without -p: the device skips PNG encoding, the caller skips decoding.
+        Returns (width, height, pixels) with pixels as width*height*4 RGBA bytes (e.g. for numpy.frombuffer(...).reshape(h, w, 4)),
+        or None on failure. The header is 12 bytes (w, h, format) on older Android and 16 (+ colour space) on newer; its size
+        is derived from the payload length.
+        """
+        if not self.display_manager: logger.error("DisplayManager not available for screenshot."); return None
+        display_id = display_id_to_capture_str or self.target_display_id_str or "0"
+        command_parts = ["exec-out", "screencap"] + (["-d", display_id] if display_id != "0" else [])
+        success, data = self.display_manager.execute_adb_command_bytes(command_parts)
+        if not success or len(data) < 12: logger.error(f"Raw screencap failed for display {display_id}."); return None
+        width, height, _pixel_format = struct.unpack_from("<3I", data)
+        header_size = len(data) - width * height * 4
+        if header_size not in (12, 16):
+            logger.error(f"Unexpected raw screencap size for display {display_id}: {len(data)} bytes for {width}x{height}."); return None
+        return width, height, data[header_size:]
+
+    def _take_screenshot_via_device_file(self, display_id_to_capture_str: str, filepath: str) -> bool:
+        """Legacy path: screencap to /sdcard, pull_file over Appium (base64), then rm the temporary file."""
         temp_device_path = f"/sdcard/appium_temp_screenshot_{display_id_to_capture_str}.png"
         logger.debug(f"Attempting screenshot for display {display_id_to_capture_str} to {filepath} (via {temp_device_path})")
 
         try:
-            if not hasattr(self, 'display_manager') or self.display_manager is None:
-                 logger.error("DisplayManager not available for taking screenshot."); return False
-
             capture_command_parts = ["shell", "screencap", "-d", display_id_to_capture_str, "-p", temp_device_path]
             success_capture, out_err_capture = self.display_manager.execute_adb_command_raw(capture_command_parts)
-            if not success_capture:
-                logger.error(f"ADB screencap command failed for display {display_id_to_capture_str}. Output/Error: {out_err_capture}")
-                # Do not return False immediately if adb is known to be unstable for this, allow pull attempt
-                # return False
-            logger.debug(f"Executed: adb {' '.join(capture_command_parts)}")
-
-            # Proceed to pull even if capture command result was uncertain due to "Killed" messages.
-            # The file might still exist.
+            # A failed screencap can still have written the file (adb reports "Killed" on flaky devices), so the pull is tried either way
+            if not success_capture: logger.warning(f"ADB screencap failed for display {display_id_to_capture_str} ({out_err_capture}); trying the pull anyway.")
+            else: logger.debug(f"Executed: adb {' '.join(capture_command_parts)}")
+
             try:
                 b64_data = self.driver.pull_file(temp_device_path)
                 logger.debug(f"Pulling file from device: {temp_device_path}")
@@ -127,11 +173,7 @@ class CrawlerService:
                 logger.info(f"Successfully saved screenshot for display {display_id_to_capture_str} to {filepath}")
                 return True
             except Exception as pull_e: # Catch errors during pull_file or decode
-                logger.error(f"Error during screenshot pull/decode for display {display_id_to_capture_str}: {pull_e}")
-                if not success_capture: # If capture also failed, it's a definite fail
-                    logger.error("Screenshot capture and pull both failed.")
-                    return False
-                # If capture might have succeeded but pull failed, it's tricky. For now, report as fail.
+                logger.error(f"Error during screenshot pull/decode for display {display_id_to_capture_str}{'' if success_capture else ' (screencap had failed too)'}: {pull_e}")
                 return False
                 
         except Exception as e:
@@ -145,8 +187,9 @@ class CrawlerService:
         is_processing_fresh_list_view = True # Initialize to True
 
         try:
-            while self.state_manager.current_state not in [ScrapeState.FINISHED, ScrapeState.ERROR]:
+            while not (1 << self.state_manager.current_state) & TERMINAL_STATE_MASK:
                 current_state_enum = self.state_manager.current_state
+                self.state_manager.state_changed.clear()
                 
                 logger.info(f"--- Executing State: {current_state_enum.name} (Fresh List View Flag for LIST state: {is_processing_fresh_list_view if current_state_enum == ScrapeState.LIST else 'N/A'}) ---")
 
@@ -161,8 +204,8 @@ class CrawlerService:
                             continue
                         else:
                             logger.warning("Not on list page initially, trying one back navigation.")
-                            self.driver.back(); time.sleep(2) # Allow time for navigation
-                            if self.list_page.is_displayed(timeout=5):
+                            self.driver.back()
+                            if self.list_page.is_displayed(timeout=5, poll_frequency=0.1): # Returns as soon as the list container appears
                                 self.state_manager.update_state(ScrapeState.LIST)
                                 logger.info("Successfully navigated to list page after one back().")
                                 consecutive_error_count = 0
@@ -175,7 +218,7 @@ class CrawlerService:
                         logger.exception(f"Error during initial navigation: {nav_e}")
                         self.state_manager.update_state(ScrapeState.ERROR, error_message=f"Initial navigation error: {nav_e}")
                 
-                processor = self.processors.get(current_state_enum)
+                processor = self.processors[current_state_enum]
                 if processor:
                     try:
                         previous_state_before_process_call = self.state_manager.current_state # Capture state before processor might change it
@@ -214,20 +257,36 @@ class CrawlerService:
                 if consecutive_error_count >= max_consecutive_errors:
                      logger.error(f"Reached maximum consecutive errors ({max_consecutive_errors}). Stopping crawler.")
                      self.state_manager.update_state(ScrapeState.ERROR, error_message="Max consecutive errors reached"); break
-                if self.state_manager.current_state != ScrapeState.ERROR: time.sleep(0.5)
+                self.state_manager.flush() # One session-row write per loop iteration, however many transitions happened
+                if self.state_manager.current_state != ScrapeState.ERROR and not self.state_manager.state_changed.is_set():
+                    self.state_manager.state_changed.wait(IDLE_PASS_WAIT_SECONDS) # No progress this pass; a state update ends the wait early
         except Exception as e:
             logger.exception(f"Unexpected error during run loop: {e}")
             self.state_manager.update_state(ScrapeState.ERROR, error_message=f"Unhandled crawler error: {e}")
         finally:
             logger.info(f"Crawler run loop finished. Final state: {self.state_manager.current_state.name}")
-            self.cleanup()
+            self.cleanup() # Flushes the session row, e.g. after a break out of the loop
+
+    def _quit_driver(self, driver: webdriver.Remote):
+        try: driver.quit(); logger.info("Appium session closed.")
+        except Exception as e: logger.error(f"Error closing Appium session: {e}")
 
     def cleanup(self):
+        """Releases the driver, adb shell, XML writer and database. Safe to call more than once; later calls do nothing."""
+        if getattr(self, '_cleaned_up', False): return
+        self._cleaned_up = True
         logger.info("Cleaning up crawler resources...")
-        if self.driver:
-            try: self.driver.quit(); logger.info("Appium session closed.")
-            except Exception as e: logger.error(f"Error closing Appium session: {e}")
-            self.driver = None
-        if self.conn:
-            close_db(self.conn)
+        if getattr(self, '_screenshot_executor', None):
+            self._screenshot_executor.shutdown(wait=True) # Pending screenshot still needs the driver for pull_file
+            self._screenshot_executor = None
+        driver, self.driver = self.driver, None
+        # driver.quit() is an Appium round-trip (UiAutomator2 teardown); the local shutdown below doesn't depend on it
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="driver-quit") as quit_executor:
+            if driver: quit_executor.submit(self._quit_driver, driver)
+            if getattr(self, 'display_manager', None): self.display_manager.close() # Persistent adb shell
+            shutdown_dumper(wait=True) # Flush queued XML dumps before exiting
+            if getattr(self, 'state_manager', None): self.state_manager.flush() # Counters bumped in memory since the last loop boundary
+            if getattr(self, 'pool', None): self.pool.close() # Read-only connections first, then the writer
+            conn, self.conn = self.conn, None
+            if conn: close_db(conn)
         logger.info("Crawler cleanup finished.")
\ No newline at end of file
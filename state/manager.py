@@ -1,14 +1,45 @@
 # filename: state/manager.py
 import sqlite3
+import threading
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 from logger import get_logger
 from .models import ScrapeState # Relative import
 
 logger = get_logger(__name__)
 
+# Every statement is a fixed string reused on each call, so sqlite3's per-connection statement cache keeps it prepared
+RESUME_SESSION_SELECT_SQL = """
+    SELECT session_id, start_time, last_state, current_booking_id, current_mjr_id,
+           last_processed_booking_id, total_bookings_scraped, total_errors, error_message,
+           (SELECT scrape_attempt FROM bookings WHERE bookings.booking_id = bookings_scrape.current_booking_id) -- PK lookup
+    FROM bookings_scrape
+    WHERE status = 'running' OR status = 'error'
+    ORDER BY CASE status WHEN 'running' THEN 1 WHEN 'error' THEN 2 ELSE 3 END, start_time DESC
+    LIMIT 1
+"""
+RESUME_SESSION_UPDATE_SQL = "UPDATE bookings_scrape SET status = 'running', start_time = ? WHERE session_id = ?"
+CREATE_SESSION_SQL = "INSERT INTO bookings_scrape (start_time, status, last_state) VALUES (?, 'running', ?)"
+UPDATE_SESSION_STATE_SQL = """
+    UPDATE bookings_scrape SET last_state = ?, current_booking_id = ?, current_mjr_id = ?,
+       last_processed_booking_id = ?, error_message = ?, total_errors = ?, total_bookings_scraped = ?, status = ?
+    WHERE session_id = ?
+"""
+_RESUMABLE_STATES = frozenset({ScrapeState.SECONDARY, ScrapeState.DETAIL, ScrapeState.LIST}) # Anything else resumes at NAVIGATING_TO_LIST
+_MID_BOOKING_STATES = frozenset({ScrapeState.DETAIL, ScrapeState.SECONDARY}) # Resuming into these restores the booking's scrape_attempt
+
+FINISH_SESSION_SQL = """
+    UPDATE bookings_scrape SET end_time = ?, status = ?, last_state = ?, current_booking_id = ?, current_mjr_id = ?,
+       last_processed_booking_id = ?, error_message = ?, total_errors = ?, total_bookings_scraped = ?
+    WHERE session_id = ?
+"""
+
 class StateManager:
-    """Manages the state of the scrape session persisted in the database."""
+    """
+    Manages the state of the scrape session persisted in the database.
+    Transitions and counters only change the in-memory fields and mark the session row dirty; flush() writes the row
+    with one UPDATE + commit at loop boundaries. ERROR transitions flush immediately so a crash leaves the error on disk.
+    """
 
     def __init__(self, conn: sqlite3.Connection):
         self.conn = conn
@@ -22,6 +53,10 @@ class StateManager:
         self.total_bookings_scraped_session: int = 0
         self.total_errors_session: int = 0
         self.current_scrape_attempt: int = 0 # Current attempt for a specific booking detail
+        self._session_status: str = 'running'
+        self._last_error_message: Optional[str] = None # Mirrors bookings_scrape.error_message; read from the DB once, at session load
+        self._dirty: Set[str] = set() # bookings_scrape columns changed since the last flush
+        self.state_changed = threading.Event() # Set by every update_state; lets the run loop tell progress from an idle pass
 
     def _execute_query(self, query: str, params: tuple = ()) -> Optional[sqlite3.Cursor]:
         try:
@@ -36,46 +71,33 @@ class StateManager:
 
     def load_or_create_session(self):
         cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT session_id, start_time, last_state, current_booking_id, current_mjr_id,
-                   last_processed_booking_id, total_bookings_scraped, total_errors
-            FROM bookings_scrape
-            WHERE status = 'running' OR status = 'error'
-            ORDER BY CASE status WHEN 'running' THEN 1 WHEN 'error' THEN 2 ELSE 3 END, start_time DESC
-            LIMIT 1
-        """)
+        cursor.execute(RESUME_SESSION_SELECT_SQL)
         row = cursor.fetchone()
 
+        stored_attempt: Optional[int] = None # The resumed booking's scrape_attempt, read in the same SELECT as the session
         if row:
             self.session_id, self.start_time, last_state_str, self.current_booking_id, \
             self.current_mjr_id, self.last_processed_booking_id, \
-            self.total_bookings_scraped_session, self.total_errors_session = row
-            try:
-                self.current_state = ScrapeState[last_state_str] if last_state_str else ScrapeState.NAVIGATING_TO_LIST
-            except KeyError:
+            self.total_bookings_scraped_session, self.total_errors_session, self._last_error_message, stored_attempt = row
+            self.current_state = ScrapeState.__members__.get(last_state_str) if last_state_str else ScrapeState.NAVIGATING_TO_LIST
+            if self.current_state is None:
                 logger.warning(f"Invalid last_state '{last_state_str}' from DB. Defaulting to NAVIGATING_TO_LIST.")
                 self.current_state = ScrapeState.NAVIGATING_TO_LIST
             
-            if self.current_state not in [ScrapeState.SECONDARY, ScrapeState.DETAIL, ScrapeState.LIST]: # Resume list if not mid-booking
+            if self.current_state not in _RESUMABLE_STATES: # Resume list if not mid-booking
                  self.current_state = ScrapeState.NAVIGATING_TO_LIST
             logger.info(f"Resuming session {self.session_id} from state {self.current_state.name}. Last MJA: {self.last_processed_booking_id}, Current MJA: {self.current_booking_id}, MJR: {self.current_mjr_id}")
-            self._execute_query("UPDATE bookings_scrape SET status = 'running', start_time = ? WHERE session_id = ?", (time.strftime("%Y-%m-%d %H:%M:%S"), self.session_id))
+            self._execute_query(RESUME_SESSION_UPDATE_SQL, (time.strftime("%Y-%m-%d %H:%M:%S"), self.session_id))
         else:
             self.start_time = time.strftime("%Y-%m-%d %H:%M:%S")
             self.current_state = ScrapeState.NAVIGATING_TO_LIST
             self.total_bookings_scraped_session = 0; self.total_errors_session = 0
-            insert_cursor = self._execute_query(
-                "INSERT INTO bookings_scrape (start_time, status, last_state) VALUES (?, 'running', ?)",
-                (self.start_time, self.current_state.name)
-            )
+            insert_cursor = self._execute_query(CREATE_SESSION_SQL, (self.start_time, self.current_state.name))
             if insert_cursor: self.session_id = insert_cursor.lastrowid; logger.info(f"Created new scrape session {self.session_id}")
             else: raise Exception("Failed to initialize scrape session in database.")
         
-        if self.current_booking_id and self.current_state in [ScrapeState.DETAIL, ScrapeState.SECONDARY]:
-            cursor.execute("SELECT scrape_attempt FROM bookings WHERE booking_id = ?", (self.current_booking_id,))
-            attempt_row = cursor.fetchone()
-            self.current_scrape_attempt = attempt_row[0] if attempt_row and attempt_row[0] is not None else 0
-        else: self.current_scrape_attempt = 0
+        # From here on the in-memory counter is authoritative (increment_scrape_attempt / update_state)
+        self.current_scrape_attempt = (stored_attempt or 0) if self.current_booking_id and self.current_state in _MID_BOOKING_STATES else 0
 
     def update_state(self, new_state: ScrapeState,
                      current_booking_id: Optional[str] = ..., # Use Ellipsis for "no change"
@@ -96,18 +118,14 @@ class StateManager:
         elif new_state == ScrapeState.DETAIL and self.previous_state == ScrapeState.SECONDARY:
             self.current_scrape_attempt = 0 # Reset for new detail page
 
-        if self.session_id is not None:
-            current_status = 'error' if new_state == ScrapeState.ERROR else 'running'
-            current_error_msg_for_db = error_message if new_state == ScrapeState.ERROR else self.get_current_error_message() # Keep last error if just updating state
-            
-            self._execute_query(
-                """UPDATE bookings_scrape SET last_state = ?, current_booking_id = ?, current_mjr_id = ?,
-                   last_processed_booking_id = ?, error_message = ?, total_errors = ?, status = ?
-                   WHERE session_id = ?""",
-                (self.current_state.name, self.current_booking_id, self.current_mjr_id,
-                 self.last_processed_booking_id, current_error_msg_for_db, self.total_errors_session,
-                 current_status, self.session_id)
-            )
+        self._dirty.update(('last_state', 'current_booking_id', 'current_mjr_id', 'last_processed_booking_id'))
+        self.state_changed.set()
+        if new_state == ScrapeState.ERROR:
+            self._session_status = 'error'; self._last_error_message = error_message
+            self._dirty.update(('status', 'error_message', 'total_errors'))
+            self.flush() # Persist crash state right away
+        elif self._session_status != 'running':
+            self._session_status = 'running'; self._dirty.add('status')
         logger.debug(f"State updated to {self.current_state.name} for session {self.session_id} (MJA: {self.current_booking_id}, MJR: {self.current_mjr_id}, LastProcMJA: {self.last_processed_booking_id})")
 
     def increment_scrape_attempt(self):
@@ -115,26 +133,38 @@ class StateManager:
 
     def record_booking_scraped(self):
         self.total_bookings_scraped_session += 1
-        if self.session_id is not None:
-             self._execute_query("UPDATE bookings_scrape SET total_bookings_scraped = ? WHERE session_id = ?",
-                                (self.total_bookings_scraped_session, self.session_id))
+        self._dirty.add('total_bookings_scraped')
+
+    def flush(self):
+        """Writes the in-memory session row with one UPDATE + commit if anything changed since the last flush; no-op otherwise."""
+        if not self._dirty or self.session_id is None: return
+        # One fixed statement over every mutable column: the row is rewritten either way, and the SQL text stays cacheable
+        if self._execute_query(
+            UPDATE_SESSION_STATE_SQL,
+            (self.current_state.name, self.current_booking_id, self.current_mjr_id,
+             self.last_processed_booking_id, self._last_error_message, self.total_errors_session,
+             self.total_bookings_scraped_session, self._session_status, self.session_id)
+        ) is not None:
+            logger.debug(f"Flushed session {self.session_id} state ({', '.join(sorted(self._dirty))}).")
+            self._dirty.clear()
 
     def finish_session(self, status: str = 'completed', final_error_message: Optional[str] = None):
         self.current_state = ScrapeState.FINISHED if status == 'completed' else ScrapeState.ERROR
-        end_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        final_status = 'error' if self.current_state == ScrapeState.ERROR else status
+        if final_error_message: self._last_error_message = final_error_message
         if self.session_id is not None:
-            final_status = 'error' if self.current_state == ScrapeState.ERROR else status
-            error_msg_to_save = final_error_message if final_error_message else self.get_current_error_message()
-            
-            self._execute_query(
-                "UPDATE bookings_scrape SET end_time = ?, status = ?, last_state = ?, error_message = ? WHERE session_id = ?",
-                (end_time, final_status, self.current_state.name, error_msg_to_save, self.session_id)
-            )
+            end_time = time.strftime("%Y-%m-%d %H:%M:%S")
+            # Writes every column flush() would, so pending dirty fields land in the same UPDATE + commit
+            if self._execute_query(
+                FINISH_SESSION_SQL,
+                (end_time, final_status, self.current_state.name, self.current_booking_id, self.current_mjr_id,
+                 self.last_processed_booking_id, self._last_error_message, self.total_errors_session,
+                 self.total_bookings_scraped_session, self.session_id)
+            ) is not None:
+                self._session_status = final_status; self._dirty.clear()
         logger.info(f"Scrape session {self.session_id} finished with status: {final_status}. Total scraped: {self.total_bookings_scraped_session}, Total errors: {self.total_errors_session}.")
 
     def get_current_error_message(self) -> Optional[str]:
+        """The session's last error message. In-memory: every write to the column goes through this manager."""
         if not self.session_id: return None
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT error_message FROM bookings_scrape WHERE session_id = ?", (self.session_id,))
-        row = cursor.fetchone()
-        return row[0] if row and row[0] else None
\ No newline at end of file
+        return self._last_error_message or None
\ No newline at end of file
@@ -1,7 +1,7 @@
 # filename: state/models.py
-from enum import Enum
+from enum import Enum, IntEnum
 
-class ScrapeState(Enum):
+class ScrapeState(IntEnum):
     """Defines the possible states of the booking scraper."""
     INITIALIZING = 1
     NAVIGATING_TO_LIST = 2
@@ -38,6 +38,9 @@ class BookingCardStatus(Enum):
     VIEWED = "Viewed"
     UNKNOWN = "Unknown" # If a prefix is there but not recognized
 
+# List statuses saved from the card alone, without a detail scrape
+OFFER_OR_VIEWED_CARD_STATUSES = frozenset({BookingCardStatus.NEW_OFFER, BookingCardStatus.VIEWED})
+
 # User-proposed enum for richer context to parsers (not fully integrated yet)
 class BookingDetailContext(Enum):
     """
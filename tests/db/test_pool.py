@@ -0,0 +1,30 @@
+# filename: tests/db/test_pool.py
+import sqlite3
+import pytest
+from db.pool import ConnectionPool
+
+@pytest.fixture
+def pool():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE items (name TEXT)"); conn.commit()
+    yield ConnectionPool(conn)
+    conn.close()
+
+def _names(pool):
+    with pool.read() as read_conn: return [row[0] for row in read_conn.execute("SELECT name FROM items ORDER BY name")]
+
+def test_nested_write_is_rolled_back_with_outer_block(pool):
+    with pytest.raises(RuntimeError):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO items VALUES ('outer')")
+            with pool.write() as inner_conn: inner_conn.execute("INSERT INTO items VALUES ('inner')")
+            raise RuntimeError("outer block fails after the nested write")
+    assert _names(pool) == []
+
+def test_nested_write_commits_with_outer_block(pool):
+    with pool.write() as conn:
+        with pool.write() as inner_conn: inner_conn.execute("INSERT INTO items VALUES ('inner')")
+        assert conn.in_transaction # Not committed by the nested block
+        conn.execute("INSERT INTO items VALUES ('outer')")
+    assert _names(pool) == ['inner', 'outer']
+    assert not pool.writer.in_transaction
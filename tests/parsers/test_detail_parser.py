@@ -9,11 +9,16 @@ from parsers.detail_parser import (
     extract_notes_and_total,
     parse_detail_data,
     check_if_multiday_from_xml,
+    parse_xml_tree,
+    scan_anchors,
+    extract_all,
+    parse_detail_page,
+    classify_text,
     MEETING_LINK_TEXT # Import if used directly in tests
 )
 
 # --- Fixtures (Keep existing sample_xml fixtures) ---
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_xml_single_day_with_distance():
     return """
     <hierarchy>
@@ -45,7 +50,7 @@ def sample_xml_single_day_with_distance():
     </hierarchy>
     """
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_xml_multiday():
     return """
     <hierarchy>
@@ -76,7 +81,7 @@ def sample_xml_multiday():
     </hierarchy>
     """
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_xml_video_remote_no_address():
     return """
     <hierarchy>
@@ -102,33 +107,87 @@ def sample_xml_video_remote_no_address():
     </hierarchy>
     """
 
+# Extraction results shared by the tests below; module-scoped so each fixture XML is scanned once. Tests must not mutate them.
+@pytest.fixture(scope="module")
+def texts_single_day(sample_xml_single_day_with_distance):
+    return _extract_texts_from_xml(sample_xml_single_day_with_distance)
+
+@pytest.fixture(scope="module")
+def texts_multiday(sample_xml_multiday):
+    return _extract_texts_from_xml(sample_xml_multiday)
+
+@pytest.fixture(scope="module")
+def texts_video_remote(sample_xml_video_remote_no_address):
+    return _extract_texts_from_xml(sample_xml_video_remote_no_address)
+
+@pytest.fixture(scope="module")
+def header_single_day(texts_single_day):
+    return extract_header_and_booking_type(texts_single_day)
+
+@pytest.fixture(scope="module")
+def header_multiday(texts_multiday):
+    return extract_header_and_booking_type(texts_multiday)
+
+@pytest.fixture(scope="module")
+def header_video_remote(texts_video_remote):
+    return extract_header_and_booking_type(texts_video_remote)
+
 # --- Tests for Helper Parsing Functions ---
-@pytest.mark.parametrize("raw, expected", [
+# (raw, expected) cases, parametrized once in pytest_generate_tests instead of a decorator per table
+_MONEY_CASES = (
     ("£ 123.45", 123.45), ("£1,234.56", 1234.56), ("£0.50", 0.50),
     ("123.45", None), # Corrected: Expect None if no '£'
-    ("Invalid", None), (None, None), ("£", None), ("£ text", None)
-])
-def test_parse_money(raw, expected):
-    assert parse_money(raw) == expected
-
-@pytest.mark.parametrize("raw, expected", [
+    ("Invalid", None), (None, None), ("£", None), ("£ text", None),
+)
+_UK_DATE_CASES = (
     ("01-12-2023", "01-12-2023"), # Corrected: Expect DD-MM-YYYY
     ("31-01-2024 At some time", "31-01-2024"), # Corrected: Expect DD-MM-YYYY
     ("Invalid", None), (None, None),
     ("1-1-2023", None), # Correctly expects None for invalid format
-    ("2023-12-01", None) # Correctly expects None for invalid format
-])
-def test_parse_uk_date(raw, expected):
-    assert parse_uk_date(raw) == expected
-
-@pytest.mark.parametrize("raw, expected", [
+    ("2023-12-01", None), # Correctly expects None for invalid format
+)
+_TIME_CASES = (
     ("9:30", "09:30:00"), ("14:05", "14:05:00"), ("09:30", "09:30:00"),
     ("9:5", "09:05:00"),
-    ("Invalid", None), (None, None), ("25:00", None), ("10:60", None)
-])
-def test_parse_time(raw, expected):
+    ("Invalid", None), (None, None), ("25:00", None), ("10:60", None),
+)
+_CASES_BY_FIXTURE = {"money_case": _MONEY_CASES, "uk_date_case": _UK_DATE_CASES, "time_case": _TIME_CASES}
+
+def pytest_generate_tests(metafunc):
+    for name, cases in _CASES_BY_FIXTURE.items():
+        if name in metafunc.fixturenames:
+            metafunc.parametrize(name, cases, ids=str)
+
+def test_parse_money(money_case):
+    raw, expected = money_case
+    assert parse_money(raw) == expected
+
+def test_parse_uk_date(uk_date_case):
+    raw, expected = uk_date_case
+    assert parse_uk_date(raw) == expected
+
+def test_parse_time(time_case):
+    raw, expected = time_case
     assert parse_time(raw) == expected
 
+@pytest.mark.parametrize("raw, kind, groups", [
+    ("£ 89.93", "money", {}),
+    ("£1,234.50", "money", {}),
+    ("01-05-2025 At", "date", {"date_value": "01-05-2025"}),
+    ("10:00 - 13:00", "time", {"time_start": "10:00", "time_end": "13:00"}),
+    ("9:30-17:05", "time", {"time_start": "9:30", "time_end": "17:05"}),
+    ("01-05-2025", None, {}),
+    ("Total £ 10", None, {}),
+    ("English to Polish", None, {}),
+    ("", None, {}),
+    (None, None, {}),
+])
+def test_classify_text(raw, kind, groups):
+    got_kind, match = classify_text(raw)
+    assert got_kind == kind
+    for name, value in groups.items():
+        assert match.group(name) == value
+
 def test_extract_texts_from_xml(sample_xml_single_day_with_distance):
     texts = _extract_texts_from_xml(sample_xml_single_day_with_distance)
     assert isinstance(texts, list)
@@ -142,13 +201,51 @@ def test_extract_texts_from_xml(sample_xml_single_day_with_distance):
     assert "By accepting this assignment" in texts
     assert not any(not text_item.strip() for text_item in texts if text_item is not None)
 
+def test_extract_texts_from_xml_with_parsed_tree(sample_xml_single_day_with_distance, sample_xml_multiday):
+    for xml in (sample_xml_single_day_with_distance, sample_xml_multiday):
+        tree = parse_xml_tree(xml)
+        assert tree is not None
+        assert _extract_texts_from_xml(xml, tree=tree) == _extract_texts_from_xml(xml)
+
+def test_extract_texts_from_xml_unescapes_entities():
+    xml = '<hierarchy><node text="Smith &amp; Co" /><node text="Line one&#10;Line two" /><node text="Plain" /></hierarchy>'
+    texts = _extract_texts_from_xml(xml)
+    assert texts == ["Smith & Co", "Line one", "Line two", "Plain"]
+    assert _extract_texts_from_xml(xml, tree=parse_xml_tree(xml)) == texts
+
+def test_scan_anchors_multiday(texts_multiday):
+    texts = texts_multiday
+    anchors = scan_anchors(texts)
+    assert anchors['mjr'] == [i for i, t in enumerate(texts) if t.startswith("Booking #MJR")]
+    assert anchors['multiday'] == [texts.index("Multiday")]
+    assert anchors['language'] == [texts.index("English to Polish")]
+    assert [texts[i] for i in anchors['mja']] == [t for t in texts if t.startswith("MJA")]
+    assert all(texts[i] == "TOTAL" for i in anchors['total'])
+    assert len(anchors['disclaimer']) == 1
+
+def test_extract_all_matches_individual_extractors(sample_xml_single_day_with_distance, sample_xml_multiday):
+    for xml in (sample_xml_single_day_with_distance, sample_xml_multiday):
+        texts = _extract_texts_from_xml(xml)
+        header_info, info_block, mja_blocks, notes_total, is_multiday, lang_idx = extract_all(texts)
+        assert (header_info, is_multiday, lang_idx) == extract_header_and_booking_type(texts)
+        assert info_block == extract_info_block(texts, lang_idx)
+        assert mja_blocks == extract_mja_payment_blocks(texts)
+        assert notes_total == extract_notes_and_total(texts)
+
+def test_parse_detail_page_matches_two_step_parse(sample_xml_single_day_with_distance, sample_xml_multiday):
+    for xml in (sample_xml_single_day_with_distance, sample_xml_multiday):
+        header_info, info_block, mja_blocks, notes_total, is_multiday, _ = extract_all(_extract_texts_from_xml(xml))
+        assert parse_detail_page(xml) == (is_multiday, parse_detail_data(header_info, is_multiday, info_block, mja_blocks, notes_total))
+        assert parse_detail_page(xml)[0] == check_if_multiday_from_xml(xml)
+    assert parse_detail_page("<hierarchy/>") == (False, None)
+
 def test_check_if_multiday_from_xml(sample_xml_multiday, sample_xml_single_day_with_distance):
     assert check_if_multiday_from_xml(sample_xml_multiday) is True
     assert check_if_multiday_from_xml(sample_xml_single_day_with_distance) is False
 
-def test_extract_header_single_day(sample_xml_single_day_with_distance):
-    texts = _extract_texts_from_xml(sample_xml_single_day_with_distance)
-    header_data, is_multiday, lang_idx = extract_header_and_booking_type(texts)
+def test_extract_header_single_day(texts_single_day, header_single_day):
+    texts = texts_single_day
+    header_data, is_multiday, lang_idx = header_single_day
     assert is_multiday is False
     assert header_data['mjr_id_raw'] == "MJR00225672"
     assert header_data['total_value_header_raw'] == "£ 89.93"
@@ -157,9 +254,9 @@ def test_extract_header_single_day(sample_xml_single_day_with_distance):
     assert header_data['multiday_date_range_raw'] is None
     assert lang_idx == texts.index("English to Polish")
 
-def test_extract_header_multiday(sample_xml_multiday):
-    texts = _extract_texts_from_xml(sample_xml_multiday)
-    header_data, is_multiday, lang_idx = extract_header_and_booking_type(texts)
+def test_extract_header_multiday(texts_multiday, header_multiday):
+    texts = texts_multiday
+    header_data, is_multiday, lang_idx = header_multiday
     assert is_multiday is True
     assert header_data['mjr_id_raw'] == "MJR00156403"
     assert header_data['total_value_header_raw'] == "£ 332.00"
@@ -170,9 +267,9 @@ def test_extract_header_multiday(sample_xml_multiday):
     assert lang_idx == texts.index("English to Polish")
 
 # ... (Keep existing extract_info_block tests, extract_mja_payment_blocks tests, extract_notes_and_total tests)
-def test_extract_info_block_single_day_with_distance(sample_xml_single_day_with_distance):
-    texts = _extract_texts_from_xml(sample_xml_single_day_with_distance)
-    _hd, _im, lang_idx = extract_header_and_booking_type(texts)
+def test_extract_info_block_single_day_with_distance(texts_single_day, header_single_day):
+    texts = texts_single_day
+    _hd, _im, lang_idx = header_single_day
     assert lang_idx is not None
     info_data = extract_info_block(texts, lang_idx)
     assert info_data['language_pair_raw'] == "English to Polish"
@@ -185,9 +282,9 @@ def test_extract_info_block_single_day_with_distance(sample_xml_single_day_with_
     assert info_data['distance_raw'] == "9.82 Miles"
     assert info_data['meeting_link_raw'] is None
 
-def test_parse_detail_data_single_day(sample_xml_single_day_with_distance):
-    texts = _extract_texts_from_xml(sample_xml_single_day_with_distance)
-    header_info, is_multiday, lang_idx = extract_header_and_booking_type(texts)
+def test_parse_detail_data_single_day(texts_single_day, header_single_day):
+    texts = texts_single_day
+    header_info, is_multiday, lang_idx = header_single_day
     assert lang_idx is not None
     info_block = extract_info_block(texts, lang_idx)
     mja_blocks = extract_mja_payment_blocks(texts)
@@ -217,9 +314,9 @@ def test_parse_detail_data_single_day(sample_xml_single_day_with_distance):
 # (Keep other tests like test_parse_detail_data_multiday, test_parse_detail_data_video_remote_with_link_in_notes)
 # Ensure they are consistent with the latest parser logic.
 
-def test_parse_detail_data_multiday(sample_xml_multiday):
-    texts = _extract_texts_from_xml(sample_xml_multiday)
-    header_info, is_multiday, lang_idx = extract_header_and_booking_type(texts)
+def test_parse_detail_data_multiday(texts_multiday, header_multiday):
+    texts = texts_multiday
+    header_info, is_multiday, lang_idx = header_multiday
     assert lang_idx is not None
     info_block = extract_info_block(texts, lang_idx)
     mja_blocks = extract_mja_payment_blocks(texts)
@@ -232,9 +329,9 @@ def test_parse_detail_data_multiday(sample_xml_multiday):
     assert parsed['day_total'] == 166.00
     assert len(parsed['multiday_payments']) == 2
 
-def test_parse_detail_data_video_remote_with_link_in_notes(sample_xml_video_remote_no_address):
-    texts = _extract_texts_from_xml(sample_xml_video_remote_no_address)
-    header_info, is_multiday, lang_idx = extract_header_and_booking_type(texts)
+def test_parse_detail_data_video_remote_with_link_in_notes(texts_video_remote, header_video_remote):
+    texts = texts_video_remote
+    header_info, is_multiday, lang_idx = header_video_remote
     assert lang_idx is not None
     info_block = extract_info_block(texts, lang_idx)
     mja_blocks = extract_mja_payment_blocks(texts)
@@ -70,11 +70,33 @@ from typing import Dict, Optional, Any
     ),
     ("InvalidDescription", None),
     ("", None)
+], ids=[
+    "normal", "viewed_prefix", "cancelled_remote", "new_offer_no_postcode_no_duration",
+    "mja_only", "viewed_mja_only", "unknown_prefix", "invalid", "empty",
 ])
 def test_parse_mja_various_inputs(desc, expected_output):
     result = parse_mja(desc)
     assert result == expected_output
 
+def test_parse_mja_returns_independent_dicts_for_repeated_input():
+    desc = "MJA00000008, AB1 2CD, 09:00 to 10:00, English to Polish"
+    first = parse_mja(desc)
+    first['clickable'] = True # Callers annotate the result, e.g. ListPage.get_cards
+    second = parse_mja(desc)
+    assert second is not first
+    assert 'clickable' not in second
+    assert second['booking_id'] == "MJA00000008"
+
+@pytest.mark.parametrize("desc, expected_status, expected_id", [
+    ("Cancelled,MJA00000010", BookingCardStatus.CANCELLED, "MJA00000010"),
+    ("New Offer, , MJA00000011, English to Polish", BookingCardStatus.NEW_OFFER, "MJA00000011"),
+    ("Viewed MJA00000012", BookingCardStatus.NORMAL, "MJA00000012"), # Prefix needs its comma
+], ids=["no_space_after_comma", "repeated_separators", "prefix_without_comma"])
+def test_parse_mja_status_prefix_separators(desc, expected_status, expected_id):
+    result = parse_mja(desc)
+    assert result['card_status'] == expected_status
+    assert result['booking_id'] == expected_id
+
 def test_parse_mja_no_mja_id_after_status():
     desc = "Cancelled, NoMJAIDHere, AB1 2CD, 09:00 to 10:00, English to Polish"
     assert parse_mja(desc) is None
\ No newline at end of file
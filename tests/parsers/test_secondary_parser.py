@@ -1,6 +1,6 @@
 # filename: tests/parsers/test_secondary_parser.py
 import pytest
-from parsers.secondary_parser import parse_secondary_page_data, MJR_DESC_PATTERN, APPOINTMENT_DESC_PATTERN, FACE_TO_FACE_TEXT, VIDEO_REMOTE_TEXT, REMOTE_TEXT
+from parsers.secondary_parser import parse_secondary_page_data, _normalize_type_hint, MJR_DESC_PATTERN, APPOINTMENT_DESC_PATTERN, FACE_TO_FACE_TEXT, VIDEO_REMOTE_TEXT, REMOTE_TEXT
 
 # Sample XML snippets (more realistic structure)
 XML_SAMPLE_1 = """
@@ -131,6 +131,44 @@ def test_parse_secondary_page_data_bad_appt_count():
     result = parse_secondary_page_data(xml_content_bad_appt)
     assert result == expected
 
+def test_parse_secondary_page_data_skips_unrelated_attributes():
+    xml_content = """
+    <hierarchy>
+      <node text="Terms &amp; Conditions" content-desc="Back &amp; close" />
+      <node text="Booking #MJB10203040" />
+      <node content-desc="Help, call us" />
+      <node content-desc="MJR50607080, Video Remote Interpreting, Appointments : 2" />
+      <node content-desc="MJR99999999, Face To Face, Appointments : 9" />
+    </hierarchy>
+    """
+    expected = {
+        'mjb_id_raw': 'MJB10203040', 'mjr_id_raw': 'MJR50607080',
+        'appointment_count_hint': 2, 'type_hint_raw': VIDEO_REMOTE_TEXT
+    }
+    assert parse_secondary_page_data(xml_content) == expected
+
+def test_parse_secondary_page_data_quoted_entity_stays_in_attribute():
+    xml_content = """
+    <hierarchy>
+      <node text="Booking #MJB11223344" />
+      <node content-desc="MJR44332211, &quot;Face To Face&quot;, Appointments : 2" />
+    </hierarchy>
+    """
+    result = parse_secondary_page_data(xml_content)
+    assert result['mjr_id_raw'] == 'MJR44332211'
+    assert result['appointment_count_hint'] == 2 # Decoding the whole XML first would cut the value at the first &quot;
+    assert result['type_hint_raw'] == FACE_TO_FACE_TEXT
+
+@pytest.mark.parametrize("candidate, expected", [
+    ("Face To Face", FACE_TO_FACE_TEXT),
+    ("video remote interpreting", VIDEO_REMOTE_TEXT),
+    ("Remote", REMOTE_TEXT),
+    ("Remote, Face To Face", FACE_TO_FACE_TEXT), # Priority order, not position
+    ("Telephone", "Telephone"),
+])
+def test_normalize_type_hint(candidate, expected):
+    assert _normalize_type_hint(candidate) == expected
+
 def test_secondary_regex_patterns():
     match = MJR_DESC_PATTERN.search("MJR12345678, Face To Face, Appointments : 3")
     assert match is not None; assert match.group(1) == "MJR12345678"; assert match.group(2) == "Face To Face"; assert match.group(3) == "3"
@@ -0,0 +1,56 @@
+# filename: tests/processors/test_detail_processor.py
+import pytest
+import processors.detail_processor as detail_processor_module
+from processors.detail_processor import DetailProcessor
+from db.connection import init_db
+from db.repository import record_mjr_scraped
+from state.models import ScrapeState
+
+class FakeDriver:
+    def __init__(self):
+        self.back_calls = 0
+        self.page_source = "<hierarchy/>"
+    def back(self): self.back_calls += 1
+    def find_elements(self, *locator): return [object()] # The list page shows after the first back()
+    def update_settings(self, settings): pass
+
+class FakeDetailPage:
+    def wait_until_displayed(self, timeout=10): return True
+
+class FakeStateManager:
+    def __init__(self, booking_id: str, mjr_id: str):
+        self.current_booking_id = booking_id
+        self.current_mjr_id = mjr_id
+        self.current_scrape_attempt = 1
+        self.bookings_scraped = 0
+        self.states = []
+    def record_booking_scraped(self): self.bookings_scraped += 1
+    def update_state(self, state, **kwargs): self.states.append(state)
+
+@pytest.fixture
+def conn():
+    conn = init_db(":memory:")
+    yield conn
+    conn.close()
+
+def _fail(*args, **kwargs): raise AssertionError("detail scrape should have been skipped")
+
+def test_recently_scraped_mjr_skips_detail_scrape(conn, monkeypatch):
+    record_mjr_scraped(conn, "MJR00000001")
+    driver = FakeDriver(); state = FakeStateManager("MJA00000001", "MJR00000001")
+    processor = DetailProcessor(driver, conn, FakeDetailPage(), state)
+    monkeypatch.setattr(processor, "_get_current_texts_and_source", lambda page_source=None: ([], "<hierarchy/>", None))
+    monkeypatch.setattr(detail_processor_module, "save_booking_details", _fail)
+    monkeypatch.setattr(detail_processor_module, "save_booking_details_bulk", _fail)
+
+    assert processor.process() == ScrapeState.LIST
+    assert state.bookings_scraped == 1
+    assert state.states == [ScrapeState.LIST]
+    assert driver.back_calls == 1
+
+def test_unscraped_mjr_is_not_skipped(conn):
+    processor = DetailProcessor(FakeDriver(), conn, FakeDetailPage(), FakeStateManager("MJA00000002", "MJR00000002"))
+    assert processor._is_mjr_recently_scraped("MJR00000002") is False
+    record_mjr_scraped(conn, "MJR00000002")
+    processor._mjr_scraped_at_memo.clear() # Recorded behind the processor's back, so drop its remembered miss
+    assert processor._is_mjr_recently_scraped("MJR00000002") is True
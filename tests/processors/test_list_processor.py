@@ -0,0 +1,48 @@
+# filename: tests/processors/test_list_processor.py
+import pytest
+import processors.list_processor as list_processor_module
+from processors.list_processor import ListProcessor, CARD_SKIP, CARD_WRITE_AND_SKIP
+from db.connection import init_db
+from db.repository import insert_bookings_base_bulk, update_booking_status
+from state.models import BookingCardStatus, BookingProcessingStatus
+
+CARD = {"booking_id": "MJA00000001", "postcode": "AB1 2CD", "start_time_raw": "09:00", "end_time_raw": "10:00",
+        "calculated_duration_str": "01:00", "language_pair": "English to Polish", "isRemote": 0}
+
+@pytest.fixture
+def conn():
+    conn = init_db(":memory:")
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def scraped_booking(conn):
+    insert_bookings_base_bulk(conn, [dict(CARD, card_status=BookingCardStatus.NORMAL)])
+    update_booking_status(conn, CARD["booking_id"], BookingProcessingStatus.SCRAPED.value)
+    return CARD["booking_id"]
+
+def _status(conn, booking_id):
+    return conn.execute("SELECT status FROM bookings WHERE booking_id = ?", (booking_id,)).fetchone()[0]
+
+def test_scraped_booking_cancelled_on_list_is_recorded(conn, scraped_booking, monkeypatch):
+    monkeypatch.setattr(list_processor_module, "_screenshot_dir_ready", True) # Keep the test out of the filesystem
+    processor = ListProcessor(None, conn, None, None)
+    cancelled_card = dict(CARD, card_status=BookingCardStatus.CANCELLED)
+
+    fully_scraped_mjr_ids, db_status_map = processor._refresh_mjr_lookups([cancelled_card])
+    assert db_status_map[scraped_booking] == BookingProcessingStatus.SCRAPED.value
+    assert processor._classify_card(cancelled_card, fully_scraped_mjr_ids, db_status_map[scraped_booking]) == CARD_WRITE_AND_SKIP
+
+    processor._flush_pending_writes([cancelled_card], [])
+    assert _status(conn, scraped_booking) == BookingProcessingStatus.CANCELLED_ON_LIST.value
+    assert processor._final_statuses[scraped_booking] == BookingProcessingStatus.CANCELLED_ON_LIST.value
+    # Recorded once; the next cycle skips it
+    processor.session_clicked_mja_ids.add(scraped_booking)
+    assert processor._classify_card(cancelled_card, set()) == CARD_SKIP
+
+def test_scraped_booking_still_normal_is_skipped(conn, scraped_booking, monkeypatch):
+    monkeypatch.setattr(list_processor_module, "_screenshot_dir_ready", True)
+    processor = ListProcessor(None, conn, None, None)
+    normal_card = dict(CARD, card_status=BookingCardStatus.NORMAL)
+    _fully_scraped_mjr_ids, db_status_map = processor._refresh_mjr_lookups([normal_card])
+    assert processor._classify_card(normal_card, set(), db_status_map[scraped_booking]) == CARD_SKIP
@@ -0,0 +1,61 @@
+# filename: tests/utils/test_display_manager.py
+import os
+import stat
+import pytest
+from utils.display_manager import DisplayManager
+
+# Stand-in for adb: `adb shell` is a local sh (the first one exits after reading one line, like a dropped connection),
+# `adb shell <cmd>` runs the command once
+FAKE_ADB = """#!/bin/sh
+[ "$1" = "-s" ] && shift 2
+shift
+if [ $# -eq 0 ]; then
+    if [ ! -e "$FAKE_ADB_STATE/died" ]; then touch "$FAKE_ADB_STATE/died"; read line; exit 0; fi
+    exec sh
+fi
+exec sh -c "$*"
+"""
+
+@pytest.fixture
+def display_manager(tmp_path, monkeypatch):
+    adb_path = tmp_path / "adb"
+    adb_path.write_text(FAKE_ADB)
+    adb_path.chmod(adb_path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_ADB_STATE", str(tmp_path))
+    manager = DisplayManager(None)
+    yield manager
+    manager.close()
+
+def test_batch_fallback_keeps_later_shell_output_in_sync(display_manager):
+    assert display_manager.execute_adb_shell_batch([["echo", "first"], ["echo", "second"]]) == [(True, "first"), (True, "second")]
+    assert display_manager.execute_adb_command_raw(["shell", "echo", "third"]) == (True, "third")
+    assert display_manager.execute_adb_command_raw(["shell", "echo", "fourth"]) == (True, "fourth")
+
+def test_batch_reports_each_exit_code(display_manager):
+    display_manager.execute_adb_command_raw(["shell", "true"]) # Uses up the shell that drops
+    assert display_manager.execute_adb_shell_batch([["echo", "ok"], ["false"]]) == [(True, "ok"), (False, "")]
+
+FAKE_DUMPSYS = """#!/bin/sh
+case "$1 $2" in
+    "window windows") echo "  mCurrentFocus=Window{1a2b3c u0 com.example.app/com.example.app.MainActivity}" ;;
+    "window displays") echo "Display: mDisplayId=0" ;;
+    "SurfaceFlinger --display-id") echo "Display 0 (Internal Display):"; echo "Display 4619827259835644672 (virtual_display_1):" ;;
+esac
+"""
+
+@pytest.fixture
+def device_display_manager(display_manager, tmp_path):
+    (tmp_path / "died").touch() # Persistent shell stays up
+    dumpsys_path = tmp_path / "dumpsys"
+    dumpsys_path.write_text(FAKE_DUMPSYS)
+    dumpsys_path.chmod(dumpsys_path.stat().st_mode | stat.S_IXUSR)
+    return display_manager
+
+def test_focus_info_defaults_to_default_display(device_display_manager):
+    assert device_display_manager.get_current_app_focus_info() == {'package': 'com.example.app', 'display_id': '0'}
+
+def test_focus_info_reports_chosen_target_display(device_display_manager):
+    assert device_display_manager.get_target_display_id("virtual_display_1") == "4619827259835644672"
+    assert device_display_manager.get_current_app_focus_info() == {'package': 'com.example.app', 'display_id': '4619827259835644672'}
+    assert device_display_manager.get_current_app_focus_info()['display_id'] == '4619827259835644672' # Served from the focus cache
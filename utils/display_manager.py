@@ -1,23 +1,157 @@
 # filename: utils/display_manager.py
+import os
+import queue
 import subprocess
 import re
+import shutil
+import threading
+import time
 from logger import get_logger
 from typing import Dict, Optional, List, Tuple
 
 logger = get_logger(__name__)
 
+ADB_SHELL_DONE_MARKER = "__ADB_SHELL_DONE__" # Printed with the exit code after each command on the persistent shell
+ADB_COMMAND_TIMEOUT = 10
+ADB_SHELL_MAX_FAILURES = 3 # Consecutive persistent-shell failures before falling back to one adb process per command for good
+
+FOCUS_CACHE_SECONDS = 0.2 # A focus check right after another reuses its `dumpsys window windows` result
+DISPLAY_IDS_CACHE_SECONDS = 30.0 # Display topology rarely changes mid-crawl; reuse a SurfaceFlinger listing this long
+
+# SurfaceFlinger display line, e.g. "Display 0 (Internal Display):"; groups are the id and the name
+DISPLAY_LINE_REGEX = re.compile(r"Display[ \t]+(\d+)[ \t]+\(([^)\n]+)\):") # Never spans lines, so it can scan the whole output
+# Focused window/app package from `dumpsys window windows`, whichever line comes first; read it with _focus_package().
+# The package is the token right before '/', so a user prefix such as "u0 " is not part of it.
+FOCUS_REGEX = re.compile(r"mCurrentFocus=Window\{[^}]*? (?P<current_focus>[^\s/{}]+)/|mFocusedApp=ActivityRecord\{[^}]*? (?P<focused_app>[^\s/{}]+)/")
+
+FOCUS_LINE_PREFIXES = ("mCurrentFocus=Window{", "mFocusedApp=ActivityRecord{") # Literal starts of the FOCUS_REGEX alternatives
+FOCUS_SEARCH_WINDOW = 512 # Characters after the first prefix hit that hold the whole focus record
+
+def _focus_package(focus_match: "re.Match[str]") -> Optional[str]:
+    return focus_match.group('current_focus') or focus_match.group('focused_app')
+
+def _search_focus(output: str) -> Optional["re.Match[str]"]:
+    """Same match as FOCUS_REGEX.search(output); str.find locates the first focus line so the regex only runs over a small window of it."""
+    starts = [idx for idx in map(output.find, FOCUS_LINE_PREFIXES) if idx != -1]
+    if not starts: return None # Neither prefix present, so the regex can't match
+    start = min(starts)
+    return FOCUS_REGEX.search(output, start, start + FOCUS_SEARCH_WINDOW) or FOCUS_REGEX.search(output, start) # Unusually long record: scan on
+
 class DisplayManager:
     def __init__(self, driver, default_target_display_id: Optional[str] = "0"):
         self.driver = driver
         # default_target_display_id is used if no specific target can be found
         self.default_target_display_id = default_target_display_id if default_target_display_id else "0"
+        self.target_display_id_str = self.default_target_display_id # Last display chosen by get_target_display_id
+        self._adb_base: Optional[List[str]] = None # [adb] or [adb, '-s', serial] with adb's resolved path, set on first use
+        self._shell: Optional[subprocess.Popen] = None # Long-lived `adb shell`; saves an adb fork + adbd handshake per shell command
+        self._shell_lines: Optional["queue.Queue[Optional[str]]"] = None # Stdout lines from the reader thread; None marks EOF
+        self._shell_lock = threading.Lock() # One command in flight on the shell at a time
+        self._shell_failures = 0
+        self._display_ids_cache: Optional[Tuple[float, Dict[str, str]]] = None # (monotonic time read, displays)
+        self._focus_cache: Optional[Tuple[float, Optional[str]]] = None # (monotonic time read, focused package or None)
+
+    def _get_adb_base(self) -> List[str]:
+        """Targets the Appium session's device explicitly when its serial (udid) is known, so a second attached device can't answer."""
+        if self._adb_base is None:
+            serial = None
+            try: serial = (self.driver.capabilities or {}).get('udid') or (self.driver.capabilities or {}).get('deviceUDID')
+            except Exception as e: logger.debug(f"Could not read device serial from session capabilities: {e}")
+            adb_path = shutil.which('adb') # Resolved once; children then exec an absolute path instead of searching PATH
+            if adb_path is None: logger.error("ADB command not found. Ensure ADB is in your system PATH.")
+            adb_path = adb_path or 'adb' # Still try, so each call reports its own failure as before
+            self._adb_base = [adb_path, '-s', serial] if serial else [adb_path]
+            logger.debug(f"ADB commands will use: {' '.join(self._adb_base)}")
+        return self._adb_base
+
+    def _get_shell(self) -> Optional[subprocess.Popen]:
+        if self._shell is not None and self._shell.poll() is None: return self._shell
+        try:
+            self._shell = subprocess.Popen(self._get_adb_base() + ['shell'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT, text=True, errors='replace', bufsize=1)
+        except OSError as e:
+            logger.debug(f"Could not start persistent adb shell, using one adb process per command: {e}")
+            self._shell = None; return None
+        self._shell_lines = queue.Queue()
+        threading.Thread(target=self._read_shell_output, args=(self._shell, self._shell_lines), name="adb-shell-reader", daemon=True).start()
+        logger.debug(f"Started persistent adb shell (pid {self._shell.pid}).")
+        return self._shell
+
+    @staticmethod
+    def _read_shell_output(shell: subprocess.Popen, lines: "queue.Queue[Optional[str]]"):
+        for line in shell.stdout: lines.put(line.rstrip("\r\n"))
+        lines.put(None)
+
+    def _drain_shell_lines(self):
+        """Drops output a previous command left unread, so it can't be taken for the next command's output."""
+        while True:
+            try: line = self._shell_lines.get_nowait()
+            except queue.Empty: return
+            if line is None: self._shell_lines.put(None); return # Keep the EOF for the read loop
+            logger.debug(f"Discarding stale adb shell output: {line}")
 
+    def _stop_shell(self):
+        shell, self._shell = self._shell, None
+        self._shell_lines = None # The next shell gets a fresh queue; nothing from this one is read again
+        if shell is None: return
+        try: shell.stdin.close()
+        except OSError: pass
+        try: shell.wait(timeout=1)
+        except subprocess.TimeoutExpired: shell.kill()
+
+    @staticmethod
+    def _shell_script(commands: List[List[str]]) -> str:
+        """One shell line running each command and printing the done marker with its exit code after it."""
+        # Each command joined with spaces, exactly as `adb shell a b c` hands its arguments to the device shell
+        return "; ".join(f"{' '.join(shell_args)} 2>&1; printf '\\n{ADB_SHELL_DONE_MARKER}%d\\n' $?" for shell_args in commands)
+
+    def _execute_on_shell(self, commands: List[List[str]]) -> Optional[List[Tuple[int, str]]]:
+        """Runs commands back to back on the persistent shell; returns (exit code, output) per command, or None if the shell is unusable."""
+        with self._shell_lock:
+            if self._shell_failures >= ADB_SHELL_MAX_FAILURES: return None
+            shell = self._get_shell()
+            if shell is None: self._shell_failures = ADB_SHELL_MAX_FAILURES; return None
+            try:
+                self._drain_shell_lines()
+                shell.stdin.write(self._shell_script(commands) + "\n"); shell.stdin.flush()
+                results: List[Tuple[int, str]] = []
+                output: List[str] = []
+                while len(results) < len(commands):
+                    line = self._shell_lines.get(timeout=ADB_COMMAND_TIMEOUT)
+                    if line is None: raise EOFError("adb shell exited")
+                    if line.startswith(ADB_SHELL_DONE_MARKER):
+                        results.append((int(line[len(ADB_SHELL_DONE_MARKER):] or 1), "\n".join(output).strip()))
+                        output = []
+                    else:
+                        output.append(line)
+                self._shell_failures = 0
+                return results
+            except (OSError, ValueError, EOFError, queue.Empty) as e:
+                self._shell_failures += 1
+                logger.debug(f"Persistent adb shell failed on {' ; '.join(' '.join(c) for c in commands)} ({e!r}); restarting it on next use.")
+                self._stop_shell(); return None
+
+    def close(self):
+        """Stops the persistent adb shell, if one was started."""
+        with self._shell_lock: self._stop_shell()
 
     def execute_adb_command_raw(self, command_parts: List[str]) -> Tuple[bool, str]:
-        """Executes an ADB command and returns success status and output/error."""
+        """Executes an ADB command and returns success status and output/error. `shell` commands reuse a persistent adb shell."""
+        if command_parts and command_parts[0] == "shell" and len(command_parts) > 1:
+            results = self._execute_on_shell([command_parts[1:]])
+            if results is not None:
+                returncode, output = results[0]
+                if returncode == 0: return True, output
+                logger.error(f"ADB command failed: {' '.join(command_parts)}. Return code: {returncode}. Output: {output}")
+                if "killed" in output.lower(): logger.error("ADB command was killed, possibly due to system/emulator issues.")
+                return False, output
+        return self._execute_adb_process(command_parts)
+
+    def _execute_adb_process(self, command_parts: List[str]) -> Tuple[bool, str]:
+        """Runs the ADB command in its own adb process, never on the persistent shell."""
         try:
             # Ensure adb is in PATH or provide full path
-            process = subprocess.run(['adb'] + command_parts, capture_output=True, text=True, check=False, timeout=10)
+            process = subprocess.run(self._get_adb_base() + command_parts, capture_output=True, text=True, check=False, timeout=ADB_COMMAND_TIMEOUT)
             if process.returncode == 0:
                 return True, process.stdout.strip()
             else:
@@ -38,49 +172,114 @@ class DisplayManager:
             logger.exception(f"Exception executing ADB command {' '.join(command_parts)}: {e}")
             return False, str(e)
 
+    def execute_adb_shell_batch(self, commands: List[List[str]]) -> List[Tuple[bool, str]]:
+        """
+        Runs several device shell commands (e.g. ["dumpsys", "window", "windows"]) in one round trip and returns
+        (success, output) for each, in order. Uses the persistent shell, else a single `adb shell` process.
+        """
+        if not commands: return []
+        results = self._execute_on_shell(commands)
+        if results is None:
+            # Its own adb process: on the persistent shell, the first done marker would end the read and leave the rest queued
+            success, output = self._execute_adb_process(["shell", self._shell_script(commands)])
+            if not success and ADB_SHELL_DONE_MARKER not in output: return [(False, output)] * len(commands)
+            results, section = [], []
+            for line in output.splitlines():
+                if line.startswith(ADB_SHELL_DONE_MARKER):
+                    results.append((int(line[len(ADB_SHELL_DONE_MARKER):] or 1), "\n".join(section).strip())); section = []
+                else:
+                    section.append(line)
+            results += [(1, "\n".join(section).strip())] * (len(commands) - len(results)) # Commands that never reported back
+        for shell_args, (returncode, output) in zip(commands, results):
+            if returncode != 0: logger.error(f"ADB command failed: shell {' '.join(shell_args)}. Return code: {returncode}. Output: {output}")
+        return [(returncode == 0, output) for returncode, output in results[:len(commands)]]
+
+    def execute_adb_command_to_file(self, command_parts: List[str], filepath: str) -> Tuple[bool, str]:
+        """Executes an ADB command (e.g. exec-out) with its binary stdout streamed straight into filepath. Returns success and error text."""
+        try:
+            with open(filepath, "wb") as out_file:
+                process = subprocess.run(self._get_adb_base() + command_parts, stdout=out_file, stderr=subprocess.PIPE, check=False, timeout=10)
+            error_output = process.stderr.decode(errors='replace').strip()
+            if process.returncode == 0 and os.path.getsize(filepath) > 0: return True, error_output
+            logger.debug(f"ADB command to file failed: {' '.join(command_parts)}. Return code: {process.returncode}. Output: {error_output}")
+            return False, error_output or f"Return code {process.returncode}, {os.path.getsize(filepath)} bytes written"
+        except subprocess.TimeoutExpired:
+            logger.error(f"ADB command timed out: {' '.join(command_parts)}")
+            return False, "Timeout"
+        except FileNotFoundError:
+            logger.error("ADB command not found. Ensure ADB is in your system PATH.")
+            return False, "ADB not found"
+        except OSError as e:
+            logger.error(f"Could not write ADB output for {' '.join(command_parts)} to {filepath}: {e}")
+            return False, str(e)
+
+    def execute_adb_command_bytes(self, command_parts: List[str]) -> Tuple[bool, bytes]:
+        """Executes an ADB command and returns success and its raw binary stdout (empty on failure)."""
+        try:
+            process = subprocess.run(self._get_adb_base() + command_parts, capture_output=True, check=False, timeout=10)
+            if process.returncode == 0: return True, process.stdout
+            logger.error(f"ADB command failed: {' '.join(command_parts)}. Return code: {process.returncode}. Output: {process.stderr.decode(errors='replace').strip()}")
+            return False, b""
+        except subprocess.TimeoutExpired:
+            logger.error(f"ADB command timed out: {' '.join(command_parts)}")
+            return False, b""
+        except FileNotFoundError:
+            logger.error("ADB command not found. Ensure ADB is in your system PATH.")
+            return False, b""
+
     def _get_display_ids(self) -> Dict[str, str]:
         """
         Retrieves available display IDs and their types (e.g., internal, virtual) using ADB.
+        A non-empty listing is reused for DISPLAY_IDS_CACHE_SECONDS.
         Example output format: {'internal': '0', 'virtual_display_1': '4619827259835644672'}
         """
+        if self._display_ids_cache is not None and time.monotonic() - self._display_ids_cache[0] < DISPLAY_IDS_CACHE_SECONDS:
+            return dict(self._display_ids_cache[1])
         displays = {}
         success, output = self.execute_adb_command_raw(["shell", "dumpsys", "SurfaceFlinger", "--display-id"])
         if success and output:
             # Example output line: "Display 4619827259835644672 (virtual_display_1):"
             # Or for internal: "Display 0 (Internal Display):"
-            display_pattern = re.compile(r"Display\s+(\d+)\s+\(([^)]+)\):")
-            for line in output.splitlines():
-                match = display_pattern.search(line)
-                if match:
-                    display_id = match.group(1)
-                    display_name_raw = match.group(2).lower()
-                    if "internal" in display_name_raw:
-                        displays['internal'] = display_id
-                    else: # For virtual displays, try to use a unique name
-                        displays[display_name_raw.replace(" ", "_")] = display_id
+            for match in DISPLAY_LINE_REGEX.finditer(output): # One C-level scan over the whole output instead of a search per line
+                display_id = match.group(1)
+                display_name_raw = match.group(2).lower()
+                if "internal" in display_name_raw:
+                    displays['internal'] = display_id
+                else: # For virtual displays, try to use a unique name
+                    displays[display_name_raw.replace(" ", "_")] = display_id
         else:
             logger.warning(f"Could not get display IDs from SurfaceFlinger. Output: {output}")
         logger.info(f"Detected displays: {displays}")
+        if displays: self._display_ids_cache = (time.monotonic(), dict(displays)) # An empty/failed listing is retried next time
         return displays
 
+    def _store_focus(self, success: bool, output: str) -> Optional[str]:
+        """Parses the focused package from a `dumpsys window windows` result and caches it for FOCUS_CACHE_SECONDS."""
+        focused_package = None
+        if success and output:
+            # Example: mCurrentFocus=Window{... u0 com.wordsynknetwork.moj/com.wordsynknetwork.moj.MainActivity}
+            # Example: mFocusedApp=ActivityRecord{... u0 com.wordsynknetwork.moj/.MainActivity ...}
+            focus_match = _search_focus(output)
+            if focus_match: focused_package = _focus_package(focus_match)
+        self._focus_cache = (time.monotonic(), focused_package)
+        return focused_package
+
+    def _cached_focus(self) -> Tuple[bool, Optional[str]]:
+        """(is fresh, focused package): fresh when the last check was less than FOCUS_CACHE_SECONDS ago."""
+        if self._focus_cache is not None and time.monotonic() - self._focus_cache[0] < FOCUS_CACHE_SECONDS:
+            return True, self._focus_cache[1]
+        return False, None
+
     def _get_focused_window_display_id(self) -> Optional[str]:
         """
         Attempts to find the display ID of the currently focused application window.
         Returns the display ID as a string, or None if not found or error.
         """
         # Get focused app and window
-        success, output = self.execute_adb_command_raw(
-            ["shell", "dumpsys", "window", "windows"]
-        )
-        focused_app_package = None
-        if success and output:
-            # Look for mCurrentFocus or mFocusedApp for the package name
-            # Example: mCurrentFocus=Window{... com.wordsynknetwork.moj/com.wordsynknetwork.moj.MainActivity}
-            # Example: mFocusedApp=ActivityRecord{... com.wordsynknetwork.moj/.MainActivity ...}
-            focus_match = re.search(r"mCurrentFocus=Window{[^ ]+ ([^/]+)/[^ }]+}|mFocusedApp=ActivityRecord{[^ ]+ ([^/]+)/[^ ]+ .*?}", output)
-            if focus_match:
-                focused_app_package = focus_match.group(1) or focus_match.group(2) # Take first non-None group
-                logger.debug(f"Detected focused app package: {focused_app_package}")
+        focus_is_fresh, focused_app_package = self._cached_focus()
+        if not focus_is_fresh:
+            focused_app_package = self._store_focus(*self.execute_adb_command_raw(["shell", "dumpsys", "window", "windows"]))
+        if focused_app_package: logger.debug(f"Detected focused app package: {focused_app_package}")
 
         if not focused_app_package or focused_app_package != GENERAL_CAPABILITIES.get('appPackage'):
             logger.warning(f"Target app {GENERAL_CAPABILITIES.get('appPackage')} not focused. Current focus: {focused_app_package}")
@@ -109,8 +308,12 @@ class DisplayManager:
         Determines the target display ID.
         If target_display_name is provided (e.g., "internal", "virtual_display_1"), uses that.
         Otherwise, attempts to find the display with the focused target app.
-        Defaults to internal display or "0".
+        Defaults to internal display or "0". The result is kept as target_display_id_str for the focus checks.
         """
+        self.target_display_id_str = self._select_target_display_id(target_display_name)
+        return self.target_display_id_str
+
+    def _select_target_display_id(self, target_display_name: Optional[str] = None) -> str:
         available_displays = self._get_display_ids()
         if not available_displays:
             logger.warning("No displays detected via ADB. Defaulting to display ID '0'.")
@@ -144,7 +347,12 @@ class DisplayManager:
         # For simplification, if this is problematic, one might have to rely on Appium's active element
         # or assume the target display set initially is still correct, unless an error forces re-check.
         logger.info("Checking current app focus and display ID...")
-        success, output = self.execute_adb_command_raw(["shell", "dumpsys", "window", "displays"]) # Get display info
+        focus_is_fresh, package_name = self._cached_focus()
+        if focus_is_fresh: # Focus was just read; only the display configuration is needed
+            success, output = self.execute_adb_command_raw(["shell", "dumpsys", "window", "displays"])
+        else: # Display configuration and window focus in one adb round trip
+            (success, output), focus_result = self.execute_adb_shell_batch([["dumpsys", "window", "displays"], ["dumpsys", "window", "windows"]])
+            package_name = self._store_focus(*focus_result)
         if not success:
             logger.error("Failed to get display configuration from ADB.")
             return None
@@ -154,22 +362,12 @@ class DisplayManager:
         # We primarily rely on setting displayId via Appium and assume it works.
         # This function would be more about *verifying* after the fact.
         
-        # Try to get focused app
-        success_focus, output_focus = self.execute_adb_command_raw(
-            ["shell", "dumpsys", "window", "windows"] # Check all windows
-        )
-        if success_focus and output_focus:
-            # Look for mCurrentFocus or mFocusedApp
-            # Example: mCurrentFocus=Window{u0 com.wordsynknetwork.moj/com.wordsynknetwork.moj.MainActivity}
-            # Example: mFocusedApp=ActivityRecord{... token=android.os.BinderProxy@xxx {com.wordsynknetwork.moj/com.wordsynknetwork.moj.MainActivity}}
-            focus_match = re.search(r"mCurrentFocus=Window{[^ ]+ ([^/]+)/[^ }]+}|mFocusedApp=ActivityRecord{[^ ]+ ([^/]+)/[^ ]+ .*?}", output_focus)
-            if focus_match:
-                package_name = focus_match.group(1) or focus_match.group(2)
-                if package_name:
-                    # Assuming the focused app is on the self.target_display_id if set.
-                    # This is a simplification; properly linking focused app to its actual display_id from dumpsys is more involved.
-                    logger.debug(f"Focused app seems to be {package_name}. Assuming it's on target display {self.target_display_id_str}")
-                    return {'package': package_name, 'display_id': self.target_display_id_str}
+        # Focused app (mCurrentFocus or mFocusedApp from all windows)
+        if package_name:
+            # Assuming the focused app is on self.target_display_id_str (the display chosen by get_target_display_id).
+            # This is a simplification; properly linking focused app to its actual display_id from dumpsys is more involved.
+            logger.debug(f"Focused app seems to be {package_name}. Assuming it's on target display {self.target_display_id_str}")
+            return {'package': package_name, 'display_id': self.target_display_id_str}
         
         logger.warning("Could not determine focused app or its display ID reliably via ADB dumpsys window.")
         return None
\ No newline at end of file
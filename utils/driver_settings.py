@@ -0,0 +1,24 @@
+# filename: utils/driver_settings.py
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+from logger import get_logger
+
+from config import FAST_IDLE_SETTINGS, DEFAULT_IDLE_SETTINGS
+
+logger = get_logger(__name__)
+
+@contextmanager
+def fast_idle_settings(driver, settings: Dict[str, Any] = FAST_IDLE_SETTINGS, restore: Dict[str, Any] = DEFAULT_IDLE_SETTINGS) -> Iterator[None]:
+    """
+    Lowers UiAutomator2's idle/selector waits for the duration of the block and restores them afterwards.
+    Settings failures are logged and ignored; the block always runs.
+    """
+    try: driver.update_settings(settings); applied = True
+    except Exception as e:
+        logger.debug(f"Could not apply driver settings {settings}: {e}"); applied = False
+    try:
+        yield
+    finally:
+        if applied:
+            try: driver.update_settings(restore)
+            except Exception as e: logger.debug(f"Could not restore driver settings {restore}: {e}")
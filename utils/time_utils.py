@@ -5,6 +5,8 @@ from logger import get_logger
 
 logger = get_logger(__name__)
 
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1_000_000
+
 def parse_datetime_from_time_string(time_str: Optional[str]) -> Optional[datetime.time]:
     """
     Parses a time string (e.g., "HH:MM") into a datetime.time object.
@@ -13,12 +15,12 @@ def parse_datetime_from_time_string(time_str: Optional[str]) -> Optional[datetim
     if not time_str:
         return None
     try:
-        parts = time_str.split(':')
-        if len(parts) == 2:
-            hour = int(parts[0])
-            minute = int(parts[1])
+        hour_str, sep, minute_str = time_str.partition(':') # Fixed 3-tuple, no list
+        if sep and ':' not in minute_str:
+            hour = int(hour_str)
+            minute = int(minute_str)
             if 0 <= hour < 24 and 0 <= minute < 60:
-                return datetime.datetime.strptime(f"{hour:02d}:{minute:02d}", "%H:%M").time()
+                return datetime.time(hour, minute) # Already range-checked; no format/strptime round trip
             else:
                 logger.warning(f"Time values out of range: hour={hour}, minute={minute} from '{time_str}'")
                 return None
@@ -32,32 +34,14 @@ def parse_datetime_from_time_string(time_str: Optional[str]) -> Optional[datetim
 def calculate_duration_string(start_time_obj: Optional[datetime.time], end_time_obj: Optional[datetime.time]) -> Optional[str]:
     """
     Calculates the duration between two datetime.time objects and returns it as "HH:MM".
-    Handles overnight durations. Returns "00:00" if times are identical.
-    Returns None if either input is None or if start_time is after end_time in a non-overnight context.
+    Handles overnight durations (end before start is taken as next day). Returns "00:00" if times are identical.
+    Returns None if either input is None.
     """
     if not start_time_obj or not end_time_obj:
         return None
 
-    # Use a dummy date to combine with time objects for timedelta calculation
-    dummy_date = datetime.date(2000, 1, 1)
-    start_dt = datetime.datetime.combine(dummy_date, start_time_obj)
-    end_dt = datetime.datetime.combine(dummy_date, end_time_obj)
-
-    if end_dt == start_dt:
-        return "00:00"
-
-    # Handle overnight case: if end_time is earlier than start_time, assume it's on the next day
-    if end_dt < start_dt:
-        end_dt += datetime.timedelta(days=1)
-
-    duration_delta = end_dt - start_dt
-    total_seconds = duration_delta.total_seconds()
-
-    # Should not happen if overnight logic is correct, but as a safeguard
-    if total_seconds < 0:
-        logger.warning(f"Calculated negative duration for start {start_time_obj} and end {end_time_obj}.")
-        return None
-
-    hours = int(total_seconds // 3600)
-    minutes = int((total_seconds % 3600) // 60)
-    return f"{hours:02d}:{minutes:02d}"
\ No newline at end of file
+    # Whole-day modulo of the microsecond difference: an end earlier than the start wraps to the next day, identical times give 0
+    start_us = ((start_time_obj.hour * 60 + start_time_obj.minute) * 60 + start_time_obj.second) * 1_000_000 + start_time_obj.microsecond
+    end_us = ((end_time_obj.hour * 60 + end_time_obj.minute) * 60 + end_time_obj.second) * 1_000_000 + end_time_obj.microsecond
+    duration_minutes = (end_us - start_us) % MICROSECONDS_PER_DAY // 60_000_000
+    return f"{duration_minutes // 60:02d}:{duration_minutes % 60:02d}"
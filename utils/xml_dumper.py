@@ -1,24 +1,34 @@
 # filename: utils/xml_dumper.py
 import os
 import datetime
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from logger import get_logger
-from typing import Optional
+from typing import Deque, Optional, Set
 
 logger = get_logger(__name__)
 
 # This will be set by CrawlerService from config.py
 XML_DUMP_ROOT_DIR_CONFIG = "xml_dump_default" # Default fallback
 
+MAX_PENDING_DUMPS = 32 # Oldest queued dump is dropped beyond this so a slow disk never stalls scraping
+_dump_executor: Optional[ThreadPoolExecutor] = None
+_pending_dumps: Deque[Future] = deque()
+_dump_lock = threading.Lock()
+_known_dirs: Set[str] = set() # Directories already checked/created; dumps for one MJR or session reuse the same folder
+
 def _ensure_dir_exists(dir_path: str):
-    """Ensures a directory exists, creating it if necessary."""
-    if not os.path.exists(dir_path):
-        try:
-            os.makedirs(dir_path, exist_ok=True)
-            logger.debug(f"Created directory: {dir_path}")
-        except OSError as e:
-            logger.error(f"Could not create directory '{dir_path}': {e}")
-            # Decide if to raise error or just log
-            raise # Or return False
+    """Ensures a directory exists, creating it if necessary. Each path hits the filesystem once per process."""
+    if dir_path in _known_dirs: return
+    try:
+        os.makedirs(dir_path, exist_ok=True) # exist_ok covers an existing directory, no separate exists() stat
+        logger.debug(f"Directory ready: {dir_path}")
+    except OSError as e:
+        logger.error(f"Could not create directory '{dir_path}': {e}")
+        # Decide if to raise error or just log
+        raise # Or return False
+    _known_dirs.add(dir_path)
 
 def initialize_dumper(root_dump_dir: str):
     """Initializes the dumper by setting the root directory and creating it."""
@@ -35,11 +45,12 @@ def save_xml_dump(
     page_source: str,
     page_type_prefix: str, # e.g., "List", "Secondary", "Detail"
     primary_id: str,       # e.g., SessionID for list, MJB for secondary, MJR for detail
-    sequence_or_stage: str # e.g., "initial", "scroll_01", or just a simple sequence number
+    sequence_or_stage: str, # e.g., "initial", "scroll_01", or just a simple sequence number
+    captured_at: Optional[datetime.datetime] = None # When the source was read; defaults to now
 ):
     """
     Saves the XML page source to a structured directory.
-    Filename: [page_type_prefix]_[primary_id]_[sequence_or_stage]_[timestamp].xml
+    Filename: [page_type_prefix]_[primary_id]_[sequence_or_stage]_[timestamp].xml, timestamp taken from captured_at
     Structure: XML_DUMP_ROOT_DIR / [primary_id_folder] / [page_type_prefix_folder] / filename.xml
     """
     if not page_source:
@@ -47,23 +58,54 @@ def save_xml_dump(
         return False
 
     try:
-        # Create a folder for the primary_id (e.g., MJR0012345 or session_1)
-        primary_id_folder_path = os.path.join(XML_DUMP_ROOT_DIR_CONFIG, primary_id)
-        _ensure_dir_exists(primary_id_folder_path)
+        # Folder for the primary_id (e.g., MJR0012345 or session_1) with a subfolder per page type (e.g., List, Secondary, Detail)
+        page_type_folder_path = os.path.join(XML_DUMP_ROOT_DIR_CONFIG, primary_id, page_type_prefix)
+        _ensure_dir_exists(page_type_folder_path) # makedirs creates the primary_id folder too
 
-        # Create a subfolder for the page type (e.g., List, Secondary, Detail)
-        page_type_folder_path = os.path.join(primary_id_folder_path, page_type_prefix)
-        _ensure_dir_exists(page_type_folder_path)
-
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        timestamp = (captured_at or datetime.datetime.now()).strftime("%Y%m%d_%H%M%S_%f")
         # Keep primary_id in filename for flatter structure within type folder
         filename = f"{page_type_prefix}_{primary_id}_{sequence_or_stage}_{timestamp}.xml"
         filepath = os.path.join(page_type_folder_path, filename)
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(page_source)
-        logger.info(f"Saved XML dump: {filepath}")
+        data = page_source.encode("utf-8") # Encoded once; binary mode skips TextIOWrapper's codec and newline translation
+        with open(filepath, "wb") as f:
+            f.write(data) # A write larger than the buffer goes straight to the fd, partial writes retried by BufferedWriter
+        logger.info(f"Saved XML dump: {filepath} ({len(data)} bytes)")
         return True
     except Exception as e:
         logger.exception(f"Failed to save XML dump for {page_type_prefix}_{primary_id}_{sequence_or_stage}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def submit_xml_dump(page_source: str, page_type_prefix: str, primary_id: str, sequence_or_stage: str) -> Optional[Future]:
+    """
+    Queues save_xml_dump on a single background writer thread so disk I/O overlaps Appium calls.
+    Returns the Future, or None if the dump could not be queued.
+    The timestamp is taken here, so file names follow capture order even if the writer falls behind.
+    """
+    captured_at = datetime.datetime.now()
+    global _dump_executor
+    with _dump_lock:
+        if _dump_executor is None:
+            _dump_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xml-dump")
+        while _pending_dumps and _pending_dumps[0].done(): _pending_dumps.popleft() # FIFO worker, finished ones sit at the front
+        if len(_pending_dumps) >= MAX_PENDING_DUMPS:
+            oldest = _pending_dumps.popleft()
+            if oldest.cancel(): logger.warning(f"XML dump queue full ({MAX_PENDING_DUMPS}); dropped oldest pending dump.")
+        try:
+            future = _dump_executor.submit(save_xml_dump, page_source, page_type_prefix, primary_id, sequence_or_stage, captured_at)
+        except RuntimeError as e: # Executor already shut down
+            logger.error(f"Could not queue XML dump for {page_type_prefix}_{primary_id}_{sequence_or_stage}: {e}")
+            return None
+        _pending_dumps.append(future)
+        return future
+
+def shutdown_dumper(wait: bool = True):
+    """Stops the background writer. With wait=True, queued dumps are flushed to disk first."""
+    global _dump_executor
+    with _dump_lock:
+        executor, _dump_executor = _dump_executor, None
+        _pending_dumps.clear()
+    if executor is not None:
+        executor.shutdown(wait=wait)
+        logger.debug("XML dump writer shut down.")